@@ -0,0 +1,84 @@
+import json
+import time
+import zlib
+import threading
+import numpy as np
+
+from src.codebook import load_codebook, decode_value, SCALE_LEVELS
+
+
+class FakeLLM:
+    """
+    确定性的假大模型后端，接口与 LocalModelWrapper / OpenAIModelWrapper 相同：
+      - 第 i 次调用的输出只取决于 (seed, i)，相同调用序列的结果完全可复现；
+      - latency 为每次调用的固定延迟（秒），latency_jitter 为额外的指数分布延迟均值；
+      - failure_rate 的概率抛出异常，invalid_rate 的概率返回无法解析的文本。
+    按提示词内容返回画像维度 JSON、人物画像 JSON 或问卷答案 JSON。
+    问卷答案的分布由提示词（即簇画像）决定，不同簇的回答有所区别。
+    可通过 model_router 的 {"name": ..., "wrapper": FakeLLM(...)} 接入多后端路由。
+    """
+    def __init__(self, latency=0.0, latency_jitter=0.0, failure_rate=0.0, invalid_rate=0.0,
+                 seed=0, codebook=None):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.failure_rate = failure_rate
+        self.invalid_rate = invalid_rate
+        self.seed = seed
+        self.codebook = codebook or load_codebook()
+        self.calls = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def _answers(self, prompt, rng):
+        # 每个提示词对应一组固定的作答偏好
+        pref = np.random.default_rng([self.seed, zlib.crc32(prompt.encode("utf-8"))])
+        answers = []
+        for q in self.codebook:
+            n = q["n_codes"]
+            if q["type"] == "matrix_7":
+                mean = pref.uniform(2.0, 6.0)
+                code = int(np.clip(np.rint(rng.normal(mean, 1.5)), 1, SCALE_LEVELS)) - 1
+            elif q["type"] == "multiple":
+                probs = pref.beta(2.0, 2.0, size=n)
+                bits = rng.random(n) < probs
+                if not bits.any():
+                    bits[rng.integers(n)] = True
+                code = int(bits.astype(np.int64) @ (1 << np.arange(n)))
+            elif q["qnum"] == "5":
+                # 与合成问卷一致：第5题少数选“否”（其后题目全部跳过，作答题数不足时不参与查重）
+                code = int(rng.random() < 0.03)
+            else:
+                code = int(rng.choice(n, p=pref.dirichlet(np.full(n, 2.0))))
+            answers.append({"col_name": q["col_name"], "answer": decode_value(code, q)})
+        return {"answers": answers}
+
+    def create_completion(self, prompt, max_tokens=1024, temperature=0.2):
+        with self._lock:
+            index = self.calls
+            self.calls += 1
+        rng = np.random.default_rng([self.seed, index])
+        delay = self.latency + (rng.exponential(self.latency_jitter) if self.latency_jitter > 0 else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+        if rng.random() < self.failure_rate:
+            with self._lock:
+                self.failures += 1
+            raise RuntimeError(f"FakeLLM 模拟调用失败 (第 {index} 次)")
+        if rng.random() < self.invalid_rate:
+            return {"choices": [{"text": "抱歉，我无法完成这个请求。"}]}
+
+        if '"answers"' in prompt:
+            payload = self._answers(prompt, rng)
+        elif "画像维度" in prompt:
+            payload = {
+                "base_attributes": ["年级", "专业类别", "对AIGC了解程度"],
+                "cognitive_traits": ["技术信任度", "隐私敏感度", "创新接受度"],
+                "behavior_patterns": ["使用频率", "工具组合", "付费意愿"],
+            }
+        else:
+            payload = {
+                "base_attributes": {"年级": "大二", "专业类别": "理工科类"},
+                "cognitive_traits": {"技术信任度": int(rng.integers(1, 6))},
+                "behavior_patterns": {"使用频率": "每天1～2次"},
+            }
+        return {"choices": [{"text": "```json\n" + json.dumps(payload, ensure_ascii=False) + "\n```"}]}
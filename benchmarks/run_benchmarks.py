@@ -0,0 +1,304 @@
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+from contextlib import redirect_stdout, redirect_stderr
+import numpy as np
+import pandas as pd
+
+from src import config
+from src import preprocess, clustering, persona_generation, questionnaire_generation, data_jitter, analysis
+from src.response_store import ResponseStore
+from .synthetic_survey import write_survey_csv
+from .fake_llm import FakeLLM
+
+STAGES = ("preprocess", "preprocess_cached", "linkage", "final_clustering", "personas",
+          "generation", "jitter", "analysis")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _max_rss_mb():
+    """
+    进程的常驻内存高水位（整个进程生命周期内的最大值，不能用于区分阶段）
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return round(rss / (1024 ** 2 if sys.platform == "darwin" else 1024), 1)
+
+
+def _environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=config.BASE_DIR, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    import sklearn
+    import scipy
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "scipy": scipy.__version__,
+        "sklearn": sklearn.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+class StageTimer:
+    """
+    依次运行各阶段并记录耗时（多次重复取最小值）；阶段的日志输出被丢弃，verbose 时保留。
+    memory 为 True 时在计时之后用 tracemalloc 再运行一次，记录该阶段新分配内存的峰值
+    （tracemalloc 有额外开销，因此不与计时放在同一次运行中；子进程中的分配不计入）。
+    """
+    def __init__(self, repeat=1, verbose=False, memory=True):
+        self.repeat = repeat
+        self.verbose = verbose
+        self.memory = memory
+        self.results = {}
+
+    def _call(self, fn):
+        sink = sys.stdout if self.verbose else io.StringIO()
+        with redirect_stdout(sink), redirect_stderr(sink if self.verbose else io.StringIO()):
+            t0 = time.perf_counter()
+            value = fn()
+            return value, time.perf_counter() - t0
+
+    def run(self, name, fn):
+        best, value = None, None
+        for _ in range(self.repeat):
+            value, elapsed = self._call(fn)
+            best = elapsed if best is None else min(best, elapsed)
+        result = {"seconds": round(best, 4)}
+        if self.memory:
+            tracemalloc.start()
+            try:
+                value, _ = self._call(fn)
+                result["peak_alloc_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 1)
+            finally:
+                tracemalloc.stop()
+        self.results[name] = result
+        mem = f"  峰值分配 {result['peak_alloc_mb']:8.1f} MB" if self.memory else ""
+        print(f"    {name:<18} {best:9.3f}s{mem}")
+        return value
+
+    def skip(self, name, reason):
+        self.results[name] = {"skipped": reason}
+        print(f"    {name:<18} 跳过 ({reason})")
+
+
+def _configure(workdir, data_path, args):
+    config.DATA_PATH = data_path
+    config.OUTPUT_DIR = workdir
+    config.AI_OUTPUT_CSV = os.path.join(workdir, "ai_simulated_responses.csv")
+    config.JITTER_OUTPUT_CSV = os.path.join(workdir, "jittered_responses.csv")
+    config.PREPROCESS_CACHE_DIR = os.path.join(workdir, "cache")
+    config.INCREMENTAL_STATE_PATH = os.path.join(workdir, "pipeline_state.pkl")
+    config.INTERACTIVE = False
+    config.CLUSTER_K = args.k
+    config.CLUSTER_REMOVE_IDS = []
+    config.PLOT_ENABLED = args.plots
+    config.ADAPTIVE_QUOTA_ENABLED = False
+    config.QUEUE_ENABLED = False
+    config.JITTER_WORKERS = args.jitter_workers
+
+
+def bench_size(n_rows, args, stages):
+    """
+    在 n_rows 条合成问卷上运行所选阶段，返回 {阶段: 结果}
+    """
+    workdir = tempfile.mkdtemp(prefix=f"bench_{n_rows}_")
+    try:
+        data_path = os.path.join(workdir, "survey.csv")
+        t0 = time.perf_counter()
+        write_survey_csv(data_path, n_rows, seed=args.seed)
+        print(f"  [{n_rows} 条] 合成数据 {time.perf_counter() - t0:.2f}s")
+        _configure(workdir, data_path, args)
+        timer = StageTimer(repeat=args.repeat, verbose=args.verbose, memory=not args.no_memory)
+
+        config.PREPROCESS_CACHE_ENABLED = False
+        if "preprocess" in stages:
+            df_raw, df_encoded, _, multi_cols, scale_cols = timer.run("preprocess", preprocess.load_and_preprocess)
+            timer.results["preprocess"]["dims"] = int(df_encoded.shape[1])
+        else:
+            with redirect_stdout(io.StringIO()):
+                df_raw, df_encoded, _, multi_cols, scale_cols = preprocess.load_and_preprocess()
+        if "preprocess_cached" in stages:
+            config.PREPROCESS_CACHE_ENABLED = True
+            with redirect_stdout(io.StringIO()):
+                preprocess.load_and_preprocess()  # 写入缓存
+            timer.run("preprocess_cached", preprocess.load_and_preprocess)
+            config.PREPROCESS_CACHE_ENABLED = False
+        X = df_encoded.to_numpy(dtype=np.float64)
+
+        if "linkage" in stages:
+            if n_rows <= args.max_linkage_rows:
+                from scipy.cluster.hierarchy import linkage
+                timer.run("linkage", lambda: linkage(X, method="ward"))
+            else:
+                timer.skip("linkage", f"超过 --max-linkage-rows={args.max_linkage_rows}")
+
+        labels = centers = None
+        if "final_clustering" in stages:
+            if n_rows <= args.max_cluster_rows:
+                labels, centers = timer.run("final_clustering", lambda: clustering.final_clustering(X, args.k))
+            else:
+                timer.skip("final_clustering", f"超过 --max-cluster-rows={args.max_cluster_rows}")
+        if labels is None:
+            # 跳过聚类时用随机标签与对应均值作为下游阶段的输入
+            labels = np.random.default_rng(args.seed).integers(args.k, size=n_rows)
+            centers = np.stack([X[labels == c].mean(axis=0) for c in range(args.k)])
+
+        persona_descs = {c: json.dumps({"簇": int(c)}, ensure_ascii=False) for c in range(args.k)}
+        new_labels = list(labels)
+        # 每次运行使用新的假大模型，调用统计只反映最后一次运行
+        last_llm = {}
+
+        def fake_llm(**kwargs):
+            last_llm["llm"] = FakeLLM(seed=args.seed, **kwargs)
+            return last_llm["llm"]
+
+        if "personas" in stages:
+            persona_descs, new_labels = timer.run(
+                "personas",
+                lambda: persona_generation.generate_personas(
+                    df_raw, X, labels, centers, args.k, fake_llm(latency=args.llm_latency)),
+            )
+            timer.results["personas"]["llm_calls"] = last_llm["llm"].calls
+
+        ai_store = None
+        if "generation" in stages:
+            config.TARGET_TOTAL = args.gen_rows
+
+            def generate():
+                if os.path.exists(config.AI_OUTPUT_CSV):
+                    os.remove(config.AI_OUTPUT_CSV)
+                llm = fake_llm(latency=args.llm_latency, latency_jitter=args.llm_latency_jitter,
+                               failure_rate=args.llm_failure_rate, invalid_rate=args.llm_invalid_rate)
+                return questionnaire_generation.generate_questionnaires(df_raw, new_labels, persona_descs, llm)
+
+            ai_store = timer.run("generation", generate)
+            res = timer.results["generation"]
+            res.update({
+                "rows": len(ai_store),
+                "llm_calls": last_llm["llm"].calls,
+                "llm_failures": last_llm["llm"].failures,
+                "rows_per_second": round(len(ai_store) / max(res["seconds"], 1e-9), 1),
+            })
+
+        # 抖动与分析使用生成阶段输出的 ResponseStore（与完整流程相同的数据路径）；
+        # 生成的问卷少于 n_rows 时有放回地重复抽取到 n_rows 条，以观察随数据量的变化。
+        # 未运行生成阶段时退回到由原始问卷构造的存储
+        if ai_store is not None and len(ai_store):
+            idx = np.arange(len(ai_store))
+            if len(ai_store) < n_rows:
+                idx = np.sort(np.random.default_rng(args.seed).integers(len(ai_store), size=n_rows))
+            store, source = ai_store.take(idx), "generation"
+        else:
+            df_ai = df_raw.copy()
+            df_ai["簇编号"] = np.asarray(labels).astype(str)
+            df_ai["原问卷序号"] = np.arange(1, n_rows + 1)
+            with redirect_stdout(io.StringIO()):
+                store = ResponseStore.from_frame(df_ai, columns=df_raw.columns)
+            source = "original"
+        timer.results["store"] = {"source": source, "rows": len(store),
+                                  "megabytes": round(store.nbytes() / 1024 ** 2, 2),
+                                  "bytes_per_row": round(store.nbytes() / max(len(store), 1), 1)}
+
+        jittered = store
+        if "jitter" in stages:
+            jittered = timer.run("jitter", lambda: data_jitter.data_jitter(
+                df_raw, store, multi_cols, scale_cols, len(store), seed=args.seed))
+        if "analysis" in stages:
+            timer.run("analysis", lambda: analysis.save_and_analyze(df_raw, store, jittered, labels, new_labels))
+        timer.results["process"] = {"max_rss_mb": _max_rss_mb()}
+        return timer.results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(current, baseline, threshold, min_seconds=0.05):
+    """
+    与基线结果比较，返回耗时增长超过 threshold 倍的 [(规模, 阶段, 基线, 当前)]；
+    两次耗时都低于 min_seconds 的阶段受计时噪声影响大，只打印不计入
+    """
+    regressions = []
+    print(f"\n与基线比较 (基线提交 {baseline.get('environment', {}).get('commit')}):")
+    for size, stages in current["results"].items():
+        base_stages = baseline.get("results", {}).get(size, {})
+        for name, res in stages.items():
+            old = base_stages.get(name, {}).get("seconds")
+            new = res.get("seconds")
+            if old is None or new is None:
+                continue
+            ratio = new / max(old, 1e-9)
+            slower = ratio > threshold and max(old, new) >= min_seconds
+            flag = "  <-- 变慢" if slower else ""
+            print(f"  {size:>8} {name:<18} {old:9.3f}s -> {new:9.3f}s  x{ratio:.2f}{flag}")
+            if slower:
+                regressions.append((size, name, old, new))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="问卷扩充流程的分阶段基准测试（合成数据 + 假大模型）")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="合成问卷条数")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--k", type=int, default=5, help="聚类数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="每个阶段重复次数（取最小值）")
+    parser.add_argument("--gen-rows", type=int, default=200, help="生成阶段的目标问卷数")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="假大模型每次调用的延迟（秒）")
+    parser.add_argument("--llm-latency-jitter", type=float, default=0.0)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--llm-invalid-rate", type=float, default=0.0)
+    parser.add_argument("--jitter-workers", type=int, default=None)
+    parser.add_argument("--max-linkage-rows", type=int, default=20000, help="Ward 层次聚类为 O(n^2) 内存，超过时跳过")
+    parser.add_argument("--max-cluster-rows", type=int, default=50000, help="最终聚类的轮廓系数为 O(n^2)，超过时跳过")
+    parser.add_argument("--plots", action="store_true", help="分析阶段包含绘图")
+    parser.add_argument("--verbose", action="store_true", help="显示各阶段的日志输出")
+    parser.add_argument("--no-memory", action="store_true", help="不额外运行一次以测量各阶段的内存峰值")
+    parser.add_argument("--output", default=None, help="结果 JSON 路径（默认 benchmarks/results/<时间>_<提交>.json）")
+    parser.add_argument("--compare", default=None, help="与之比较的基线结果 JSON")
+    parser.add_argument("--threshold", type=float, default=1.2, help="耗时增长超过该倍数视为性能退化")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="低于该耗时的阶段不判定退化")
+    args = parser.parse_args(argv)
+
+    env = _environment()
+    print(f"基准测试: 提交 {env['commit']}, 规模 {args.sizes}, 阶段 {args.stages}")
+    report = {"environment": env, "args": vars(args), "results": {}}
+    for n_rows in args.sizes:
+        report["results"][str(n_rows)] = bench_size(n_rows, args, set(args.stages))
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}_{env['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存: {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold, args.min_seconds)
+        if regressions:
+            print(f"发现 {len(regressions)} 处性能退化 (阈值 x{args.threshold})")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
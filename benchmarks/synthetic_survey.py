@@ -0,0 +1,96 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+from src import config
+from src.codebook import load_codebook, SCALE_LEVELS
+
+
+def _archetypes(codebook, n_archetypes, rng):
+    """
+    为每个潜在人群随机生成逐题的作答分布，使合成数据具有可聚类的结构
+    """
+    types = []
+    for _ in range(n_archetypes):
+        spec = []
+        for q in codebook:
+            if q["type"] == "matrix_7":
+                spec.append(rng.uniform(1.5, 6.5))
+            elif q["type"] == "multiple":
+                spec.append(rng.beta(0.7, 0.7, size=q["n_codes"]))
+            else:
+                spec.append(np.cumsum(rng.dirichlet(np.full(q["n_codes"], 0.6))))
+        types.append(spec)
+    return types
+
+
+def generate_survey(n_rows, seed=0, n_archetypes=5, skip_rate=0.03, json_path=None):
+    """
+    按 question_list.json 生成与原始问卷 CSV 格式一致的合成问卷：
+    单选为选项文本，多选为以 "┋" 连接的选项文本，量表为 1~7，跳题为 "(跳过)"，
+    并满足跳题规则（第5题选“否”时 6~36 题跳过，第35题选“否”时第36题跳过）。
+    """
+    rng = np.random.default_rng(seed)
+    codebook = load_codebook(json_path)
+    types = _archetypes(codebook, n_archetypes, rng)
+    group = rng.integers(n_archetypes, size=n_rows)
+    data = {}
+    for j, q in enumerate(codebook):
+        if q["type"] == "matrix_7":
+            means = np.array([t[j] for t in types])[group]
+            values = np.clip(np.rint(rng.normal(means, 1.0)), 1, SCALE_LEVELS).astype(np.int64)
+            data[q["col_name"]] = values.astype(str).astype(object)
+        elif q["type"] == "multiple":
+            n_opts = q["n_codes"]
+            probs = np.stack([t[j] for t in types])[group]
+            hit = rng.random((n_rows, n_opts)) < probs
+            # 至少选择一项
+            empty = ~hit.any(axis=1)
+            hit[empty, rng.integers(n_opts, size=int(empty.sum()))] = True
+            mask = hit.astype(np.int64) @ (1 << np.arange(n_opts))
+            table = np.array(["┋".join(q["labels"][b] for b in range(n_opts) if m >> b & 1)
+                              for m in range(1 << n_opts)], dtype=object)
+            data[q["col_name"]] = table[mask]
+        else:
+            cum = np.stack([t[j] for t in types])[group]
+            idx = np.minimum((rng.random(n_rows)[:, None] > cum).sum(axis=1), q["n_codes"] - 1)
+            data[q["col_name"]] = np.array(q["labels"], dtype=object)[idx]
+    df = pd.DataFrame(data)
+
+    # 跳题规则：第5题 / 第35题选 B（否）时跳过其后的题目
+    by_num = {q["qnum"]: q for q in codebook}
+    if "5" in by_num:
+        q5 = by_num["5"]
+        is_b = rng.random(n_rows) < skip_rate
+        df[q5["col_name"]] = np.where(is_b, q5["labels"][1], q5["labels"][0])
+        skip_cols = [q["col_name"] for q in codebook if 6 <= int(q["qnum"]) <= 36]
+        df.loc[is_b, skip_cols] = "(跳过)"
+    if "35" in by_num and "36" in by_num:
+        df.loc[df[by_num["35"]["col_name"]] == by_num["35"]["labels"][1], by_num["36"]["col_name"]] = "(跳过)"
+    return df
+
+
+def write_survey_csv(path, n_rows, seed=0, n_archetypes=5):
+    """
+    写出合成问卷 CSV（与原始数据相同的 gbk 编码），返回路径
+    """
+    df = generate_survey(n_rows, seed=seed, n_archetypes=n_archetypes)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    df.to_csv(path, index=False, encoding="gbk")
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按 question_list.json 生成合成问卷 CSV")
+    parser.add_argument("rows", type=int, help="问卷条数")
+    parser.add_argument("--output", default=os.path.join(config.OUTPUT_DIR, "synthetic_survey.csv"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--archetypes", type=int, default=5, help="潜在人群数")
+    args = parser.parse_args(argv)
+    path = write_survey_csv(args.output, args.rows, seed=args.seed, n_archetypes=args.archetypes)
+    print(f"合成问卷已保存: {path} ({args.rows} 条)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,95 @@
 import pandas as pd
 import os
+import json
+import hashlib
 import numpy as np
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
 
 from . import config
+from .fidelity import compute_fidelity, save_fidelity_report, summarize_fidelity
+from .codebook import SKIP_CODE, load_codebook, load_scale_groups, encode_frame
+from .response_store import ResponseStore
+
+CHART_MANIFEST = "chart_manifest.json"
+
+
+def _render_bar_chart(job):
+    """
+    在子进程中用 Agg 后端渲染单张柱状图（不经过 pyplot 状态机）。
+    job: {"path", "title", "ylabel", "data": {系列名: {选项: 值}}, "ylim", "rot"}
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.figure import Figure
+
+    matplotlib.rcParams['font.sans-serif'] = ['SimHei']
+    matplotlib.rcParams['axes.unicode_minus'] = False
+
+    fig = Figure(figsize=job.get("figsize", (6, 4)))
+    ax = fig.subplots()
+    df = pd.DataFrame(job["data"]).fillna(0)
+    df.plot.bar(ax=ax, rot=job.get("rot", 0), title=job["title"], ylim=job.get("ylim"))
+    ax.set_ylabel(job["ylabel"])
+    fig.tight_layout()
+    fig.savefig(job["path"])
+    return job["path"]
+
+
+def _chart_fingerprint(job):
+    """
+    对图表的输入分布做指纹：标题、纵轴与各系列取值一致时视为未变化
+    """
+    payload = json.dumps(
+        [job["title"], job["ylabel"], job.get("ylim"), job["data"]],
+        ensure_ascii=False, sort_keys=True, default=str
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def render_charts(jobs, output_dir):
+    """
+    并行渲染图表，跳过输入分布未变化且文件已存在的图表。
+    指纹记录在 output_dir/chart_manifest.json 中。返回本次渲染的图表路径。
+    """
+    manifest_path = os.path.join(output_dir, CHART_MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+
+    pending = []
+    for job in jobs:
+        name = os.path.basename(job["path"])
+        fp = _chart_fingerprint(job)
+        if manifest.get(name) == fp and os.path.exists(job["path"]):
+            continue
+        pending.append((name, fp, job))
+
+    print(f"  图表: 共 {len(jobs)} 张，需重新渲染 {len(pending)} 张，跳过 {len(jobs) - len(pending)} 张")
+    if not pending:
+        return []
+
+    workers = config.PLOT_WORKERS or os.cpu_count() or 1
+    workers = min(workers, len(pending))
+    if workers <= 1:
+        for _, _, job in pending:
+            _render_bar_chart(job)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(_render_bar_chart, [job for _, _, job in pending]))
+
+    for name, fp, _ in pending:
+        manifest[name] = fp
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return [job["path"] for _, _, job in pending]
+
+
+def _series_to_dict(s):
+    return {str(k): float(v) for k, v in s.items()}
 
 def cronbach_alpha(df_subset):
     """
@@ -20,6 +106,83 @@ def cronbach_alpha(df_subset):
     alpha = (k / (k - 1)) * (1 - item_vars.sum() / total_var)
     return alpha
 
+
+def bootstrap_alpha(X, n_resamples, confidence=0.95, seed=None):
+    """
+    Cronbach's Alpha 的 bootstrap 置信区间（X 为无缺失的 (样本数, 题数) 矩阵）。
+    每次重抽样用样本被抽中次数的计数向量表示，全部重抽样的各阶矩通过一次矩阵乘法得到；
+    按 config.BOOTSTRAP_MAX_CELLS 分块以控制内存。返回 (下限, 上限)。
+    """
+    X = np.asarray(X, dtype=np.float64)
+    n, k = X.shape
+    if n < 3 or k < 2 or n_resamples <= 0:
+        return np.nan, np.nan
+    rng = np.random.default_rng(seed)
+    total = X.sum(axis=1)
+    # 一阶、二阶矩：[各题, 总分, 各题平方, 总分平方]
+    moments = np.hstack([X, total[:, None], X ** 2, total[:, None] ** 2])
+    chunk = max(1, config.BOOTSTRAP_MAX_CELLS // n)
+    alphas = []
+    for start in range(0, n_resamples, chunk):
+        b = min(chunk, n_resamples - start)
+        idx = rng.integers(0, n, size=(b, n))
+        idx += np.arange(b)[:, None] * n
+        counts = np.bincount(idx.ravel(), minlength=b * n).reshape(b, n).astype(np.float64)
+        m = counts @ moments / n
+        mean, sq = m[:, :k + 1], m[:, k + 1:]
+        var = (sq - mean ** 2) * n / (n - 1)
+        item_vars, total_var = var[:, :k].sum(axis=1), var[:, k]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            a = np.where(total_var > 0, (k / (k - 1)) * (1 - item_vars / total_var), 0.0)
+        alphas.append(a)
+    alphas = np.concatenate(alphas)
+    tail = (1 - confidence) / 2 * 100
+    return tuple(np.percentile(alphas, [tail, 100 - tail]))
+
+
+def _scale_group_matrix(codes, codebook, group):
+    """
+    按题组声明从编码矩阵中取出量表分数（1~7），应用筛选条件并做列表删除
+    """
+    qpos = {q["qnum"]: j for j, q in enumerate(codebook)}
+    cols = [qpos[qn] for qn in group["questions"] if qn in qpos]
+    mask = np.ones(codes.shape[0], dtype=bool)
+    flt = group.get("filter")
+    if flt and flt["question"] in qpos:
+        q = codebook[qpos[flt["question"]]]
+        answer = flt["answer"]
+        target = q["letters"].index(answer) if answer in q["letters"] else SKIP_CODE - 1
+        mask &= codes[:, qpos[flt["question"]]] == target
+    sub = codes[mask][:, cols]
+    sub = sub[(sub != SKIP_CODE).all(axis=1)]
+    return (sub + 1).astype(np.float64)
+
+
+def reliability_report(datasets, scale_groups=None, codebook=None):
+    """
+    对每个量表题组、每个数据集（如 Original / AI / Jitter）计算 Alpha 及 bootstrap 置信区间
+    """
+    if codebook is None:
+        codebook = load_codebook()
+    if scale_groups is None:
+        scale_groups = load_scale_groups()
+    records = []
+    for name, df in datasets.items():
+        if df is None or len(df) == 0:
+            continue
+        codes = df.codes_matrix(codebook) if isinstance(df, ResponseStore) else encode_frame(df, codebook)
+        for group in scale_groups:
+            X = _scale_group_matrix(codes, codebook, group)
+            alpha = cronbach_alpha(pd.DataFrame(X)) if len(X) else np.nan
+            lo, hi = bootstrap_alpha(
+                X, config.BOOTSTRAP_RESAMPLES, config.BOOTSTRAP_CONFIDENCE, config.BOOTSTRAP_SEED
+            )
+            records.append({
+                "group": group["name"], "dataset": name, "n": len(X),
+                "alpha": alpha, "ci_low": lo, "ci_high": hi,
+            })
+    return pd.DataFrame(records, columns=["group", "dataset", "n", "alpha", "ci_low", "ci_high"])
+
 def save_and_analyze(df_raw, ai_responses, jittered_responses, final_labels, new_labels):
     """
     将 AI 生成的问卷和抖动问卷分别保存，并做简单分析/打印。
@@ -27,20 +190,22 @@ def save_and_analyze(df_raw, ai_responses, jittered_responses, final_labels, new
     """
     print("\n[7/7] 结果保存与分析 ...")
 
-    # 转换为 DataFrame
-    df_ai = pd.DataFrame(ai_responses)
-    orig_cols = df_raw.columns.tolist()
-    extra_cols = [col for col in df_ai.columns if col not in orig_cols]
-    df_ai = df_ai[orig_cols + extra_cols]
+    # 统一为列式存储；分析直接使用编码，只在写 CSV 时解码一次
+    ai_store = ai_responses if isinstance(ai_responses, ResponseStore) \
+        else ResponseStore.from_frame(pd.DataFrame(ai_responses), columns=df_raw.columns)
+    jit_store = jittered_responses if isinstance(jittered_responses, ResponseStore) \
+        else ResponseStore.from_frame(pd.DataFrame(jittered_responses), columns=df_raw.columns)
+    print(f"  内存占用: AI {ai_store.memory_report()}; 抖动 {jit_store.memory_report()}")
+    # 原始问卷只编码一次，供保真度与信度分析共用
+    orig_store = ResponseStore.from_frame(df_raw, columns=df_raw.columns)
 
     # 保存AI问卷
+    df_ai = ai_store.to_frame()
     df_ai.to_csv(config.AI_OUTPUT_CSV, index=False, encoding='utf-8-sig')
     print(f"  AI 问卷已保存: {config.AI_OUTPUT_CSV} (行数={len(df_ai)})")
 
     # 保存抖动问卷
-    df_jit = pd.DataFrame(jittered_responses)
-    jit_extra_cols = [col for col in df_jit.columns if col not in orig_cols]
-    df_jit = df_jit[orig_cols + jit_extra_cols]
+    df_jit = jit_store.to_frame()
     df_jit.to_csv(config.JITTER_OUTPUT_CSV, index=False, encoding='utf-8-sig')
     print(f"  抖动问卷已保存: {config.JITTER_OUTPUT_CSV} (行数={len(df_jit)})")
 
@@ -49,76 +214,66 @@ def save_and_analyze(df_raw, ai_responses, jittered_responses, final_labels, new
     print("\n=== 抖动问卷示例(前2行) ===")
     print(df_jit.head(2))
 
+    # 分布保真度：原始 vs AI vs 抖动，整体及分簇
+    fidelity_table = compute_fidelity(orig_store, new_labels, {"AI": ai_store, "Jitter": jit_store})
+    if not fidelity_table.empty:
+        report_path = save_fidelity_report(fidelity_table, config.OUTPUT_DIR)
+        print(f"\n[保真度] 指标表已保存: {report_path} (行数={len(fidelity_table)})")
+        print(summarize_fidelity(fidelity_table).round(4))
+
     # 示例分析：各选项的占比变化
     # 这里假设仅对单选/多选题进行可视化
     # 你可根据实际需求自行扩展/修改
     os.makedirs(config.OUTPUT_DIR, exist_ok=True)
+    chart_jobs = []
     single_multi_cols = []
     for c in df_raw.columns:
-        # 简易判断：若原始列是object类型，可能是单选/多选
-        if df_raw[c].dtype == object:
+        # 简易判断：若原始列是文本类型，可能是单选/多选
+        if c in config.IGNORE_COLS:
+            continue
+        if pd.api.types.is_object_dtype(df_raw[c]) or pd.api.types.is_string_dtype(df_raw[c]):
             single_multi_cols.append(c)
 
-    for col in single_multi_cols:
-        orig_count = df_raw[col].replace("(跳过)", pd.NA).value_counts(normalize=True)
-        ai_count = df_ai[col].replace("(跳过)", pd.NA).value_counts(normalize=True)
-        compare_df = pd.DataFrame({"Original": orig_count, "AI": ai_count}).fillna(0)
-        compare_df.plot.bar(rot=0, figsize=(6,4), title=f"{col} 选项分布对比")
-        plt.ylabel("占比")
-        plt.tight_layout()
-        plt.savefig(os.path.join(config.OUTPUT_DIR, f"dist_compare_{col}.png"))
-        plt.close()
+    if config.PLOT_ENABLED:
+        for col in single_multi_cols:
+            orig_count = df_raw[col].replace("(跳过)", pd.NA).value_counts(normalize=True)
+            ai_count = df_ai[col].replace("(跳过)", pd.NA).value_counts(normalize=True)
+            chart_jobs.append({
+                "path": os.path.join(config.OUTPUT_DIR, f"dist_compare_{col}.png"),
+                "title": f"{col} 选项分布对比",
+                "ylabel": "占比",
+                "data": {"Original": _series_to_dict(orig_count), "AI": _series_to_dict(ai_count)},
+            })
 
     # 簇数量占比对比
-    orig_labels_series = pd.Series([lab for lab in new_labels if lab != -1])
+    orig_labels_series = pd.Series([str(lab) for lab in new_labels if lab != -1])
     orig_cluster_counts = orig_labels_series.value_counts(normalize=True)
-    if "簇编号" in df_ai.columns:
+    if config.PLOT_ENABLED and "簇编号" in df_ai.columns:
         ai_cluster_counts = df_ai["簇编号"].astype(str).value_counts(normalize=True)
-        cluster_compare = pd.DataFrame({"Original": orig_cluster_counts, "AI": ai_cluster_counts}).fillna(0)
-        cluster_compare.plot.bar(rot=0, title="各簇样本占比（原始 vs AI）")
-        plt.ylabel("占比")
-        plt.tight_layout()
-        plt.savefig(os.path.join(config.OUTPUT_DIR, "cluster_compare.png"))
-        plt.close()
-
-    # 信度系数（示例：使用AIGC困难题 + AIGC满意度题）
-    difficulties_cols = ["10. 使用AIGC困难之『生成内容和需求不匹配』(1~7)",
-                         "11. 使用AIGC困难之『操作界面复杂』(1~7)",
-                         "12. 使用AIGC困难之『隐私及数据安全』(1~7)",
-                         "13. 使用AIGC困难之『版权归属等伦理』(1~7)",
-                         "14. 使用AIGC困难之『收费过高』(1~7)",
-                         "15. 使用AIGC困难之『网络延迟或性能』(1~7)",
-                         "16. 使用AIGC困难之『内容创新性不高』(1~7)",
-                         "17. 使用AIGC困难之『担心过度依赖』(1~7)"]
-    sat_cols = ["26. AIGC工具满意度之『输出内容质量』(1~7)",
-                "27. AIGC工具满意度之『操作便捷性』(1~7)",
-                "28. AIGC工具满意度之『响应速度』(1~7)",
-                "29. AIGC工具满意度之『功能多样性』(1~7)",
-                "30. AIGC工具满意度之『客户支持服务』(1~7)",
-                "31. AIGC工具满意度之『安全隐私保护』(1~7)"]
-
-    df_raw_diff = df_raw[difficulties_cols].replace("(跳过)", pd.NA).apply(pd.to_numeric, errors='coerce')
-    df_ai_diff = df_ai[difficulties_cols].replace("(跳过)", pd.NA).apply(pd.to_numeric, errors='coerce')
-    df_raw_sat = df_raw[sat_cols].replace("(跳过)", pd.NA).apply(pd.to_numeric, errors='coerce')
-    df_ai_sat = df_ai[sat_cols].replace("(跳过)", pd.NA).apply(pd.to_numeric, errors='coerce')
-
-    # 仅保留使用过AIGC工具的用户
-    used_mask_orig = df_raw["5. 您是否使用过AIGC工具？ [单选题]*"] == "A. 是"
-    used_mask_ai = df_ai["5. 您是否使用过AIGC工具？ [单选题]*"] == "A. 是"
-
-    alpha_diff_orig = cronbach_alpha(df_raw_diff[used_mask_orig])
-    alpha_diff_ai = cronbach_alpha(df_ai_diff[used_mask_ai])
-    alpha_sat_orig = cronbach_alpha(df_raw_sat[used_mask_orig])
-    alpha_sat_ai = cronbach_alpha(df_ai_sat[used_mask_ai])
-
-    print(f"\n[信度] 使用AIGC困难题 Cronbach's α: 原始={alpha_diff_orig:.3f}, AI={alpha_diff_ai:.3f}")
-    print(f"[信度] AIGC满意度题 Cronbach's α: 原始={alpha_sat_orig:.3f}, AI={alpha_sat_ai:.3f}")
-    alpha_df = pd.DataFrame({
-        "Original": [alpha_diff_orig, alpha_sat_orig],
-        "AI": [alpha_diff_ai, alpha_sat_ai]
-    }, index=["困难题组","满意度题组"])
-    ax = alpha_df.plot(kind="bar", rot=0, title="Cronbach's Alpha 对比", ylim=(0,1))
-    ax.set_ylabel("Alpha系数")
-    plt.tight_layout()
-    plt.savefig(os.path.join(config.OUTPUT_DIR, "alpha_compare.png"))
-    plt.close()
+        chart_jobs.append({
+            "path": os.path.join(config.OUTPUT_DIR, "cluster_compare.png"),
+            "title": "各簇样本占比（原始 vs AI）",
+            "ylabel": "占比",
+            "data": {"Original": _series_to_dict(orig_cluster_counts), "AI": _series_to_dict(ai_cluster_counts)},
+        })
+
+    # 信度系数：题组在 question_list.json 的 scale_groups 中声明
+    alpha_table = reliability_report({"Original": orig_store, "AI": ai_store, "Jitter": jit_store})
+    alpha_table.to_csv(os.path.join(config.OUTPUT_DIR, "reliability.csv"), index=False, encoding='utf-8-sig')
+    print()
+    for _, r in alpha_table.iterrows():
+        print(f"[信度] {r['group']} Cronbach's α ({r['dataset']}, n={r['n']}): "
+              f"{r['alpha']:.3f} [{r['ci_low']:.3f}, {r['ci_high']:.3f}]")
+    if config.PLOT_ENABLED:
+        if not alpha_table.empty:
+            chart_jobs.append({
+                "path": os.path.join(config.OUTPUT_DIR, "alpha_compare.png"),
+                "title": "Cronbach's Alpha 对比",
+                "ylabel": "Alpha系数",
+                "ylim": (0, 1),
+                "data": {
+                    ds: dict(zip(sub["group"], sub["alpha"].astype(float)))
+                    for ds, sub in alpha_table.groupby("dataset", sort=False)
+                },
+            })
+        render_charts(chart_jobs, config.OUTPUT_DIR)
@@ -0,0 +1,210 @@
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+import multiprocessing
+from contextlib import redirect_stdout, redirect_stderr
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import config
+
+# 任务文件中的简写字段 -> config 中对应的配置项
+JOB_FIELDS = {
+    "data_path": "DATA_PATH",
+    "question_list": "QUESTION_LIST_PATH",
+    "prompt_dir": "PROMPT_DIR",
+    "k": "CLUSTER_K",
+    "remove_clusters": "CLUSTER_REMOVE_IDS",
+    "target_total": "TARGET_TOTAL",
+    "backends_4steps": "MODEL_BACKENDS_4STEPS",
+    "backends_question": "MODEL_BACKENDS_QUESTION",
+}
+PATH_FIELDS = ("data_path", "question_list", "prompt_dir")
+# 任务内部会启动进程池的配置项，批量运行时按并发任务数限制进程数
+POOL_FIELDS = ("JITTER_WORKERS", "PLOT_WORKERS")
+
+# 工作进程内的资源信号量，由 _init_worker 设置
+_SLOTS = {}
+
+
+def load_jobs(job_path):
+    """
+    读取任务文件（JSON），格式：
+      {
+        "defaults": {"target_total": 500, "k": "auto", "config": {"JITTER_ENABLED": true}},
+        "jobs": [
+          {"name": "wave1", "data_path": "data/wave1.csv", "remove_clusters": [2]},
+          {"name": "wave2", "data_path": "data/wave2.csv", "k": 4,
+           "backends_question": [{"name": "local", "type": "openai", "base_url": "http://127.0.0.1:8080/v1"}]}
+        ]
+      }
+    每个任务的字段覆盖 defaults，"config" 字典按键合并；相对路径相对于任务文件所在目录。
+    """
+    with open(job_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(job_path))
+    if data.get("output_dir") and not os.path.isabs(data["output_dir"]):
+        data["output_dir"] = os.path.normpath(os.path.join(base_dir, data["output_dir"]))
+    defaults = data.get("defaults", {})
+    jobs, names = [], set()
+    for i, raw in enumerate(data.get("jobs", [])):
+        job = {**defaults, **raw}
+        job["config"] = {**defaults.get("config", {}), **raw.get("config", {})}
+        job.setdefault("name", f"job{i + 1}")
+        if job["name"] in names:
+            raise ValueError(f"任务名称重复: {job['name']}")
+        names.add(job["name"])
+        for field in PATH_FIELDS:
+            if field in job and not os.path.isabs(job[field]):
+                job[field] = os.path.normpath(os.path.join(base_dir, job[field]))
+        k = job.get("k")
+        if k is not None and k != "auto" and not (isinstance(k, int) and k >= 2):
+            raise ValueError(f"任务 {job['name']} 的 k 必须为 >=2 的整数或 \"auto\": {k!r}")
+        unknown = [key for key in job["config"] if not key.isupper() or not hasattr(config, key)]
+        if unknown:
+            raise ValueError(f"任务 {job['name']} 含未知配置项: {unknown}")
+        jobs.append(job)
+    return jobs, data
+
+
+def apply_job_config(job, output_dir, pool_workers=None):
+    """
+    将任务设置写入 config 模块，并把所有输出路径指向该任务独立的目录。
+    pool_workers 为每个任务的进程池上限（抖动、绘图），未设置或设置更大的值时均取该上限。
+    """
+    for field, key in JOB_FIELDS.items():
+        if field in job:
+            setattr(config, key, job[field])
+    for key, value in job["config"].items():
+        setattr(config, key, value)
+    if pool_workers:
+        for key in POOL_FIELDS:
+            setattr(config, key, min(getattr(config, key) or pool_workers, pool_workers))
+    config.INTERACTIVE = False
+    config.OUTPUT_DIR = output_dir
+    config.AI_OUTPUT_CSV = os.path.join(output_dir, "ai_simulated_responses.csv")
+    config.JITTER_OUTPUT_CSV = os.path.join(output_dir, "jittered_responses.csv")
+    config.PREPROCESS_CACHE_DIR = os.path.join(output_dir, "cache")
+    config.INCREMENTAL_STATE_PATH = os.path.join(output_dir, "pipeline_state.pkl")
+    config.QUEUE_PATH = job["config"].get("QUEUE_PATH", os.path.join(output_dir, "generation_queue.sqlite"))
+    os.makedirs(output_dir, exist_ok=True)
+
+
+def _init_worker(cpu_slots, llm_slots):
+    _SLOTS["cpu"] = cpu_slots
+    _SLOTS["llm"] = llm_slots
+
+
+def _gate(kind):
+    return _SLOTS[kind]
+
+
+def _run_job(job, output_dir, pool_workers=None):
+    """
+    在工作进程中运行单个任务：日志写入 <输出目录>/run.log，结束后恢复 config，
+    使同一进程处理下一个任务时不受影响。
+    """
+    from .main import run_pipeline
+
+    snapshot = {key: value for key, value in vars(config).items() if key.isupper()}
+    log_path = os.path.join(output_dir, "run.log")
+    result = {"name": job["name"], "output_dir": output_dir, "log": log_path}
+    t0 = time.perf_counter()
+    try:
+        apply_job_config(job, output_dir, pool_workers)
+        with open(log_path, "w", encoding="utf-8") as log, redirect_stdout(log), redirect_stderr(log):
+            try:
+                result["timings"] = run_pipeline(gate=_gate)
+                result["status"] = "ok"
+            except Exception:
+                traceback.print_exc()
+                result["status"] = "failed"
+                result["error"] = traceback.format_exc(limit=3)
+    finally:
+        for key, value in snapshot.items():
+            setattr(config, key, value)
+    result["elapsed"] = round(time.perf_counter() - t0, 3)
+    return result
+
+
+def run_batch(jobs, output_root=None, max_jobs=None, cpu_slots=None, llm_slots=None):
+    """
+    并发运行多个任务。每个任务占用一个进程，CPU 阶段与大模型阶段分别受信号量限制：
+    一个任务等待大模型时，其它任务可以进行预处理、聚类或分析，两类资源得以重叠利用。
+    任务内部的抖动与绘图进程池最多使用 CPU 核心数 // 并发任务数 个进程。
+    返回各任务的结果列表（按任务文件中的顺序）。
+    """
+    output_root = output_root or config.BATCH_OUTPUT_DIR
+    max_jobs = max_jobs or config.BATCH_MAX_JOBS
+    cpu_slots = cpu_slots or config.BATCH_CPU_SLOTS
+    llm_slots = llm_slots or config.BATCH_LLM_SLOTS
+    os.makedirs(output_root, exist_ok=True)
+
+    ctx = multiprocessing.get_context()
+    cpu_sem = ctx.BoundedSemaphore(cpu_slots)
+    llm_sem = ctx.BoundedSemaphore(llm_slots)
+    pool_workers = max(1, (os.cpu_count() or 1) // max_jobs)
+    print(f"[批量] {len(jobs)} 个任务, 并发 {max_jobs}, CPU 槽 {cpu_slots}, 大模型槽 {llm_slots}, "
+          f"每个任务至多 {pool_workers} 个子进程")
+
+    results = {}
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_jobs, mp_context=ctx,
+                             initializer=_init_worker, initargs=(cpu_sem, llm_sem)) as pool:
+        futures = {
+            pool.submit(_run_job, job, os.path.join(output_root, job["name"]), pool_workers): job["name"]
+            for job in jobs
+        }
+        for fut in as_completed(futures):
+            name = futures[fut]
+            try:
+                res = fut.result()
+            except Exception as e:
+                # 工作进程异常退出（如内存不足）时任务本身无法返回结果
+                res = {"name": name, "status": "failed", "error": repr(e)}
+            results[name] = res
+            print(f"  [{res['status']}] {name} ({res.get('elapsed', 0):.1f}s) -> {res.get('log', '')}")
+
+    ordered = [results[job["name"]] for job in jobs]
+    summary = {
+        "elapsed": round(time.perf_counter() - t0, 3),
+        "max_jobs": max_jobs,
+        "cpu_slots": cpu_slots,
+        "llm_slots": llm_slots,
+        "pool_workers": pool_workers,
+        "jobs": ordered,
+    }
+    summary_path = os.path.join(output_root, "batch_summary.json")
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    print(f"[批量] 完成, 总耗时 {summary['elapsed']:.1f}s, 汇总: {summary_path}")
+    return ordered
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="无界面批量运行问卷扩充流程")
+    parser.add_argument("job_file", help="任务文件 (JSON)")
+    parser.add_argument("--output-dir", help="各任务输出目录的根目录")
+    parser.add_argument("--max-jobs", type=int, help="同时运行的任务数")
+    parser.add_argument("--cpu-slots", type=int, help="同时处于 CPU 阶段的任务数")
+    parser.add_argument("--llm-slots", type=int, help="同时处于大模型阶段的任务数")
+    parser.add_argument("--only", nargs="+", help="只运行指定名称的任务")
+    args = parser.parse_args(argv)
+
+    jobs, data = load_jobs(args.job_file)
+    if args.only:
+        jobs = [job for job in jobs if job["name"] in set(args.only)]
+    results = run_batch(
+        jobs,
+        output_root=args.output_dir or data.get("output_dir"),
+        max_jobs=args.max_jobs or data.get("max_jobs"),
+        cpu_slots=args.cpu_slots or data.get("cpu_slots"),
+        llm_slots=args.llm_slots or data.get("llm_slots"),
+    )
+    return 0 if all(r["status"] == "ok" for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
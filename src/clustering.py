@@ -1,3 +1,4 @@
+import os
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.cluster.hierarchy import linkage, dendrogram, fcluster
@@ -5,9 +6,28 @@ from sklearn.cluster import KMeans
 from sklearn.mixture import GaussianMixture
 from sklearn.metrics import silhouette_score
 
+from . import config
+
 plt.rcParams['font.sans-serif'] = ['SimHei']
 plt.rcParams['axes.unicode_minus'] = False
 
+def auto_select_k(X, Z, max_k):
+    """
+    在 2..max_k 中选择层次聚类切分后轮廓系数最高的 k（样本较多时抽样计算）
+    """
+    sample_size = min(len(X), config.AUTO_K_SAMPLE_SIZE)
+    best_k, best_sil = 2, -np.inf
+    for k in range(2, max_k + 1):
+        labels = fcluster(Z, k, criterion='maxclust')
+        if len(np.unique(labels)) < 2:
+            continue
+        sil = silhouette_score(X, labels, sample_size=sample_size, random_state=42)
+        if sil > best_sil:
+            best_k, best_sil = k, sil
+    print(f"  自动选择聚类数 k={best_k} (轮廓系数 {best_sil:.4f})")
+    return best_k
+
+
 def hierarchical_clustering(df_encoded):
     print("\n[2/7] 层次聚类分析 ...")
     X = df_encoded.values
@@ -20,17 +40,28 @@ def hierarchical_clustering(df_encoded):
         counts = np.bincount(labels)[1:]
         print(f"  k={k} -> ", [f'簇{i+1}:{c}' for i, c in enumerate(counts)])
 
-    plt.figure(figsize=(8,5))
+    fig = plt.figure(figsize=(8,5))
     dendrogram(Z, truncate_mode='lastp', p=max_k, show_contracted=True)
     plt.title("层次聚类截断树状图")
     plt.xlabel("样本数")
     plt.ylabel("距离")
-    plt.show()
+    if config.INTERACTIVE:
+        plt.show()
+    else:
+        os.makedirs(config.OUTPUT_DIR, exist_ok=True)
+        fig.savefig(os.path.join(config.OUTPUT_DIR, "dendrogram.png"))
+        plt.close(fig)
 
-    k = int(input(f"请输入最终聚类数 k (范围 2 到 {max_k}): "))
+    if isinstance(config.CLUSTER_K, int):
+        k = config.CLUSTER_K
+        print(f"  使用配置的聚类数 k={k}")
+    elif config.CLUSTER_K is None and config.INTERACTIVE:
+        k = int(input(f"请输入最终聚类数 k (范围 2 到 {max_k}): "))
+    else:
+        k = auto_select_k(X, Z, max_k)
     return X, k, Z
 
-def final_clustering(X, k):
+def final_clustering(X, k, return_model=False):
     print("\n[3/7] 最终聚类 (KMeans & GMM) ...")
     # KMeans 保持 KMeans++ 初始化
     km = KMeans(n_clusters=k, init='k-means++', n_init=10, random_state=42)
@@ -66,4 +97,7 @@ def final_clustering(X, k):
     counts = np.bincount(final_labels)
     print("  各簇分布:", counts)
 
+    if return_model:
+        # 返回选中的已拟合模型，便于增量模式下对新问卷直接 predict
+        return final_labels, centers, gmm if algo == "GMM" else km
     return final_labels, centers
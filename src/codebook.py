@@ -0,0 +1,220 @@
+import re
+import json
+import numpy as np
+import pandas as pd
+
+from . import config
+
+# 跳过 / 无法识别的答案统一编码为 -1
+SKIP_CODE = -1
+SCALE_LEVELS = 7
+MULTI_SPLIT_RE = r'[;；,|、┋]+'
+
+
+def load_codebook(json_path=None):
+    """
+    读取 question_list.json，为每道题构造编码信息：
+      {"qnum", "col_name", "type", "letters", "labels", "n_codes"}
+    单选题编码为选项下标，量表题编码为 数值-1，多选题编码为选项位掩码。
+    """
+    json_path = json_path or config.QUESTION_LIST_PATH
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    codebook = []
+    for q in data["questions"]:
+        col_name = q["col_name"].strip()
+        m = re.match(r'^(\d+)', col_name)
+        if not m:
+            continue
+        letters, labels = [], []
+        for opt in q.get("options", []):
+            m2 = re.match(r'^([A-Z])\.\s*(.*)$', opt.strip())
+            if m2:
+                letters.append(m2.group(1))
+                labels.append(m2.group(2).strip())
+        if q["type"] == "matrix_7":
+            n_codes = SCALE_LEVELS
+        else:
+            n_codes = len(letters)
+        codebook.append({
+            "qnum": m.group(1),
+            "col_name": col_name,
+            "type": q["type"],
+            "letters": letters,
+            "labels": labels,
+            "n_codes": n_codes,
+        })
+    return codebook
+
+
+def load_scale_groups(json_path=None):
+    """
+    读取 question_list.json 中声明的量表题组（用于信度分析），格式：
+      {"name": "困难题组", "questions": ["10", ...], "filter": {"question": "5", "answer": "A"}}
+    filter 可省略，表示不筛选样本。
+    """
+    json_path = json_path or config.QUESTION_LIST_PATH
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data.get("scale_groups", [])
+
+
+def _match_option(token, q):
+    """
+    将单个答案片段匹配为选项下标：兼容字母("A")、完整选项("A. 男")与选项文本("男")
+    """
+    token = token.strip()
+    if not token:
+        return SKIP_CODE
+    if token in q["letters"]:
+        return q["letters"].index(token)
+    m = re.match(r'^([A-Z])\.', token)
+    if m and m.group(1) in q["letters"]:
+        return q["letters"].index(m.group(1))
+    if re.match(r'^\d+$', token):
+        num = int(token)
+        if 1 <= num <= len(q["letters"]):
+            return num - 1
+    if token in q["labels"]:
+        return q["labels"].index(token)
+    # 原始数据中的选项文本偶有多余括号等差异，按前缀宽松匹配
+    for i, label in enumerate(q["labels"]):
+        if len(label) >= 2 and (token.startswith(label) or label.startswith(token)):
+            return i
+    return SKIP_CODE
+
+
+def encode_value(val, q):
+    """
+    将单个答案编码为整数（跳过或无法识别时为 SKIP_CODE）
+    """
+    if val is None or (isinstance(val, float) and np.isnan(val)):
+        return SKIP_CODE
+    s = str(val).strip()
+    if s == "" or s == "(跳过)" or s.lower() == "nan":
+        return SKIP_CODE
+    if q["type"] == "matrix_7":
+        if re.match(r'^\d+(\.0+)?$', s):
+            num = int(float(s))
+            return num - 1 if 1 <= num <= SCALE_LEVELS else SKIP_CODE
+        if re.match(r'^[A-G]$', s):
+            return ord(s) - ord('A')
+        return SKIP_CODE
+    if q["type"] == "multiple":
+        # 原始数据用 ┋ 分隔且选项文本本身可能含 "、"，因此优先按 ┋ 切分
+        parts = s.split("┋") if "┋" in s else re.split(MULTI_SPLIT_RE, s)
+        mask = 0
+        for p in parts:
+            idx = _match_option(p, q)
+            if idx != SKIP_CODE:
+                mask |= 1 << idx
+        return mask if mask else SKIP_CODE
+    return _match_option(s, q)
+
+
+def decode_value(code, q):
+    """
+    将编码还原为 AI 问卷使用的字母 / 数字格式
+    """
+    if code == SKIP_CODE:
+        return "(跳过)"
+    if q["type"] == "matrix_7":
+        return str(int(code) + 1)
+    if q["type"] == "multiple":
+        return "、".join(q["letters"][i] for i in range(len(q["letters"])) if int(code) >> i & 1)
+    return q["letters"][int(code)]
+
+
+def match_columns(columns, codebook):
+    """
+    按题号将 DataFrame 列与题目对应，返回与 codebook 等长的列名列表（缺失为 None）
+    """
+    by_num = {}
+    for col in columns:
+        m = re.match(r'^(\d+)', str(col))
+        if m and m.group(1) not in by_num:
+            by_num[m.group(1)] = col
+    return [by_num.get(q["qnum"]) for q in codebook]
+
+
+def encode_frame(df, codebook):
+    """
+    将问卷 DataFrame 编码为 (行数, 题数) 的 int32 矩阵。
+    每列只对去重后的取值做一次解析，再整体映射。
+    """
+    cols = match_columns(df.columns, codebook)
+    codes = np.full((len(df), len(codebook)), SKIP_CODE, dtype=np.int32)
+    for j, (q, col) in enumerate(zip(codebook, cols)):
+        if col is None:
+            continue
+        inverse, uniq = pd.factorize(df[col])
+        mapped = np.array([encode_value(u, q) for u in uniq] + [SKIP_CODE], dtype=np.int32)
+        # factorize 将缺失值记为 -1，恰好索引到末尾的 SKIP_CODE
+        codes[:, j] = mapped[inverse]
+    return codes
+
+
+def encode_row(row, codebook):
+    """
+    将单条问卷（列名 -> 答案 的字典）编码为长度为题数的 int32 向量
+    """
+    cols = match_columns(row.keys(), codebook)
+    return np.array(
+        [encode_value(row[col], q) if col is not None else SKIP_CODE for q, col in zip(codebook, cols)],
+        dtype=np.int32,
+    )
+
+
+def code_offsets(codebook):
+    """
+    每道题在“选项指示矩阵”中的起始列，最后一个元素为总列数
+    """
+    sizes = [q["n_codes"] for q in codebook]
+    return np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+
+
+def dense_indicator(codes, codebook, dtype=np.float32):
+    """
+    与 indicator_matrix 相同的展开，但直接写入稠密矩阵（适合按行分块处理，块内做矩阵乘法）
+    """
+    offsets = code_offsets(codebook)
+    n = codes.shape[0]
+    out = np.zeros((n, int(offsets[-1])), dtype=dtype)
+    rows = np.arange(n)
+    for j, q in enumerate(codebook):
+        col = codes[:, j]
+        valid = col != SKIP_CODE
+        if q["type"] == "multiple":
+            bits = np.arange(q["n_codes"])
+            out[:, offsets[j]:offsets[j + 1]] = ((col[:, None] >> bits) & 1) * valid[:, None]
+        else:
+            out[rows[valid], offsets[j] + col[valid]] = 1
+    return out
+
+
+def indicator_matrix(codes, codebook):
+    """
+    将编码矩阵展开为稀疏的 (行数, 选项总数) 0/1 指示矩阵（多选题按位展开）
+    """
+    from scipy import sparse
+
+    offsets = code_offsets(codebook)
+    n = codes.shape[0]
+    rows_list, cols_list = [], []
+    for j, q in enumerate(codebook):
+        col = codes[:, j]
+        valid = col != SKIP_CODE
+        if q["type"] == "multiple":
+            bits = np.arange(q["n_codes"])
+            hit = ((col[:, None] >> bits) & 1).astype(bool) & valid[:, None]
+            r, b = np.nonzero(hit)
+            rows_list.append(r)
+            cols_list.append(offsets[j] + b)
+        else:
+            r = np.nonzero(valid)[0]
+            rows_list.append(r)
+            cols_list.append(offsets[j] + col[r])
+    rows = np.concatenate(rows_list) if rows_list else np.array([], dtype=np.int64)
+    cols = np.concatenate(cols_list) if cols_list else np.array([], dtype=np.int64)
+    data = np.ones(len(rows), dtype=np.float32)
+    return sparse.csr_matrix((data, (rows, cols)), shape=(n, int(offsets[-1])))
@@ -3,8 +3,10 @@ import os
 # === 基础路径 ===
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 DATA_PATH = os.path.join(BASE_DIR, "data", "survey_data.csv")
+QUESTION_LIST_PATH = os.path.join(BASE_DIR, "prompts", "question_list.json")
+PROMPT_DIR = os.path.join(BASE_DIR, "prompts")
 
-# === 输出目录 ===
+# === 输出目录（批量运行时每个任务会改写为各自的目录）===
 OUTPUT_DIR = os.path.join(BASE_DIR, "outputs")
 if not os.path.exists(OUTPUT_DIR):
     os.makedirs(OUTPUT_DIR)
@@ -12,6 +14,11 @@ if not os.path.exists(OUTPUT_DIR):
 AI_OUTPUT_CSV = os.path.join(OUTPUT_DIR, "ai_simulated_responses.csv")
 JITTER_OUTPUT_CSV = os.path.join(OUTPUT_DIR, "jittered_responses.csv")
 
+# 预处理缓存：按 CSV、题目 JSON 与编码版本的哈希存放，源文件变化时自动失效
+PREPROCESS_CACHE_ENABLED = True
+PREPROCESS_CACHE_DIR = os.path.join(OUTPUT_DIR, "cache")
+PREPROCESS_CACHE_KEEP = 4   # 保留最近使用的缓存数（多个数据集或批量任务共用缓存目录时互不清除）
+
 # 模型配置示例（可按需求切换本地模型或OpenAI接口）
 USE_OPENAI_FOR_4STEPS = True
 USE_OPENAI_FOR_QUESTION = True
@@ -21,6 +28,22 @@ MODEL_PATH_QUESTION = os.path.join(BASE_DIR, "models", "DeepSeek-R1-Distill-Llam
 
 DEEPSEEK_API_KEY = "XXXXXXXXXXXXXXXXXXXXXXXXXXXXX"
 OPENAI_MODEL_NAME = "deepseek-reasoner"
+OPENAI_BASE_URL = "https://api.deepseek.com/v1"
+
+# 多后端路由（非空时覆盖上面的 USE_OPENAI_* 开关）
+# 每个后端为一个字典，例如：
+#   {"name": "deepseek", "type": "openai", "base_url": OPENAI_BASE_URL, "model": OPENAI_MODEL_NAME, "max_concurrency": 4}
+#   {"name": "llama-server", "type": "openai", "base_url": "http://127.0.0.1:8080/v1", "api_key": "none", "model": "local"}
+#   {"name": "gguf", "type": "local", "model_path": MODEL_PATH_QUESTION, "max_concurrency": 1}
+MODEL_BACKENDS_4STEPS = []
+MODEL_BACKENDS_QUESTION = []
+
+# 各阶段单次调用的 max_tokens 上限（路由模式下生效）
+STAGE_MAX_TOKENS = {"4steps": 1024, "question": 2048}
+
+ROUTER_MAX_ATTEMPTS = 3        # 单次请求最多尝试的后端数
+ROUTER_REQUEST_TIMEOUT = 120   # OpenAI 兼容后端的请求超时（秒）
+ROUTER_MAX_COOLDOWN = 60       # 后端连续失败后的最长冷却时间（秒）
 
 N_THREADS = 16
 USE_GPU_LAYERS = 9999  # 视显存情况
@@ -28,8 +51,83 @@ USE_GPU_LAYERS = 9999  # 视显存情况
 # 问卷扩充参数
 TARGET_TOTAL = 1000    # AI 模拟问卷生成的目标数量
 
+# 交互模式：True 时显示树状图并通过 input() 询问聚类数与要去除的簇；
+# False（无界面批量运行）时树状图保存为图片，聚类数与去除的簇取下面的配置
+INTERACTIVE = True
+CLUSTER_K = None            # 聚类数：整数为固定值，"auto" 按轮廓系数自动选择，None 在交互模式下询问、否则同 "auto"
+CLUSTER_REMOVE_IDS = None   # 要去除的簇编号列表；None 在交互模式下询问、否则不去除
+AUTO_K_SAMPLE_SIZE = 5000   # 自动选择 k 时计算轮廓系数的最大抽样数
+
+# 批量运行（python -m src.batch_runner jobs.json）
+BATCH_OUTPUT_DIR = os.path.join(OUTPUT_DIR, "batch")
+BATCH_MAX_JOBS = 2          # 同时运行的任务数
+BATCH_CPU_SLOTS = 1         # 同时处于 CPU 阶段（预处理、聚类、抖动、分析）的任务数
+BATCH_LLM_SLOTS = 2         # 同时处于大模型阶段（画像、问卷生成）的任务数
+
+# 自适应配额：生成时跟踪各簇逐题分布，达到容差后提前停止并转移剩余配额
+ADAPTIVE_QUOTA_ENABLED = False
+ADAPTIVE_TOLERANCE = 0.01      # 逐题 JSD 平均值超出同样本量抽样噪声的容差
+ADAPTIVE_NOISE_RESAMPLES = 30  # 估计各簇 JSD 抽样噪声的 bootstrap 次数
+ADAPTIVE_MIN_SAMPLES = 20      # 每簇至少生成的问卷数
+ADAPTIVE_MIN_FRACTION = 0.3    # 每簇至少完成其初始配额的比例
+ADAPTIVE_MAX_BOOST = 0.5       # 每簇最多额外获得其初始配额的比例
+
+# 查重：生成时在线拒绝重复问卷，抖动后再做一次批量去重
+DEDUP_ENABLED = True
+DEDUP_JITTER_ENABLED = True
+DEDUP_MAX_DISTANCE = 2              # 不同题目数 <= 该值视为近似重复，一行作答、另一行跳过也算不同（0 表示只查完全重复）
+DEDUP_MIN_ANSWERED = 10             # 作答题数少于该值的问卷（如大量跳题）不参与查重，近似重复还要求两行共同作答题数不少于该值
+DEDUP_MAX_REJECTS = 5               # 同一簇连续拒绝次数上限，超过后接受该条问卷
+DEDUP_TEMPERATURE_STEP = 0.05       # 每次拒绝后该簇温度的提升量，接受一条问卷后回落同样的量
+DEDUP_MAX_TEMPERATURE_BOOST = 0.3   # 温度提升的上限
+
+# 分布式生成：任务写入 SQLite 队列文件，任意数量的工作进程 / 机器租用任务并提交结果
+# 工作进程：python -m src.work_queue worker --queue <队列文件> [--backends backends.json]
+QUEUE_ENABLED = False
+QUEUE_PATH = os.path.join(OUTPUT_DIR, "generation_queue.sqlite")
+QUEUE_JOURNAL_MODE = "WAL"     # 多台机器经网络文件系统共享队列时改为 "DELETE"
+QUEUE_LEASE_SECONDS = 300      # 租约时长，超时未提交的任务重新入队
+QUEUE_MAX_ATTEMPTS = 3         # 单个任务最多尝试次数
+QUEUE_TOPUP_ROUNDS = 3         # 合并后某簇因重复或失败少于目标数时，最多追加任务的轮数
+QUEUE_POLL_INTERVAL = 2.0      # 队列暂无可租任务时的轮询间隔（秒）
+
+# 聚类前降维（None 表示不降维）："pca"、"svd"（稀疏随机化截断 SVD）或 "mca"（多重对应分析）
+# 层次聚类、KMeans / GMM 与画像代表样本的选取都在降维后的矩阵上进行
+REDUCTION_METHOD = None
+REDUCTION_COMPONENTS = 0.9       # 整数为保留维数，小数为目标累计解释比例
+REDUCTION_MAX_COMPONENTS = 50    # "svd" 按解释比例选维数时最多计算的维数
+REDUCTION_COMPARE = False        # 是否在原始维度上重跑聚类，报告加速比与轮廓系数变化
+
 # 是否对 AI 生成的问卷进行抖动处理（True：抖动；False：不抖动）
 JITTER_ENABLED = True
+JITTER_SEED = 42              # 抖动随机种子（None 表示每次随机，日志中会打印实际使用的种子）
+JITTER_BLOCK_SIZE = 50_000    # 每块问卷数；分块方式固定，结果与进程数无关
+JITTER_WORKERS = None         # 抖动进程数（None 表示使用全部 CPU 核心）
+
+# 增量模式：只编码新增问卷并分配到已有簇，漂移超过阈值时才重新聚类与生成画像
+INCREMENTAL_MODE = False
+INCREMENTAL_STATE_PATH = os.path.join(OUTPUT_DIR, "pipeline_state.pkl")
+INCREMENTAL_SHARE_DRIFT = 0.1        # 聚类后累计新增问卷的簇占比相对聚类时占比的总变差距离阈值
+INCREMENTAL_MIN_DRIFT_ROWS = 50      # 累计新增问卷少于该数时不按占比判断漂移（样本太少，占比噪声大）
+INCREMENTAL_OUTLIER_RATE = 0.25      # 新问卷离群比例阈值
+INCREMENTAL_RADIUS_PERCENTILE = 95   # 簇半径取簇内距离的分位数
 
 # 可选：要忽略分布可视化的列
 IGNORE_COLS = []
+
+# 是否绘制对比图（无界面的批量运行可设为 False 跳过全部绘图）
+PLOT_ENABLED = True
+# 绘图进程数（None 表示使用全部 CPU 核心）
+PLOT_WORKERS = None
+
+# 分布保真度指标表的输出格式："csv" 或 "parquet"（parquet 需要安装 pyarrow）
+FIDELITY_REPORT_FORMAT = "csv"
+FIDELITY_CHUNK_ROWS = 16384   # 计算共现矩阵时每次展开为稠密矩阵的行数
+
+# 信度分析：bootstrap 重抽样次数、置信水平、随机种子
+BOOTSTRAP_RESAMPLES = 2000
+BOOTSTRAP_CONFIDENCE = 0.95
+BOOTSTRAP_SEED = 42
+# 单批重抽样计数矩阵的最大元素数（控制内存）。每个元素同时占用 int64 抽样下标、
+# int64 计数与 float64 计数三份数组，峰值约 24 字节/元素，默认值约 120MB
+BOOTSTRAP_MAX_CELLS = 5_000_000
@@ -1,161 +1,166 @@
 import numpy as np
-import random
-import re
-import copy
-import json
+import pandas as pd
 import os
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
 
-from .questionnaire_generation import apply_question_logic
+from . import config
+from .codebook import SKIP_CODE
+from .response_store import (
+    ResponseStore, JITTER_RANDOM, JITTER_Q5_FLIP, JITTER_Q5_B, JITTER_Q35_FLIP,
+)
 
-def load_allowed_options():
+def _skip_from(store, rows, first_qnum, last_qnum=None):
     """
-    读取 prompts/question_list.json 文件，构造映射：
-    题号（字符串形式） -> 允许的选项字母列表（仅对单选和多选题有效）
-    例如："1" -> ["A", "B"]
+    将指定行中题号位于 [first_qnum, last_qnum] 的题目置为跳过
     """
-    allowed = {}
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    json_path = os.path.join(base_dir, "prompts", "question_list.json")
-    with open(json_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    for q in data["questions"]:
-        col_name = q["col_name"].strip()
-        m = re.match(r'^(\d+)', col_name)
-        if m and q["type"] in ["single", "multiple"]:
-            qnum = m.group(1)
-            opts = q.get("options", [])
-            letters = []
-            for opt in opts:
-                # 假设选项格式为 "A. xxx"
-                m2 = re.match(r'^([A-Z])\.', opt.strip())
-                if m2:
-                    letters.append(m2.group(1))
-            allowed[qnum] = letters
-    return allowed
-
-def data_jitter(df_raw, ai_responses, multi_cols, scale_cols, target_total):
+    for q in store.codebook:
+        num = int(q["qnum"])
+        if num >= first_qnum and (last_qnum is None or num <= last_qnum):
+            store.column(q["qnum"])[rows] = SKIP_CODE
+
+
+def apply_question_logic_columns(store):
+    """
+    apply_question_logic 的列式版本：
+    第5题为 B 时 6~36 题跳过；第35题为 B 时第36题跳过
+    """
+    if "5" in store.qpos:
+        _skip_from(store, store.column("5") == 1, 6, 36)
+    if "35" in store.qpos and "36" in store.qpos:
+        store.column("36")[store.column("35") == 1] = SKIP_CODE
+
+
+def _random_bit(bits, n_opts, rng):
+    """
+    在每行给定的位集合中等概率选出一位；集合为空时返回 -1
+    """
+    keys = rng.random((len(bits), n_opts))
+    member = ((bits[:, None] >> np.arange(n_opts)) & 1).astype(bool)
+    keys[~member] = -1.0
+    choice = keys.argmax(axis=1)
+    choice[~member.any(axis=1)] = -1
+    return choice
+
+
+def _jitter_block(store, multi_cols, scale_cols, seed):
+    """
+    对一个行块原地抖动并返回。seed 为该块独立的 SeedSequence 子序列，
+    结果只取决于块内数据与子序列，与由哪个进程执行无关。
+    """
+    n = len(store)
+    rng = np.random.default_rng(seed)
+    kind = store.jitter_kind[:n]
+    kind[:] = JITTER_RANDOM
+    mask = store.jitter_mask[:n]
+    done = np.zeros(n, dtype=bool)
+
+    # === 处理第五题逻辑 ===
+    if "5" in store.qpos:
+        q5 = store.column("5")
+        orig_q5 = q5.copy()
+        # 若第五题为 A，则有 5% 概率改为 B，并将 6~36题置为 "(跳过)"
+        flip = (orig_q5 == 0) & (rng.random(n) < 0.05)
+        q5[flip] = 1
+        _skip_from(store, flip, 6)
+        kind[flip] = JITTER_Q5_FLIP
+        # 若第五题为 B，则将 6~36题全部置为 "(跳过)"
+        is_b = orig_q5 == 1
+        _skip_from(store, is_b, 6)
+        kind[is_b] = JITTER_Q5_B
+        done |= flip | is_b
+
+    # === 处理第三十五题逻辑 ===
+    if "35" in store.qpos:
+        q35 = store.column("35")
+        flip = ~done & ((q35 == 0) | (q35 == 1)) & (rng.random(n) < 0.10)
+        q35[flip] = 1 - q35[flip]
+        if "36" in store.qpos:
+            q36 = store.column("36")
+            to_b = flip & (q35 == 1)
+            q36[to_b] = SKIP_CODE
+            kind[to_b] = JITTER_Q35_FLIP
+            done |= to_b
+            # 翻转为 A 时为第36题随机选择一个允许的选项
+            to_a = flip & (q35 == 0)
+            n36 = store.codebook[store.qpos["36"]]["n_codes"]
+            if n36:
+                q36[to_a] = rng.integers(n36, size=int(to_a.sum()))
+
+    # === 对除特殊题外的其它题进行随机抖动 ===
+    for j, (q, col) in enumerate(zip(store.codebook, store.question_cols)):
+        if col is None or q["qnum"] in ("5", "35", "36"):
+            continue
+        codes = store.answers[j][:n]
+        active = ~done & (codes != SKIP_CODE)
+        # 多选题处理：以 0.2 的概率修改答案
+        if col in multi_cols:
+            rows = np.nonzero(active & (rng.random(n) < 0.2))[0]
+            if len(rows) == 0 or q["n_codes"] == 0:
+                continue
+            bits = codes[rows].astype(np.int64)
+            n_opts = q["n_codes"]
+            count = np.zeros(len(rows), dtype=np.int64)
+            for b in range(n_opts):
+                count += (bits >> b) & 1
+            drop = (rng.random(len(rows)) < 0.5) & (count > 1)
+            drop_bit = _random_bit(bits, n_opts, rng)
+            add_bit = _random_bit(~bits & ((1 << n_opts) - 1), n_opts, rng)
+            new_bits = bits.copy()
+            sel = drop & (drop_bit >= 0)
+            new_bits[sel] &= ~(1 << drop_bit[sel])
+            sel = ~drop & (add_bit >= 0)
+            new_bits[sel] |= 1 << add_bit[sel]
+            codes[rows] = new_bits
+        # 量表题处理：以 0.2 的概率对数值做 ±1 调整（保持在 1～7 范围内）
+        elif col in scale_cols:
+            rows = np.nonzero(active & (rng.random(n) < 0.2))[0]
+            step = np.where(rng.random(len(rows)) < 0.5, -1, 1)
+            codes[rows] = np.clip(codes[rows] + step, 0, q["n_codes"] - 1)
+        # 单选题处理：以 0.1 的概率随机修改答案，确保在允许选项范围内且与原答案不同
+        elif q["type"] in ("single", "multiple") and q["n_codes"] > 1:
+            rows = np.nonzero(active & (rng.random(n) < 0.1))[0]
+            old = codes[rows].astype(np.int64)
+            new = rng.integers(q["n_codes"] - 1, size=len(rows))
+            new += new >= old
+            codes[rows] = new
+            mask[rows] |= np.uint64(1 << j)
+
+    apply_question_logic_columns(store)
+    return store
+
+
+def data_jitter(df_raw, ai_responses, multi_cols, scale_cols, target_total, seed=None, workers=None):
     """
     对 AI 生成的问卷进行抖动：
       - 逐条处理每个 AI 问卷，依据一定概率随机调整（可能不作任何改动），
       - 处理后的问卷数量与 AI 问卷数量一致，
-      - 将抖动后的问卷存入新的 CSV（与 AI 问卷 CSV 行数一致）。
+      - 返回抖动后的 ResponseStore（保存时再写出 CSV）。
+    所有规则按题目整列向量化执行，概率与逐行版本一致。
+    问卷按固定大小（config.JITTER_BLOCK_SIZE）分块，每块使用由同一个 SeedSequence 派生的
+    独立随机流，在进程池中并行处理；相同种子下结果与进程数无关、逐位一致。
+    seed 可为整数或 SeedSequence（增量运行为每批新问卷派生独立的 SeedSequence）。
     """
     print("\n[6/7] 数据抖动 ...")
-    allowed_options = load_allowed_options()
-    jittered_list = []
-
-    for row in ai_responses:
-        new_row = copy.deepcopy(row)
-
-        # === 处理第五题逻辑 ===
-        q5_col = None
-        for col in new_row:
-            if re.match(r'^5(\D|$)', col):  # 匹配以5开头的列名
-                q5_col = col
-                break
-        if q5_col:
-            q5_value = new_row.get(q5_col, '').strip()
-            # 若第五题为 A，则有 5% 概率改为 B，并将 6~36题置为 "(跳过)"
-            if q5_value == 'A' and np.random.rand() < 0.05:
-                new_row[q5_col] = 'B'
-                for col_j in new_row:
-                    if re.match(r'^(6|7|8|9|\d{2,})', col_j):  # 题号 ≥6 的列
-                        new_row[col_j] = '(跳过)'
-                new_row = apply_question_logic(new_row)
-                new_row["抖动来源"] = f"原问卷{new_row.get('原问卷序号', '?')}-5题A变B"
-                jittered_list.append(new_row)
-                continue  # 此问卷已处理，进入下一条
-            # 若第五题为 B，则将 6~36题全部置为 "(跳过)"
-            elif q5_value == 'B':
-                for col_j in new_row:
-                    if re.match(r'^(6|7|8|9|\d{2,})', col_j):
-                        new_row[col_j] = '(跳过)'
-                new_row = apply_question_logic(new_row)
-                new_row["抖动来源"] = f"原问卷{new_row.get('原问卷序号', '?')}-5题B处理"
-                jittered_list.append(new_row)
-                continue
+    if not isinstance(ai_responses, ResponseStore):
+        ai_responses = ResponseStore.from_frame(pd.DataFrame(ai_responses), columns=df_raw.columns)
+    n = len(ai_responses)
+    if isinstance(seed, np.random.SeedSequence):
+        seed_seq = seed
+    else:
+        seed_seq = np.random.SeedSequence(config.JITTER_SEED if seed is None else seed)
+    block = config.JITTER_BLOCK_SIZE
+    bounds = [(start, min(start + block, n)) for start in range(0, n, block)]
+    blocks = [ai_responses.take(np.arange(start, stop)) for start, stop in bounds]
+    children = seed_seq.spawn(len(blocks))
+    workers = min(workers or config.JITTER_WORKERS or os.cpu_count() or 1, max(len(blocks), 1))
 
-        # === 处理第三十五题逻辑 ===
-        q35_col = None
-        for col in new_row:
-            if re.match(r'^35(\D|$)', col):
-                q35_col = col
-                break
-        if q35_col and new_row.get(q35_col, '').strip() not in ['(跳过)']:
-            q35_value = new_row.get(q35_col, '').strip()
-            if q35_value in ['A', 'B'] and np.random.rand() < 0.10:
-                new_val = 'B' if q35_value == 'A' else 'A'
-                new_row[q35_col] = new_val
-                if new_val == 'B':
-                    for col_j in new_row:
-                        if re.match(r'^36(\D|$)', col_j):
-                            new_row[col_j] = '(跳过)'
-                    new_row = apply_question_logic(new_row)
-                    new_row["抖动来源"] = f"原问卷{new_row.get('原问卷序号', '?')}-35题翻转为B"
-                    jittered_list.append(new_row)
-                    continue
-                else:
-                    q36_cols = [col for col in new_row if re.match(r'^36(\D|$)', col)]
-                    allowed = allowed_options.get('36', [])
-                    if allowed:
-                        chosen = random.choice(allowed)
-                        for col_j in q36_cols:
-                            new_row[col_j] = chosen
-
-        # === 对除特殊题外的其它题进行随机抖动 ===
-        for col in df_raw.columns:
-            # 跳过不需处理的列
-            if col in ["簇编号", "原问卷序号"] or re.match(r'^(5|35|36)', col):
-                continue
-            old_val = new_row.get(col, "")
-            # 多选题处理：以 0.2 的概率修改答案
-            if col in multi_cols and old_val not in ["(跳过)"]:
-                if np.random.rand() < 0.2:
-                    parts = re.split(r'[;；,|、┋]+', str(old_val))
-                    parts = [p.strip() for p in parts if p.strip()]
-                    if parts and np.random.rand() < 0.5 and len(parts) > 1:
-                        parts.pop(np.random.randint(len(parts)))
-                    else:
-                        m_q = re.match(r'^(\d+)', col)
-                        allowed = allowed_options.get(m_q.group(1), []) if m_q else []
-                        available = [a for a in allowed if a not in parts]
-                        if available:
-                            parts.append(random.choice(available))
-                    new_row[col] = "、".join(sorted(set(parts)))
-            # 量表题处理：以 0.2 的概率对数值做 ±1 调整（保持在 1～7 范围内）
-            elif col in scale_cols and old_val not in ["(跳过)"]:
-                if np.random.rand() < 0.2:
-                    try:
-                        ival = int(old_val)
-                        ival += random.choice([-1, 1])
-                        ival = max(1, min(7, ival))
-                        new_row[col] = str(ival)
-                    except:
-                        pass
-            # 单选题处理：以 0.1 的概率随机修改答案，确保在允许选项范围内且与原答案不同
-            else:
-                m_q = re.match(r'^(\d+)', col)
-                if m_q:
-                    qnum = m_q.group(1)
-                    if qnum in allowed_options and old_val not in ["(跳过)"]:
-                        # 仅处理未归入多选和量表题的单选题
-                        if (col not in multi_cols) and (col not in scale_cols):
-                            if np.random.rand() < 0.1:
-                                opts = allowed_options.get(qnum, [])
-                                if old_val in opts:
-                                    possible = [x for x in opts if x != old_val]
-                                else:
-                                    possible = opts
-                                if possible:
-                                    new_row[col] = random.choice(possible)
-                                    if "抖动来源" in new_row:
-                                        new_row["抖动来源"] += f"; 单选题{col}抖动"
-                                    else:
-                                        new_row["抖动来源"] = f"原问卷{new_row.get('原问卷序号', '?')}-单选题{col}抖动"
-        new_row = apply_question_logic(new_row)
-        if "抖动来源" not in new_row:
-            new_row["抖动来源"] = f"原问卷{new_row.get('原问卷序号', '?')}-随机抖动"
-        jittered_list.append(new_row)
-
-    print(f"  抖动后问卷数: {len(jittered_list)}")
-    return jittered_list
+    if workers <= 1:
+        results = [_jitter_block(b, multi_cols, scale_cols, c) for b, c in zip(blocks, children)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_jitter_block, blocks, repeat(multi_cols), repeat(scale_cols), children))
+    store = ResponseStore.concat(results) if results else ai_responses.copy()
+
+    print(f"  抖动后问卷数: {len(store)} (种子 {seed_seq.entropy}{list(seed_seq.spawn_key) or ''}, {len(blocks)} 块, {workers} 个进程)")
+    return store
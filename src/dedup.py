@@ -0,0 +1,125 @@
+import numpy as np
+
+from . import config
+from .codebook import load_codebook, SKIP_CODE
+
+
+class _Bucket:
+    """
+    可增长的行号数组，避免查询时反复把 Python 列表转换为数组
+    """
+    __slots__ = ("ids", "size")
+
+    def __init__(self):
+        self.ids = np.empty(8, dtype=np.int64)
+        self.size = 0
+
+    def append(self, i):
+        if self.size == len(self.ids):
+            self.ids = np.resize(self.ids, len(self.ids) * 2)
+        self.ids[self.size] = i
+        self.size += 1
+
+    def view(self):
+        return self.ids[:self.size]
+
+
+class DedupIndex:
+    """
+    编码后问卷向量的去重索引：
+      - 完全重复：对编码向量的字节做哈希查找；
+      - 近似重复：两条问卷不同的题目数（汉明距离，一行作答、另一行跳过也算不同）<= max_distance，
+        且两行共同作答的题目数 >= min_answered（共同跳过的题目不算作“相同”的证据）。
+        因此两行共同作答的题目中最多有 max_distance 题不同，与跳题多少无关。
+        将题目交错划分为 max_distance + 1 个分段，按抽屉原理，近似重复的两行
+        至少有一个分段完全相同，因此只需在同分段的桶内做向量化比对，且不会漏检。
+    作答题数少于 min_answered 的问卷（如第5题选“否”后其余题目全部跳过）既不判为完全重复也不判为近似重复。
+    """
+    def __init__(self, codebook=None, max_distance=None, capacity=1024, min_answered=None):
+        self.codebook = codebook or load_codebook()
+        self.max_distance = config.DEDUP_MAX_DISTANCE if max_distance is None else max_distance
+        self.min_answered = config.DEDUP_MIN_ANSWERED if min_answered is None else min_answered
+        n_q = len(self.codebook)
+        n_bands = min(n_q, self.max_distance + 1) if self.max_distance > 0 else 0
+        self.bands = [np.arange(b, n_q, n_bands) for b in range(n_bands)]
+        self.codes = np.empty((capacity, n_q), dtype=np.int32)
+        self.size = 0
+        self.exact = {}
+        self.buckets = [dict() for _ in self.bands]
+
+    def __len__(self):
+        return self.size
+
+    def query(self, codes):
+        """
+        返回 (类型, 匹配行号)：类型为 "exact" / "near" / None
+        """
+        codes = np.asarray(codes, dtype=np.int32)
+        answered = codes != SKIP_CODE
+        if np.count_nonzero(answered) < self.min_answered:
+            return None, None
+        hit = self.exact.get(codes.tobytes())
+        if hit is not None:
+            return "exact", hit
+        if not self.bands or self.size == 0:
+            return None, None
+        cands = []
+        for b, cols in enumerate(self.bands):
+            bucket = self.buckets[b].get(codes[cols].tobytes())
+            if bucket is not None:
+                cands.append(bucket.view())
+        if not cands:
+            return None, None
+        cand = np.concatenate(cands) if len(cands) > 1 else cands[0]
+        rows = self.codes[cand]
+        dist = np.count_nonzero(rows != codes, axis=1)
+        common = np.count_nonzero((rows != SKIP_CODE) & answered, axis=1)
+        near = (dist <= self.max_distance) & (common >= self.min_answered)
+        if near.any():
+            best = int(np.argmin(np.where(near, dist, np.iinfo(np.int64).max)))
+            return "near", int(cand[best])
+        return None, None
+
+    def add(self, codes):
+        codes = np.asarray(codes, dtype=np.int32)
+        if self.size == len(self.codes):
+            self.codes = np.resize(self.codes, (len(self.codes) * 2, self.codes.shape[1]))
+        idx = self.size
+        self.codes[idx] = codes
+        self.size += 1
+        self.exact.setdefault(codes.tobytes(), idx)
+        for b, cols in enumerate(self.bands):
+            key = codes[cols].tobytes()
+            bucket = self.buckets[b].get(key)
+            if bucket is None:
+                bucket = self.buckets[b][key] = _Bucket()
+            bucket.append(idx)
+        return idx
+
+    def extend(self, codes):
+        """
+        将已有问卷（编码矩阵）全部加入索引，不做查重，如增量模式下已写入 CSV 的 AI 问卷
+        """
+        for row_codes in np.asarray(codes, dtype=np.int32):
+            self.add(row_codes)
+
+
+def dedup_store(store, drop_near=True, max_distance=None):
+    """
+    对一个 ResponseStore（如 data_jitter 的输出）做批量去重，保留首次出现的问卷。
+    直接使用存储中的编码矩阵，无需重新解析答案。
+    返回 (去重后的 ResponseStore, {"exact": 完全重复数, "near": 近似重复数})
+    """
+    codes = store.codes_matrix()
+    index = DedupIndex(codebook=store.codebook, max_distance=max_distance, capacity=max(1, len(store)))
+    kept = []
+    report = {"exact": 0, "near": 0}
+    for i, row_codes in enumerate(codes):
+        kind, _ = index.query(row_codes)
+        if kind is not None:
+            report[kind] += 1
+            if kind == "exact" or drop_near:
+                continue
+        index.add(row_codes)
+        kept.append(i)
+    return store.take(np.asarray(kept, dtype=np.int64)), report
@@ -0,0 +1,190 @@
+import os
+import numpy as np
+import pandas as pd
+from scipy.stats import chi2 as chi2_dist
+
+from . import config
+from .codebook import load_codebook, encode_frame, dense_indicator, code_offsets
+from .response_store import ResponseStore
+
+
+def _labels_from_frame(df):
+    """
+    从生成问卷的“簇编号”列取出整数簇标签，缺失时记为 -1
+    """
+    if "簇编号" not in df.columns:
+        return np.full(len(df), -1, dtype=np.int64)
+    return pd.to_numeric(df["簇编号"], errors="coerce").fillna(-1).astype(np.int64).to_numpy()
+
+
+def _group_ids(labels, cluster_ids):
+    """
+    每行所属的组号：1..簇数 对应各簇（第 0 组为全部有效样本），不属于任何簇的行记为 -1
+    """
+    ids = np.asarray(cluster_ids, dtype=np.int64)
+    labels = np.asarray(labels, dtype=np.int64)
+    pos = np.searchsorted(ids, labels)
+    hit = pos < len(ids)
+    hit[hit] = ids[pos[hit]] == labels[hit]
+    return np.where(hit, pos + 1, -1)
+
+
+def segment_metrics(ref, cmp, offsets):
+    """
+    ref / cmp 为 (组数, 选项总数) 的计数矩阵，按题目分段一次性计算：
+    Jensen-Shannon 散度(以 2 为底)、卡方同质性检验、总变差距离
+    """
+    starts = offsets[:-1]
+    sizes = np.diff(offsets)
+    seg = np.repeat(np.arange(len(sizes)), sizes)
+
+    ref_tot = np.add.reduceat(ref, starts, axis=1)
+    cmp_tot = np.add.reduceat(cmp, starts, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = np.where(ref_tot[:, seg] > 0, ref / ref_tot[:, seg], 0.0)
+        q = np.where(cmp_tot[:, seg] > 0, cmp / cmp_tot[:, seg], 0.0)
+        m = 0.5 * (p + q)
+        kl_pm = np.where(p > 0, p * np.log2(p / m), 0.0)
+        kl_qm = np.where(q > 0, q * np.log2(q / m), 0.0)
+        jsd = 0.5 * (np.add.reduceat(kl_pm, starts, axis=1) + np.add.reduceat(kl_qm, starts, axis=1))
+        tv = 0.5 * np.add.reduceat(np.abs(p - q), starts, axis=1)
+
+        col_tot = ref + cmp
+        total = (ref_tot + cmp_tot)[:, seg]
+        e_ref = ref_tot[:, seg] * col_tot / total
+        e_cmp = cmp_tot[:, seg] * col_tot / total
+        chi = np.where(e_ref > 0, (ref - e_ref) ** 2 / e_ref, 0.0) \
+            + np.where(e_cmp > 0, (cmp - e_cmp) ** 2 / e_cmp, 0.0)
+        chi2 = np.add.reduceat(chi, starts, axis=1)
+        dof = np.add.reduceat((col_tot > 0).astype(np.int64), starts, axis=1) - 1
+        chi2_p = chi2_dist.sf(chi2, np.maximum(dof, 1))
+
+    empty = (ref_tot == 0) | (cmp_tot == 0)
+    jsd[empty] = np.nan
+    tv[empty] = np.nan
+    chi2[empty] = np.nan
+    chi2_p[empty | (dof < 1)] = np.nan
+    return {"n_ref": ref_tot, "n_cmp": cmp_tot, "jsd": jsd, "chi2": chi2, "chi2_p": chi2_p, "tv": tv}
+
+
+def _group_statistics(codes, codebook, group, n_groups):
+    """
+    计算整体及各组的选项计数 (组数, 选项总数) 与选项共现率矩阵。
+    按组排序后每次只展开 config.FIDELITY_CHUNK_ROWS 行的稠密指示矩阵，块内用 float32 矩阵乘法求共现，
+    内存与样本数无关；整体的计数与共现即为各组之和，无需重复计算。
+    （对该矩阵而言稠密分块乘法比稀疏 M.T @ M 快数倍。）
+    """
+    n_opts = int(code_offsets(codebook)[-1])
+    counts = np.zeros((n_groups, n_opts))
+    order = np.argsort(group, kind="stable")
+    bounds = np.searchsorted(group[order], np.arange(1, n_groups + 1))
+    chunk = config.FIDELITY_CHUNK_ROWS
+
+    coocs = [None] * n_groups
+    total = None
+    for g in range(1, n_groups):
+        idx = order[bounds[g - 1]:bounds[g]]
+        if len(idx) == 0:
+            continue
+        co = np.zeros((n_opts, n_opts))
+        for start in range(0, len(idx), chunk):
+            D = dense_indicator(codes[idx[start:start + chunk]], codebook)
+            counts[g] += D.sum(axis=0, dtype=np.float64)
+            co += D.T @ D
+        total = co if total is None else total + co
+        coocs[g] = co / len(idx)
+    counts[0] = counts[1:].sum(axis=0)
+    if total is not None:
+        coocs[0] = total / (bounds[-1] - bounds[0])
+    return counts, coocs
+
+
+def _cooccurrence_drift(c_ref, c_cmp, offsets):
+    """
+    每道题的选项与其它题选项之间共现率的平均绝对漂移
+    """
+    sizes = np.diff(offsets)
+    if c_ref is None or c_cmp is None:
+        return np.full(len(sizes), np.nan)
+    seg = np.repeat(np.arange(len(sizes)), sizes)
+    drift = np.abs(c_ref - c_cmp)
+    drift[seg[:, None] == seg[None, :]] = 0.0
+    per_q = np.add.reduceat(drift.sum(axis=1), offsets[:-1])
+    total = offsets[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return per_q / (sizes * (total - sizes))
+
+
+def compute_fidelity(df_raw, orig_labels, datasets, codebook=None):
+    """
+    对每道题比较原始问卷与各生成数据集（如 {"AI": ai_store, "Jitter": jit_store}，
+    可为 DataFrame 或 ResponseStore）的选项分布。原始问卷同样可传入已编码的 ResponseStore，避免重复解析文本；
+    输出整体及分簇的 JSD、卡方、总变差与共现漂移，返回一张长表。
+    原始问卷只统计未被剔除（标签 != -1）的样本。
+    """
+    if codebook is None:
+        codebook = load_codebook()
+    codebook = [q for q in codebook if q["n_codes"] > 0]
+    offsets = code_offsets(codebook)
+
+    orig_labels = np.asarray(orig_labels, dtype=np.int64)
+    cluster_ids = sorted(int(c) for c in np.unique(orig_labels) if c != -1)
+    group_names = ["all"] + [str(c) for c in cluster_ids]
+
+    def prepare(df, labels):
+        codes = df.codes_matrix(codebook) if isinstance(df, ResponseStore) else encode_frame(df, codebook)
+        return _group_statistics(codes, codebook, _group_ids(labels, cluster_ids), len(group_names))
+
+    ref_counts, ref_coocs = prepare(df_raw, orig_labels)
+
+    tables = []
+    for name, df in datasets.items():
+        if df is None or len(df) == 0:
+            continue
+        labels = df.labels() if isinstance(df, ResponseStore) else _labels_from_frame(df)
+        cmp_counts, cmp_coocs = prepare(df, labels)
+        metrics = segment_metrics(ref_counts, cmp_counts, offsets)
+        drift = np.vstack([_cooccurrence_drift(r, c, offsets) for r, c in zip(ref_coocs, cmp_coocs)])
+
+        n_groups, n_q = metrics["jsd"].shape
+        table = pd.DataFrame({
+            "compare": name,
+            "group": np.repeat(group_names, n_q),
+            "question": np.tile([q["qnum"] for q in codebook], n_groups),
+            "col_name": np.tile([q["col_name"] for q in codebook], n_groups),
+            "n_ref": metrics["n_ref"].ravel().astype(np.int64),
+            "n_cmp": metrics["n_cmp"].ravel().astype(np.int64),
+            "jsd": metrics["jsd"].ravel(),
+            "chi2": metrics["chi2"].ravel(),
+            "chi2_p": metrics["chi2_p"].ravel(),
+            "tv": metrics["tv"].ravel(),
+            "cooc_drift": drift.ravel(),
+        })
+        tables.append(table)
+
+    if not tables:
+        return pd.DataFrame()
+    return pd.concat(tables, ignore_index=True)
+
+
+def save_fidelity_report(table, output_dir=None):
+    """
+    保存指标表，格式由 config.FIDELITY_REPORT_FORMAT 决定（"csv" 或 "parquet"）
+    """
+    output_dir = output_dir or config.OUTPUT_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    if config.FIDELITY_REPORT_FORMAT == "parquet":
+        path = os.path.join(output_dir, "fidelity_metrics.parquet")
+        table.to_parquet(path, index=False)
+    else:
+        path = os.path.join(output_dir, "fidelity_metrics.csv")
+        table.to_csv(path, index=False, encoding="utf-8-sig")
+    return path
+
+
+def summarize_fidelity(table):
+    """
+    汇总整体（group == "all"）各数据集的平均指标，便于打印
+    """
+    overall = table[table["group"] == "all"]
+    return overall.groupby("compare")[["jsd", "tv", "cooc_drift"]].mean()
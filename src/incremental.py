@@ -0,0 +1,229 @@
+import os
+import pickle
+import hashlib
+import numpy as np
+import pandas as pd
+from collections import Counter
+from contextlib import nullcontext
+
+from . import config, preprocess, questionnaire_generation, data_jitter, analysis, dedup
+from .response_store import ResponseStore
+
+STATE_VERSION = 2
+
+
+def rows_fingerprint(df):
+    """
+    原始问卷内容的指纹，用于确认已处理部分没有被修改
+    """
+    hashed = pd.util.hash_pandas_object(df.astype(str), index=False).to_numpy()
+    return hashlib.sha1(hashed.tobytes()).hexdigest()
+
+
+def cluster_radii(X, labels, centers):
+    """
+    每个簇内样本到中心距离的分位数，作为判断新样本是否“离群”的半径
+    """
+    X = np.asarray(X, dtype=float)
+    radii = {}
+    for ci in range(len(centers)):
+        idxs = np.where(labels == ci)[0]
+        if len(idxs) == 0:
+            continue
+        dists = np.linalg.norm(X[idxs] - np.asarray(centers[ci], dtype=float), axis=1)
+        radii[ci] = float(np.percentile(dists, config.INCREMENTAL_RADIUS_PERCENTILE))
+    return radii
+
+
+def save_state(df_raw, encoder, cluster_model, X, final_labels, cluster_centers,
+               new_labels, persona_descs, ai_responses, path=None, reducer=None):
+    """
+    保存完整流程的结果，供下一次增量运行复用。
+    启用降维时 X 与簇中心均位于降维空间，reducer 一并保存用于投影新问卷。
+    """
+    path = path or config.INCREMENTAL_STATE_PATH
+    final_labels = np.asarray(final_labels)
+    generated = Counter(int(l) for l in ai_responses.labels() if l >= 0)
+    state = {
+        "version": STATE_VERSION,
+        "n_rows": len(df_raw),
+        "fingerprint": rows_fingerprint(df_raw),
+        "encoder": encoder,
+        "reducer": reducer,
+        "model": cluster_model,
+        "centers": np.asarray(cluster_centers),
+        "radii": cluster_radii(X, final_labels, cluster_centers),
+        "final_labels": final_labels,
+        # 最近一次完整聚类的簇占比，以及此后各批新增问卷的簇标签（用于累计漂移）
+        "reference_share": np.bincount(final_labels, minlength=len(cluster_centers)) / max(len(final_labels), 1),
+        "post_labels": np.empty(0, dtype=np.int64),
+        "removed": sorted({int(l) for l, nl in zip(final_labels, new_labels) if nl == -1}),
+        "persona_descs": dict(persona_descs),
+        "generated": dict(generated),
+        "n_serial": len(ai_responses),
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        pickle.dump(state, f)
+    print(f"  增量状态已保存: {path}")
+
+
+def load_state(path=None):
+    path = path or config.INCREMENTAL_STATE_PATH
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        state = pickle.load(f)
+    if state.get("version") != STATE_VERSION:
+        return None
+    return state
+
+
+def assess_new_rows(df_new, state):
+    """
+    用已保存的编码规则与聚类模型处理新增问卷，并评估漂移：
+      - share_drift: 上次完整聚类以来累计新增问卷（含本批）的簇占比相对聚类时占比的总变差距离，
+                     累计数不足 config.INCREMENTAL_MIN_DRIFT_ROWS 时占比噪声过大，记为 0；
+      - outlier_rate: 新问卷中到所属簇中心距离超过该簇半径的比例。
+    返回 (新问卷簇标签, 累计新增问卷簇标签, share_drift, outlier_rate, 是否漂移)
+    """
+    X_new = preprocess.apply_encoder(df_new, state["encoder"]).to_numpy(dtype=float)
+    if state.get("reducer") is not None:
+        X_new = state["reducer"].transform(X_new)
+    labels_new = state["model"].predict(X_new)
+
+    n_clusters = len(state["centers"])
+    post_labels = np.concatenate([state["post_labels"], labels_new]).astype(np.int64)
+    share_drift = 0.0
+    if len(post_labels) >= config.INCREMENTAL_MIN_DRIFT_ROWS:
+        post_share = np.bincount(post_labels, minlength=n_clusters) / len(post_labels)
+        share_drift = 0.5 * float(np.abs(post_share - state["reference_share"]).sum())
+
+    dists = np.linalg.norm(X_new - state["centers"][labels_new].astype(float), axis=1)
+    radius = np.array([state["radii"].get(int(l), np.inf) for l in labels_new])
+    outlier_rate = float(np.mean(dists > radius)) if len(dists) else 0.0
+
+    drifted = share_drift > config.INCREMENTAL_SHARE_DRIFT or outlier_rate > config.INCREMENTAL_OUTLIER_RATE
+    return labels_new, post_labels, share_drift, outlier_rate, drifted
+
+
+def _read_store(path, columns):
+    if not os.path.exists(path):
+        return None
+    return ResponseStore.from_frame(pd.read_csv(path, dtype=str, keep_default_na=False), columns=columns)
+
+
+def run_incremental(model_question=None, gate=None):
+    """
+    增量模式：仅编码新增问卷并分配到已有簇，只为受影响的簇补充生成配额。
+    gate(kind) 同 main.run_pipeline：读取与评估、抖动与分析在 "cpu" 资源下进行，补充生成在 "llm" 资源下进行。
+    返回 True 表示已完成增量处理；返回 False 表示需要运行完整流程
+    （无历史状态、已处理数据被修改或漂移超过阈值）。
+    """
+    gate = gate or (lambda kind: nullcontext())
+    state = load_state()
+    if state is None:
+        print("\n[增量] 未找到历史状态，运行完整流程")
+        return False
+
+    with gate("cpu"):
+        print("\n[增量] 读取数据并检查新增问卷 ...")
+        df_raw, single_cols, multi_cols, scale_cols = preprocess.load_raw()
+        n_old = state["n_rows"]
+        if len(df_raw) < n_old or rows_fingerprint(df_raw.iloc[:n_old]) != state["fingerprint"]:
+            print("[增量] 已处理的问卷内容发生变化，运行完整流程")
+            return False
+        if len(df_raw) == n_old:
+            print("[增量] 没有新增问卷，无需处理")
+            return True
+
+        df_new = df_raw.iloc[n_old:]
+        labels_new, post_labels, share_drift, outlier_rate, drifted = assess_new_rows(df_new, state)
+        print(f"  新增问卷 {len(df_new)} 条 (聚类后累计 {len(post_labels)} 条), "
+              f"簇占比漂移={share_drift:.4f}, 离群比例={outlier_rate:.4f}")
+        if drifted:
+            print("[增量] 漂移超过阈值，重新聚类并生成画像")
+            return False
+
+        removed = set(state["removed"])
+        final_labels = np.concatenate([state["final_labels"], labels_new])
+        new_labels = [(-1 if int(l) in removed else int(l)) for l in final_labels]
+
+        # 状态只在本函数结束时保存，而 AI 问卷在生成时逐条追加到 CSV：若上次运行在两者之间中断，
+        # CSV 中会有序号大于 n_serial 的问卷。以 CSV 为准重建已生成数与序号，并在本次补做其中尚未抖动的问卷
+        ai_all = _read_store(config.AI_OUTPUT_CSV, df_raw.columns)
+        jittered_all = _read_store(config.JITTER_OUTPUT_CSV, df_raw.columns)
+        generated = Counter(state["generated"])
+        n_serial = state["n_serial"]
+        pending_ai = None
+        if ai_all is not None and len(ai_all):
+            serials = ai_all.source[:len(ai_all)]
+            orphan = np.nonzero(serials > n_serial)[0]
+            if len(orphan):
+                generated.update(int(l) for l in ai_all.labels()[orphan])
+                n_serial = int(serials.max())
+                print(f"  上次运行中断前已追加 {len(orphan)} 条 AI 问卷，按 CSV 继续编号")
+                if jittered_all is not None:
+                    orphan = orphan[~np.isin(serials[orphan], jittered_all.source[:len(jittered_all)])]
+                if len(orphan):
+                    pending_ai = ai_all.take(orphan)
+
+        # 按首次运行的“生成数 / 有效原始样本数”比例，为收到新样本的簇补足配额
+        kept_old = sum(1 for l in state["final_labels"] if int(l) not in removed)
+        ratio = sum(generated.values()) / kept_old if kept_old else 0.0
+        counts_all = Counter(l for l in new_labels if l != -1)
+        affected = {int(l) for l in labels_new if int(l) not in removed and int(l) in state["persona_descs"]}
+        top_up = {}
+        for lab in sorted(affected):
+            need = int(round(ratio * counts_all[lab])) - generated.get(lab, 0)
+            if need > 0:
+                top_up[lab] = need
+        print(f"  受影响的簇: {sorted(affected)}, 补充配额: {top_up}")
+
+    new_ai = None
+    if top_up:
+        with gate("llm"):
+            if model_question is None:
+                from .model_loader import load_model_for_question
+                model_question = load_model_for_question()
+            new_ai = questionnaire_generation.generate_questionnaires(
+                df_raw, new_labels, {lab: state["persona_descs"][lab] for lab in top_up},
+                model_question, target_counts=top_up, serial_start=n_serial + 1, existing=ai_all
+            )
+            generated.update(int(l) for l in new_ai.labels())
+            n_serial += len(new_ai)
+            ai_all = ResponseStore.concat([ai_all, new_ai])
+
+    with gate("cpu"):
+        # AI 问卷 CSV 在生成时已追加，抖动只处理新问卷（含上次中断时未抖动的问卷）
+        new_ai = ResponseStore.concat([pending_ai, new_ai]) if (pending_ai is not None or new_ai is not None) else None
+        if new_ai is not None and len(new_ai):
+            if config.JITTER_ENABLED:
+                # 每批使用由已生成问卷数派生的独立随机流，避免与完整运行或之前批次的抖动相关
+                seed = np.random.SeedSequence(config.JITTER_SEED, spawn_key=(state["n_serial"],))
+                new_jit = data_jitter.data_jitter(df_raw, new_ai, multi_cols, scale_cols, config.TARGET_TOTAL,
+                                                  seed=seed)
+            else:
+                new_jit = new_ai.copy()
+            jittered_all = ResponseStore.concat([jittered_all, new_jit])
+            if config.DEDUP_JITTER_ENABLED:
+                # 与已有抖动问卷一起去重，保留先出现的问卷
+                jittered_all, dup_report = dedup.dedup_store(jittered_all)
+                print(f"  [查重] 抖动问卷去重: 完全重复 {dup_report['exact']} 条, 近似重复 {dup_report['near']} 条, 剩余 {len(jittered_all)} 条")
+        if ai_all is None:
+            ai_all = ResponseStore(df_raw.columns)
+        if jittered_all is None:
+            jittered_all = ResponseStore(df_raw.columns)
+        analysis.save_and_analyze(df_raw, ai_all, jittered_all, final_labels, new_labels)
+
+    state.update({
+        "n_rows": len(df_raw),
+        "fingerprint": rows_fingerprint(df_raw),
+        "final_labels": final_labels,
+        "post_labels": post_labels,
+        "generated": dict(generated),
+        "n_serial": n_serial,
+    })
+    with open(config.INCREMENTAL_STATE_PATH, "wb") as f:
+        pickle.dump(state, f)
+    return True
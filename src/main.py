@@ -1,8 +1,12 @@
 import sys
 import os
+import time
+from contextlib import contextmanager, nullcontext
 
 from . import config
-from . import preprocess, clustering, persona_generation, questionnaire_generation, data_jitter, analysis
+from . import preprocess, clustering, persona_generation, questionnaire_generation, data_jitter, analysis, dedup
+from . import reduction
+from . import incremental
 from .model_loader import load_model_for_4steps, load_model_for_question
 
 def show_progress(name, i, total):
@@ -14,56 +18,108 @@ def show_progress(name, i, total):
     if i == total:
         print()
 
-def main():
-    print("\n========== 大学生 AIGC 问卷扩充项目 ==========")
+def run_pipeline(gate=None):
+    """
+    运行完整流程。gate(kind) 返回一个上下文管理器，kind 为 "cpu" 或 "llm"，
+    批量运行时用于限制同时处于各类阶段的任务数；单独运行时不做限制。
+    返回各阶段耗时（秒）。
+    """
+    gate = gate or (lambda kind: nullcontext())
+    timings = {}
+
+    @contextmanager
+    def stage(name, kind):
+        # 记录从获得资源到阶段结束的耗时（不含排队等待）
+        with gate(kind):
+            t0 = time.perf_counter()
+            try:
+                yield
+            finally:
+                timings[name] = round(time.perf_counter() - t0, 3)
+
+    # 增量模式：仅处理新增问卷，漂移过大或无历史状态时回退到完整流程。
+    # 增量处理同时包含 CPU 与大模型步骤，由 run_incremental 按步骤分别获取资源
+    if config.INCREMENTAL_MODE:
+        t0 = time.perf_counter()
+        done = incremental.run_incremental(gate=gate)
+        timings["incremental"] = round(time.perf_counter() - t0, 3)
+        if done:
+            print(f"\n======= 增量处理结束，所有结果已保存到 {config.OUTPUT_DIR} =======\n")
+            return timings
 
     # 1) 数据读取 & 预处理
     show_progress("步骤 1/7", 0, 1)
-    df_raw, df_encoded, single_cols, multi_cols, scale_cols = preprocess.load_and_preprocess()
+    with stage("preprocess", "cpu"):
+        df_raw, df_encoded, single_cols, multi_cols, scale_cols, encoder = preprocess.load_and_preprocess(
+            return_encoder=True
+        )
+    # 可选降维：后续聚类与画像代表样本都在降维后的矩阵上进行
+    with stage("reduction", "cpu"):
+        df_features, reducer, reduce_time = reduction.reduce_features(df_encoded)
     show_progress("步骤 1/7", 1, 1)
 
     # 2) 层次聚类
     show_progress("步骤 2/7", 0, 1)
-    X, k, _ = clustering.hierarchical_clustering(df_encoded)
+    with stage("hierarchical", "cpu"):
+        X, k, _ = clustering.hierarchical_clustering(df_features)
     show_progress("步骤 2/7", 1, 1)
 
     # 3) 最终聚类
     show_progress("步骤 3/7", 0, 1)
-    final_labels, cluster_centers = clustering.final_clustering(X, k)
+    with stage("clustering", "cpu"):
+        final_labels, cluster_centers, cluster_model = clustering.final_clustering(X, k, return_model=True)
+        if reducer is not None:
+            reduction.evaluate_reduction(df_encoded, df_features, reducer, reduce_time, k, final_labels)
     show_progress("步骤 3/7", 1, 1)
 
     # 4) 人物画像
     show_progress("步骤 4/7", 0, 1)
-    model_4steps = load_model_for_4steps()
-    persona_descs, new_labels = persona_generation.generate_personas(
-        df_raw, X, final_labels, cluster_centers, k, model_4steps
-    )
+    with stage("personas", "llm"):
+        model_4steps = load_model_for_4steps()
+        persona_descs, new_labels = persona_generation.generate_personas(
+            df_raw, X, final_labels, cluster_centers, k, model_4steps
+        )
     show_progress("步骤 4/7", 1, 1)
 
     # 5) 生成问卷
     show_progress("步骤 5/7", 0, 1)
-    model_question = load_model_for_question()
-    ai_responses = questionnaire_generation.generate_questionnaires(
-        df_raw, new_labels, persona_descs, model_question
-    )
+    with stage("generation", "llm"):
+        model_question = load_model_for_question()
+        ai_responses = questionnaire_generation.generate_questionnaires(
+            df_raw, new_labels, persona_descs, model_question
+        )
     show_progress("步骤 5/7", 1, 1)
 
     # 6) 数据抖动（根据配置决定是否执行）
     show_progress("步骤 6/7", 0, 1)
-    if config.JITTER_ENABLED:
-        jittered = data_jitter.data_jitter(
-            df_raw, ai_responses, multi_cols, scale_cols, config.TARGET_TOTAL
-        )
-    else:
-        jittered = ai_responses.copy()
+    with stage("jitter", "cpu"):
+        if config.JITTER_ENABLED:
+            jittered = data_jitter.data_jitter(
+                df_raw, ai_responses, multi_cols, scale_cols, config.TARGET_TOTAL
+            )
+        else:
+            jittered = ai_responses.copy()
+        if config.DEDUP_JITTER_ENABLED:
+            jittered, dup_report = dedup.dedup_store(jittered)
+            print(f"  [查重] 抖动问卷去重: 完全重复 {dup_report['exact']} 条, 近似重复 {dup_report['near']} 条, 剩余 {len(jittered)} 条")
     show_progress("步骤 6/7", 1, 1)
 
     # 7) 保存 & 分析
     show_progress("步骤 7/7", 0, 1)
-    analysis.save_and_analyze(df_raw, ai_responses, jittered, final_labels, new_labels)
+    with stage("analysis", "cpu"):
+        analysis.save_and_analyze(df_raw, ai_responses, jittered, final_labels, new_labels)
+        incremental.save_state(
+            df_raw, encoder, cluster_model, X, final_labels, cluster_centers,
+            new_labels, persona_descs, ai_responses, reducer=reducer
+        )
     show_progress("步骤 7/7", 1, 1)
 
-    print("\n======= 流程结束，所有结果已保存到 outputs/ 文件夹 =======\n")
+    print(f"\n======= 流程结束，所有结果已保存到 {config.OUTPUT_DIR} =======\n")
+    return timings
+
+def main():
+    print("\n========== 大学生 AIGC 问卷扩充项目 ==========")
+    run_pipeline()
 
 if __name__ == "__main__":
     main()
@@ -2,6 +2,7 @@ import os
 import openai
 from llama_cpp import Llama
 from . import config
+from .model_router import build_router
 
 class LocalModelWrapper:
     def __init__(self, model_path, n_ctx=2048):
@@ -27,12 +28,13 @@ class LocalModelWrapper:
 
 
 class OpenAIModelWrapper:
-    def __init__(self, model_name="deepseek-reasoner"):
-        # 此处已经正确初始化了客户端
+    def __init__(self, model_name="deepseek-reasoner", base_url=None, api_key=None, timeout=None):
+        # 此处已经正确初始化了客户端；base_url 可指向任意 OpenAI 兼容端点（含本地服务）
         from openai import OpenAI
         self.client = OpenAI(
-            api_key=config.DEEPSEEK_API_KEY,
-            base_url="https://api.deepseek.com/v1",
+            api_key=api_key or config.DEEPSEEK_API_KEY,
+            base_url=base_url or config.OPENAI_BASE_URL,
+            timeout=timeout,
         )
         self.model_name = model_name
 
@@ -52,6 +54,9 @@ class OpenAIModelWrapper:
         }
 
 def load_model_for_4steps():
+    if config.MODEL_BACKENDS_4STEPS:
+        print(f"  [INFO] 使用多后端路由进行前半段聚类 & 画像 ({len(config.MODEL_BACKENDS_4STEPS)} 个后端)")
+        return build_router(config.MODEL_BACKENDS_4STEPS, stage="4steps")
     if config.USE_OPENAI_FOR_4STEPS:
         print("  [INFO] 使用 OpenAI API 进行前半段聚类 & 画像")
         return OpenAIModelWrapper(model_name=config.OPENAI_MODEL_NAME)
@@ -60,6 +65,9 @@ def load_model_for_4steps():
         return LocalModelWrapper(model_path=config.MODEL_PATH_4STEPS, n_ctx=4096)
 
 def load_model_for_question():
+    if config.MODEL_BACKENDS_QUESTION:
+        print(f"  [INFO] 使用多后端路由进行后半段问卷生成 ({len(config.MODEL_BACKENDS_QUESTION)} 个后端)")
+        return build_router(config.MODEL_BACKENDS_QUESTION, stage="question")
     if config.USE_OPENAI_FOR_QUESTION:
         print("  [INFO] 使用 OpenAI API 进行后半段问卷生成")
         return OpenAIModelWrapper(model_name=config.OPENAI_MODEL_NAME)
@@ -0,0 +1,162 @@
+import time
+import threading
+
+from . import config
+
+
+class BackendState:
+    """
+    单个后端的运行时统计：延迟（指数滑动平均）、错误率、并发数与冷却时间
+    """
+    def __init__(self, name, wrapper, max_concurrency=1):
+        self.name = name
+        self.wrapper = wrapper
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.latency_ewma = None
+        self.error_ewma = 0.0
+        self.inflight = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.calls = 0
+        self.failures = 0
+
+    def score(self, now):
+        # 从未调用过的后端延迟记为 0，优先探测一次；失败的调用同样计入延迟，
+        # 因此超时失败的后端在冷却结束后不会因延迟未知而被优先选择。并发越多、错误率越高得分越差
+        latency = self.latency_ewma if self.latency_ewma is not None else 0.0
+        penalty = max(1e-3, 1.0 - self.error_ewma)
+        cooling = 1 if now < self.cooldown_until else 0
+        return cooling, latency * (self.inflight + 1) / penalty
+
+
+class ModelRouter:
+    """
+    多后端路由：实现与 LocalModelWrapper / OpenAIModelWrapper 相同的 create_completion 接口，
+    按观测到的延迟、错误率和并发上限选择后端，失败时自动切换到下一个后端。
+    成功与失败的调用都计入延迟与错误率。
+    注意：目前的调用方（generate_questionnaires、work_queue 工作进程）都是逐条顺序调用，
+    此时路由等价于“选择最快的健康后端 + 失败切换”，max_concurrency 不会生效，也不会把请求分摊到多个后端；
+    只有多个线程共用同一个路由器时，并发上限才会起作用。
+    """
+    def __init__(self, backends, stage=None, max_attempts=None, ewma_alpha=0.2):
+        if not backends:
+            raise ValueError("ModelRouter 至少需要一个后端")
+        self.backends = backends
+        self.stage = stage
+        self.max_tokens_budget = config.STAGE_MAX_TOKENS.get(stage) if stage else None
+        self.max_attempts = max_attempts or config.ROUTER_MAX_ATTEMPTS
+        self.ewma_alpha = ewma_alpha
+        self._cond = threading.Condition()
+
+    def _acquire(self, exclude):
+        """
+        选出得分最优且未达并发上限的后端；若候选后端均满载则等待。
+        返回 None 表示已无可尝试的后端。
+        """
+        with self._cond:
+            while True:
+                candidates = [b for b in self.backends if b.name not in exclude]
+                if not candidates:
+                    return None
+                now = time.monotonic()
+                free = [b for b in candidates if b.inflight < b.max_concurrency]
+                if free:
+                    best = min(free, key=lambda b: b.score(now))
+                    best.inflight += 1
+                    return best
+                self._cond.wait()
+
+    def _release(self, backend, elapsed, ok):
+        a = self.ewma_alpha
+        with self._cond:
+            backend.inflight -= 1
+            backend.calls += 1
+            backend.error_ewma = (1 - a) * backend.error_ewma + a * (0.0 if ok else 1.0)
+            if backend.latency_ewma is None:
+                backend.latency_ewma = elapsed
+            else:
+                backend.latency_ewma = (1 - a) * backend.latency_ewma + a * elapsed
+            if ok:
+                backend.consecutive_failures = 0
+            else:
+                backend.failures += 1
+                backend.consecutive_failures += 1
+                cooldown = min(config.ROUTER_MAX_COOLDOWN, 2 ** backend.consecutive_failures)
+                backend.cooldown_until = time.monotonic() + cooldown
+            self._cond.notify_all()
+
+    def create_completion(self, prompt, max_tokens=1024, temperature=0.2):
+        if self.max_tokens_budget:
+            max_tokens = min(max_tokens, self.max_tokens_budget)
+
+        tried = set()
+        last_err = None
+        for _ in range(self.max_attempts):
+            backend = self._acquire(tried)
+            if backend is None:
+                break
+            t0 = time.monotonic()
+            try:
+                output = backend.wrapper.create_completion(
+                    prompt=prompt,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                )
+            except Exception as e:
+                self._release(backend, time.monotonic() - t0, ok=False)
+                print(f"  [路由] 后端 {backend.name} 调用失败，尝试切换: {e}")
+                tried.add(backend.name)
+                last_err = e
+                continue
+            self._release(backend, time.monotonic() - t0, ok=True)
+            return output
+        raise RuntimeError(f"所有后端均调用失败 (stage={self.stage}): {last_err}")
+
+    def stats(self):
+        """
+        返回各后端的统计信息，便于打印或记录
+        """
+        with self._cond:
+            return {
+                b.name: {
+                    "calls": b.calls,
+                    "failures": b.failures,
+                    "latency_ewma": b.latency_ewma,
+                    "error_ewma": round(b.error_ewma, 4),
+                    "inflight": b.inflight,
+                    "max_concurrency": b.max_concurrency,
+                }
+                for b in self.backends
+            }
+
+
+def build_backend(spec):
+    """
+    根据配置字典创建后端包装器，支持:
+      {"type": "openai", "base_url": ..., "api_key": ..., "model": ...}
+      {"type": "local", "model_path": ..., "n_ctx": ...}
+    """
+    from .model_loader import LocalModelWrapper, OpenAIModelWrapper
+
+    btype = spec.get("type", "openai")
+    if btype == "openai":
+        return OpenAIModelWrapper(
+            model_name=spec.get("model", config.OPENAI_MODEL_NAME),
+            base_url=spec.get("base_url", config.OPENAI_BASE_URL),
+            api_key=spec.get("api_key", config.DEEPSEEK_API_KEY),
+            timeout=spec.get("timeout", config.ROUTER_REQUEST_TIMEOUT),
+        )
+    elif btype == "local":
+        return LocalModelWrapper(model_path=spec["model_path"], n_ctx=spec.get("n_ctx", 4096))
+    raise ValueError(f"未知的后端类型: {btype}")
+
+
+def build_router(backend_specs, stage=None):
+    backends = []
+    for i, spec in enumerate(backend_specs):
+        name = spec.get("name", f"{spec.get('type', 'openai')}-{i}")
+        # 本地 Llama 实例非线程安全，默认并发为 1
+        default_cc = 1 if spec.get("type") == "local" else 4
+        wrapper = spec["wrapper"] if "wrapper" in spec else build_backend(spec)
+        backends.append(BackendState(name, wrapper, spec.get("max_concurrency", default_cc)))
+    return ModelRouter(backends, stage=stage)
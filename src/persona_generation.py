@@ -4,13 +4,14 @@ import pandas as pd
 import json
 import re
 
+from . import config
+
 def decide_persona_aspects(df_raw, model):
     print("\n  正在让大模型判断适合输出哪些人物画像维度(以JSON形式)...")
 
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    with open(os.path.join(base_dir, "prompts", "persona_aspect_system.txt"), "r", encoding="utf-8") as f:
+    with open(os.path.join(config.PROMPT_DIR, "persona_aspect_system.txt"), "r", encoding="utf-8") as f:
         system_prompt = f.read()
-    with open(os.path.join(base_dir, "prompts", "persona_aspect_user.txt"), "r", encoding="utf-8") as f:
+    with open(os.path.join(config.PROMPT_DIR, "persona_aspect_user.txt"), "r", encoding="utf-8") as f:
         user_template = f.read()
 
     # 将列名拼成一个大字符串替换 {{ HEADERS }}
@@ -30,7 +31,8 @@ def generate_personas(df_raw, X, final_labels, cluster_centers, k, model):
     """
     1) 先通过 decide_persona_aspects 得到 JSON 格式的维度
     2) 再为每簇选1条代表问卷, 让模型生成 "典型用户画像" (JSON)
-    3) 让用户交互式输入要去除的簇编号 => 返回 (new_persona_descs, new_labels)
+    3) 让用户交互式输入要去除的簇编号（非交互模式取 config.CLUSTER_REMOVE_IDS）
+       => 返回 (new_persona_descs, new_labels)
     """
     print("\n[4/7] 生成典型用户画像 ...")
     aspects_json = decide_persona_aspects(df_raw, model)
@@ -61,10 +63,9 @@ def generate_personas(df_raw, X, final_labels, cluster_centers, k, model):
         cluster_reps[ci] = df_raw.iloc[rep_idx]
 
     # 用提示词生成人物画像
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    with open(os.path.join(base_dir, "prompts", "persona_generation_system.txt"), "r", encoding="utf-8") as f:
+    with open(os.path.join(config.PROMPT_DIR, "persona_generation_system.txt"), "r", encoding="utf-8") as f:
         sys_prompt = f.read()
-    with open(os.path.join(base_dir, "prompts", "persona_generation_user.txt"), "r", encoding="utf-8") as f:
+    with open(os.path.join(config.PROMPT_DIR, "persona_generation_user.txt"), "r", encoding="utf-8") as f:
         user_template = f.read()
 
     persona_map_temp = {}
@@ -103,7 +104,12 @@ def generate_personas(df_raw, X, final_labels, cluster_centers, k, model):
         print(persona_map_temp[ci])
         print("------------------------------------------------")
 
-    remove_input = input("\n请输入想去除的簇编号(用空格分隔，如 1 3 5，直接回车则不去除): ").strip()
+    if config.CLUSTER_REMOVE_IDS is not None:
+        remove_input = " ".join(str(i) for i in config.CLUSTER_REMOVE_IDS)
+    elif config.INTERACTIVE:
+        remove_input = input("\n请输入想去除的簇编号(用空格分隔，如 1 3 5，直接回车则不去除): ").strip()
+    else:
+        remove_input = ""
     remove_ids = set()
     for s in remove_input.split():
         try:
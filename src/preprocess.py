@@ -3,15 +3,34 @@ import numpy as np
 import re
 import json
 import os
+import pickle
+import shutil
+import hashlib
 
-from .config import DATA_PATH, BASE_DIR
+from . import config
+
+try:
+    from pyarrow.lib import ArrowException
+except ImportError:
+    ArrowException = ValueError
+
+# Parquet 写入失败时退回 pickle：未安装引擎（ImportError），或列中混有多种类型
+# 无法转换为 Arrow 类型（ArrowInvalid / ArrowTypeError 等，分别继承 ValueError / TypeError）
+_PARQUET_ERRORS = (ImportError, ValueError, TypeError, ArrowException)
+
+# 编码规则变更时递增，使旧的预处理缓存自动失效
+ENCODER_VERSION = 1
+
+# 预处理缓存目录名：source_hash() 的前若干位十六进制字符
+CACHE_KEY_LENGTH = 20
+_CACHE_KEY_RE = re.compile(rf"^[0-9a-f]{{{CACHE_KEY_LENGTH}}}$")
 
 
 def load_question_list():
     """
     读取 prompts/question_list.json 文件，返回按顺序排列的 col_name 列表
     """
-    json_path = os.path.join(BASE_DIR, "prompts", "question_list.json")
+    json_path = config.QUESTION_LIST_PATH
     with open(json_path, "r", encoding="utf-8") as f:
         data = json.load(f)
     # 返回 JSON 文件中所有题目的 col_name，注意使用 strip() 清除前后空格
@@ -26,7 +45,7 @@ def load_question_types():
     题号采用 JSON 中 col_name 前面的数字
     """
     question_types = {}
-    json_path = os.path.join(BASE_DIR, "prompts", "question_list.json")
+    json_path = config.QUESTION_LIST_PATH
     with open(json_path, "r", encoding="utf-8") as f:
         data = json.load(f)
     for q in data["questions"]:
@@ -38,10 +57,71 @@ def load_question_types():
     return question_types
 
 
-def load_and_preprocess():
-    print("\n[1/7] 读取与预处理数据 ...")
+def fit_encoder(df_raw, multi_cols, scale_cols):
+    """
+    根据数据拟合编码规则，返回按列顺序排列的编码说明列表。
+    编码说明可序列化保存，之后用 apply_encoder 对新增问卷做完全一致的编码。
+    """
+    encoder = []
+    for col in df_raw.columns:
+        if col in multi_cols:
+            all_opts = set()
+            for val in df_raw[col].dropna():
+                parts = re.split(r'[;,|、┋]+', str(val))
+                all_opts.update(p.strip() for p in parts if p.strip())
+            encoder.append({"col": col, "kind": "multi", "options": sorted(all_opts)})
+        elif col in scale_cols:
+            encoder.append({"col": col, "kind": "scale"})
+        elif pd.api.types.is_numeric_dtype(df_raw[col]):
+            encoder.append({"col": col, "kind": "numeric"})
+        else:
+            uniq_vals = df_raw[col].unique()
+            if len(uniq_vals) < 50:
+                categories = sorted(df_raw[col].fillna("NA").astype(str).unique())
+                encoder.append({"col": col, "kind": "onehot", "categories": categories})
+            else:
+                categories = list(pd.factorize(df_raw[col])[1])
+                encoder.append({"col": col, "kind": "factorize", "categories": categories})
+    return encoder
+
+
+def apply_encoder(df_raw, encoder):
+    """
+    按 fit_encoder 得到的规则编码问卷；新数据中未出现过的选项不产生新列
+    """
+    encoded = {}
+    for spec in encoder:
+        col = spec["col"]
+        values = df_raw[col] if col in df_raw.columns else pd.Series(np.nan, index=df_raw.index)
+        kind = spec["kind"]
+        if kind == "multi":
+            split_vals = values.fillna("").apply(lambda x: set(re.split(r'[;,|、┋]+', str(x))))
+            for opt in spec["options"]:
+                encoded[f"{col}::{opt}"] = split_vals.apply(lambda parts: 1 if opt in parts else 0)
+        elif kind == "scale":
+            encoded[col] = pd.to_numeric(
+                values.replace(r"\(跳过\)", np.nan, regex=True),
+                errors='coerce'
+            ).fillna(0)
+        elif kind == "numeric":
+            encoded[col] = pd.to_numeric(values, errors='coerce').fillna(0)
+        elif kind == "onehot":
+            filled = values.fillna("NA").astype(str)
+            for cat in spec["categories"]:
+                encoded[f"{col}_{cat}"] = filled == cat
+        else:
+            mapping = {v: i for i, v in enumerate(spec["categories"])}
+            encoded[col] = values.map(mapping).fillna(-1).astype(np.int64)
+    return pd.DataFrame(encoded, index=df_raw.index)
+
+
+def load_raw():
+    """
+    读取原始 CSV、统一表头并按 JSON 题型划分列，不做编码。
+    返回 (df_raw, single_cols, multi_cols, scale_cols)
+    """
     # 注意根据实际情况调整 CSV 的编码，比如 "gbk"、"utf-8-sig" 等
-    df_raw = pd.read_csv(DATA_PATH, encoding="gbk")
+    df_raw = pd.read_csv(config.DATA_PATH, encoding="gbk")
     print(f"  原始数据量: {df_raw.shape[0]}, 列: {df_raw.shape[1]}")
 
     # 统一表头：将 CSV 的列名替换为 JSON 文件中定义的 col_name
@@ -81,33 +161,129 @@ def load_and_preprocess():
     print("  单选列:", single_cols)
     print("  多选列:", multi_cols)
     print("  量表列:", scale_cols)
+    return df_raw, single_cols, multi_cols, scale_cols
 
-    # 根据题型对数据进行编码
-    df_encoded = pd.DataFrame()
-    for col in df_raw.columns:
-        if col in multi_cols:
-            all_opts = set()
-            for val in df_raw[col].dropna():
-                parts = re.split(r'[;,|、┋]+', str(val))
-                all_opts.update(p.strip() for p in parts if p.strip())
-            for opt in sorted(all_opts):
-                df_encoded[f"{col}::{opt}"] = df_raw[col].fillna("").apply(
-                    lambda x: 1 if opt in re.split(r'[;,|、┋]+', str(x)) else 0
-                )
-        elif col in scale_cols:
-            df_encoded[col] = pd.to_numeric(
-                df_raw[col].replace(r"\(跳过\)", np.nan, regex=True),
-                errors='coerce'
-            ).fillna(0)
+
+def source_hash():
+    """
+    预处理缓存的键：CSV 内容、题目 JSON 内容与编码版本的哈希
+    """
+    h = hashlib.sha256()
+    for path in (config.DATA_PATH, config.QUESTION_LIST_PATH):
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    h.update(f"encoder-v{ENCODER_VERSION}".encode("utf-8"))
+    return h.hexdigest()[:CACHE_KEY_LENGTH]
+
+
+def _load_cache(key):
+    """
+    读取预处理缓存：原始表为 Parquet（无 pyarrow 时为 pickle），
+    编码矩阵为 .npy 并以内存映射方式只读加载，不复制数据。
+    """
+    cache_dir = os.path.join(config.PREPROCESS_CACHE_DIR, key)
+    meta_path = os.path.join(cache_dir, "meta.pkl")
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "rb") as f:
+            meta = pickle.load(f)
+        raw_path = os.path.join(cache_dir, meta["raw_file"])
+        if raw_path.endswith(".parquet"):
+            df_raw = pd.read_parquet(raw_path)
         else:
-            if pd.api.types.is_numeric_dtype(df_raw[col]):
-                df_encoded[col] = pd.to_numeric(df_raw[col], errors='coerce').fillna(0)
-            else:
-                uniq_vals = df_raw[col].unique()
-                if len(uniq_vals) < 50:
-                    dummies = pd.get_dummies(df_raw[col].fillna("NA"), prefix=col)
-                    df_encoded = pd.concat([df_encoded, dummies], axis=1)
-                else:
-                    df_encoded[col] = pd.factorize(df_raw[col])[0]
+            df_raw = pd.read_pickle(raw_path)
+        matrix = np.load(os.path.join(cache_dir, "encoded.npy"), mmap_mode="r")
+        df_encoded = pd.DataFrame(matrix, columns=meta["encoded_columns"], copy=False)
+    except (OSError, ValueError, KeyError, pickle.UnpicklingError, ImportError) as e:
+        print(f"  [警告] 预处理缓存读取失败，重新解析: {e}")
+        return None
+    # 更新修改时间，清理旧缓存时按最近使用的顺序保留
+    try:
+        os.utime(cache_dir)
+    except OSError:
+        pass
+    return df_raw, df_encoded, meta["single_cols"], meta["multi_cols"], meta["scale_cols"], meta["encoder"]
+
+
+def _save_cache(key, df_raw, matrix, encoded_columns, single_cols, multi_cols, scale_cols, encoder):
+    """
+    先写入临时目录再整体改名，避免中断留下不完整的缓存；同时清理最久未使用的旧缓存
+    """
+    root = config.PREPROCESS_CACHE_DIR
+    os.makedirs(root, exist_ok=True)
+    tmp_dir = os.path.join(root, f".{key}.{os.getpid()}.tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    try:
+        try:
+            df_raw.to_parquet(os.path.join(tmp_dir, "raw.parquet"), index=False)
+            raw_file = "raw.parquet"
+        except _PARQUET_ERRORS as e:
+            if not isinstance(e, ImportError):
+                print(f"  [警告] 原始表无法写为 Parquet，改用 pickle: {e}")
+            if os.path.exists(os.path.join(tmp_dir, "raw.parquet")):
+                os.remove(os.path.join(tmp_dir, "raw.parquet"))
+            df_raw.to_pickle(os.path.join(tmp_dir, "raw.pkl"))
+            raw_file = "raw.pkl"
+        np.save(os.path.join(tmp_dir, "encoded.npy"), matrix)
+        meta = {
+            "raw_file": raw_file,
+            "encoded_columns": list(encoded_columns),
+            "single_cols": single_cols,
+            "multi_cols": multi_cols,
+            "scale_cols": scale_cols,
+            "encoder": encoder,
+        }
+        with open(os.path.join(tmp_dir, "meta.pkl"), "wb") as f:
+            pickle.dump(meta, f)
+        final_dir = os.path.join(root, key)
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(tmp_dir, final_dir)
+    except OSError as e:
+        print(f"  [警告] 预处理缓存写入失败: {e}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return
+    _prune_cache(root, config.PREPROCESS_CACHE_KEEP)
+
+
+def _prune_cache(root, keep):
+    """
+    只保留最近使用的 keep 个缓存。仅处理名称符合缓存键格式且含 meta.pkl 的目录，
+    缓存目录被设为共享位置时不会删除其它内容。
+    """
+    entries = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if _CACHE_KEY_RE.match(name) and os.path.isfile(os.path.join(path, "meta.pkl")):
+            entries.append((os.path.getmtime(path), path))
+    entries.sort(reverse=True)
+    for _, path in entries[max(keep, 1):]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def load_and_preprocess(return_encoder=False):
+    print("\n[1/7] 读取与预处理数据 ...")
+    key = source_hash() if config.PREPROCESS_CACHE_ENABLED else None
+    cached = _load_cache(key) if key else None
+    if cached is not None:
+        df_raw, df_encoded, single_cols, multi_cols, scale_cols, encoder = cached
+        print(f"  命中预处理缓存 ({key}): {df_raw.shape[0]} 条问卷, 编码维度 {df_encoded.shape[1]}")
+        if return_encoder:
+            return df_raw, df_encoded, single_cols, multi_cols, scale_cols, encoder
+        return df_raw, df_encoded, single_cols, multi_cols, scale_cols
+
+    df_raw, single_cols, multi_cols, scale_cols = load_raw()
+
+    # 根据题型对数据进行编码
+    encoder = fit_encoder(df_raw, multi_cols, scale_cols)
+    df_encoded = apply_encoder(df_raw, encoder)
+    # 统一为 float64 矩阵，使首次运行与命中缓存时的结果完全一致
+    matrix = df_encoded.to_numpy(dtype=np.float64)
+    if key:
+        _save_cache(key, df_raw, matrix, df_encoded.columns, single_cols, multi_cols, scale_cols, encoder)
+    df_encoded = pd.DataFrame(matrix, columns=df_encoded.columns, copy=False)
 
+    if return_encoder:
+        return df_raw, df_encoded, single_cols, multi_cols, scale_cols, encoder
     return df_raw, df_encoded, single_cols, multi_cols, scale_cols
@@ -4,7 +4,11 @@ import json
 import numpy as np
 import pandas as pd
 from collections import Counter
-from .config import AI_OUTPUT_CSV, TARGET_TOTAL
+from . import config
+from .quota_controller import QuotaController
+from .dedup import DedupIndex
+from .codebook import load_codebook, encode_row
+from .response_store import ResponseStore
 from tqdm import tqdm
 
 # 使用数字编号作为唯一标识：QUESTION_DICT 的键为题号（字符串形式）
@@ -13,9 +17,9 @@ QUESTION_DICT = {}
 
 def load_question_config():
     global QUESTION_DICT
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    json_path = os.path.join(base_dir, "prompts", "question_list.json")
-    with open(json_path, "r", encoding="utf-8") as f:
+    # 同一进程可能先后处理不同问卷（批量运行），每次重新加载
+    QUESTION_DICT.clear()
+    with open(config.QUESTION_LIST_PATH, "r", encoding="utf-8") as f:
         data = json.load(f)
     # 构造映射：题目数字编号 => question info
     for q in data["questions"]:
@@ -89,14 +93,92 @@ def apply_question_logic(row_answers):
     return row_answers
 
 
-def generate_questionnaires(df_raw, new_labels, persona_descs, model_wrapper):
+def parse_questionnaire_response(raw_text, columns, lab, serial):
+    """
+    将大模型输出解析为按 CSV 表头排列的标准化问卷（字典）。
+    输出格式不合格时返回 None；JSON 解析失败时抛出异常。
+    """
+    raw_json = re.sub(r'```json|```', '', raw_text).strip()
+    data = json.loads(raw_json)
+    answers = data.get("answers", [])
+
+    # 构建答案字典
+    row_dict = {}
+    for item in answers:
+        key = item["col_name"]
+        answer = item["answer"]
+        row_dict[key] = answer
+
+    # 检查输出问卷中是否包含数字（作为题号）
+    if not any(re.search(r'\d+', key) for key in row_dict.keys()):
+        print("【格式警告】该条输出问卷的题目中不含数字，已舍弃。")
+        return None
+
+    # 构造标准化答案：按照 CSV 表头顺序匹配
+    standardized_row = {}
+    for col in columns:
+        m = re.match(r'^(\d+)', col)
+        if m:
+            qnum = m.group(1)
+            found = False
+            for key in row_dict.keys():
+                m2 = re.match(r'^(\d+)', key)
+                if m2 and m2.group(1) == qnum:
+                    standardized_row[col] = row_dict[key]
+                    found = True
+                    break
+            if not found:
+                standardized_row[col] = "(跳过)"
+        else:
+            standardized_row[col] = row_dict.get(col, "(跳过)")
+    # 添加簇编号和原问卷序号
+    standardized_row["簇编号"] = str(lab)
+    standardized_row["原问卷序号"] = serial
+
+    standardized_row = apply_question_logic(standardized_row)
+    # 针对每个题目根据 QUESTION_DICT 的题型进行转换及校验
+    for key in list(standardized_row.keys()):
+        m = re.match(r'^(\d+)', key)
+        if m:
+            qnum = m.group(1)
+            if qnum in QUESTION_DICT:
+                qinfo = QUESTION_DICT[qnum]
+                orig_ans = standardized_row[key]
+                if qinfo["type"] == "single":
+                    converted_ans = convert_single_answer(orig_ans, qinfo)
+                    standardized_row[key] = converted_ans
+                    if not re.match(r'^[A-Z]$', converted_ans) and converted_ans != "(跳过)":
+                        print(
+                            f"[格式警告] 题号 {qnum} 单选题答案应为单个大写字母或(跳过)，实际: {converted_ans}")
+                elif qinfo["type"] == "multiple":
+                    converted_ans = convert_multiple_answer(orig_ans)
+                    standardized_row[key] = converted_ans
+                    if converted_ans != "(跳过)" and not re.match(r'^[A-Z]([、┋][A-Z])*$', converted_ans):
+                        print(
+                            f"[格式警告] 题号 {qnum} 多选题答案应为多个字母组合或(跳过)，实际: {converted_ans}")
+                elif qinfo["type"] == "matrix_7":
+                    converted_ans = convert_matrix_answer(orig_ans, qinfo)
+                    standardized_row[key] = converted_ans
+                    if converted_ans != "(跳过)" and not re.match(r'^[1-7]$', converted_ans):
+                        print(f"[格式警告] 题号 {qnum} 量表题答案应为1~7或(跳过)，实际: {converted_ans}")
+    return standardized_row
+
+
+def generate_questionnaires(df_raw, new_labels, persona_descs, model_wrapper, target_counts=None, serial_start=1,
+                            existing=None):
+    """
+    按簇画像调用大模型生成问卷。
+    target_counts 为空时按各簇样本占比分配 config.TARGET_TOTAL；
+    增量模式下可直接传入各簇需要补充的数量，serial_start 为新问卷“原问卷序号”的起点，
+    existing 为已生成的 AI 问卷（ResponseStore），新问卷与其重复时同样被拒绝。
+    config.QUEUE_ENABLED 时改为通过任务队列分布式生成（见 work_queue.py）。
+    """
     print("\n[5/7] 生成新问卷 (大模型) ...")
     load_question_config()
 
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    with open(os.path.join(base_dir, "prompts", "questionnaire_generation_system.txt"), "r", encoding="utf-8") as f:
+    with open(os.path.join(config.PROMPT_DIR, "questionnaire_generation_system.txt"), "r", encoding="utf-8") as f:
         sys_prompt_raw = f.read()
-    with open(os.path.join(base_dir, "prompts", "questionnaire_generation_user.txt"), "r", encoding="utf-8") as f:
+    with open(os.path.join(config.PROMPT_DIR, "questionnaire_generation_user.txt"), "r", encoding="utf-8") as f:
         user_prompt_raw = f.read()
 
     # 构造问卷文本：逐题列出，包括题目及选项信息
@@ -116,22 +198,21 @@ def generate_questionnaires(df_raw, new_labels, persona_descs, model_wrapper):
             .replace("{{ QUESTION_TEXT }}", "\n".join(question_list_text))
     )
 
-    if not os.path.exists(AI_OUTPUT_CSV):
-        pd.DataFrame(columns=df_raw.columns.tolist() + ["簇编号", "原问卷序号"]).to_csv(AI_OUTPUT_CSV, index=False)
+    if not os.path.exists(config.AI_OUTPUT_CSV):
+        pd.DataFrame(columns=df_raw.columns.tolist() + ["簇编号", "原问卷序号"]).to_csv(config.AI_OUTPUT_CSV, index=False)
 
     # 统计每个有效簇（new_labels != -1）的数量
-    cluster_counts = Counter([lab for lab in new_labels if lab != -1])
-    total_valid = sum(cluster_counts.values())
-    target_counts = {}
-    for lab in persona_descs:
-        count = cluster_counts.get(lab, 0)
-        target = int(round(TARGET_TOTAL * (count / total_valid))) if total_valid > 0 else 1
-        target_counts[lab] = max(1, target)
-
-    new_rows = []
-    total_target = sum(target_counts.values())
-    pbar = tqdm(total=total_target, desc="生成问卷进度")
+    if target_counts is None:
+        cluster_counts = Counter([lab for lab in new_labels if lab != -1])
+        total_valid = sum(cluster_counts.values())
+        target_counts = {}
+        for lab in persona_descs:
+            count = cluster_counts.get(lab, 0)
+            target = int(round(config.TARGET_TOTAL * (count / total_valid))) if total_valid > 0 else 1
+            target_counts[lab] = max(1, target)
 
+    # 每个簇的完整提示词只需构造一次
+    prompts = {}
     for lab in persona_descs:
         persona_json = persona_descs[lab]
         try:
@@ -139,85 +220,86 @@ def generate_questionnaires(df_raw, new_labels, persona_descs, model_wrapper):
             persona_text = "\n".join(f"{k}: {v}" for k, v in persona_dict.items())
         except:
             persona_text = persona_json
-        full_prompt_final = full_prompt_template.replace("{{PERSONA_TEXT_PLACEHOLDER}}", persona_text)
-
-        generated = 0
-        while generated < target_counts[lab]:
-            try:
-                resp = model_wrapper.create_completion(
-                    prompt=full_prompt_final,
-                    temperature=0.15 + np.random.uniform(-0.05, 0.05),
-                    max_tokens=2048
-                )
-                raw_text = resp["choices"][0]["text"].strip()
-                raw_json = re.sub(r'```json|```', '', raw_text).strip()
-                data = json.loads(raw_json)
-                answers = data.get("answers", [])
-
-                # 构建答案字典
-                row_dict = {}
-                for item in answers:
-                    key = item["col_name"]
-                    answer = item["answer"]
-                    row_dict[key] = answer
-
-                # 检查输出问卷中是否包含数字（作为题号）
-                if not any(re.search(r'\d+', key) for key in row_dict.keys()):
-                    print("【格式警告】该条输出问卷的题目中不含数字，已舍弃。")
-                    continue  # 不计入生成数量
-
-                # 构造标准化答案：按照 CSV 表头顺序匹配
-                standardized_row = {}
-                for col in df_raw.columns:
-                    m = re.match(r'^(\d+)', col)
-                    if m:
-                        qnum = m.group(1)
-                        found = False
-                        for key in row_dict.keys():
-                            m2 = re.match(r'^(\d+)', key)
-                            if m2 and m2.group(1) == qnum:
-                                standardized_row[col] = row_dict[key]
-                                found = True
-                                break
-                        if not found:
-                            standardized_row[col] = "(跳过)"
-                    else:
-                        standardized_row[col] = row_dict.get(col, "(跳过)")
-                # 添加簇编号和原问卷序号
-                standardized_row["簇编号"] = str(lab)
-                standardized_row["原问卷序号"] = len(new_rows) + 1
-
-                standardized_row = apply_question_logic(standardized_row)
-                # 针对每个题目根据 QUESTION_DICT 的题型进行转换及校验
-                for key in list(standardized_row.keys()):
-                    m = re.match(r'^(\d+)', key)
-                    if m:
-                        qnum = m.group(1)
-                        if qnum in QUESTION_DICT:
-                            qinfo = QUESTION_DICT[qnum]
-                            orig_ans = standardized_row[key]
-                            if qinfo["type"] == "single":
-                                converted_ans = convert_single_answer(orig_ans, qinfo)
-                                standardized_row[key] = converted_ans
-                                if not re.match(r'^[A-Z]$', converted_ans) and converted_ans != "(跳过)":
-                                    print(
-                                        f"[格式警告] 题号 {qnum} 单选题答案应为单个大写字母或(跳过)，实际: {converted_ans}")
-                            elif qinfo["type"] == "multiple":
-                                converted_ans = convert_multiple_answer(orig_ans)
-                                standardized_row[key] = converted_ans
-                                if converted_ans != "(跳过)" and not re.match(r'^[A-Z]([、┋][A-Z])*$', converted_ans):
-                                    print(
-                                        f"[格式警告] 题号 {qnum} 多选题答案应为多个字母组合或(跳过)，实际: {converted_ans}")
-                            elif qinfo["type"] == "matrix_7":
-                                converted_ans = convert_matrix_answer(orig_ans, qinfo)
-                                standardized_row[key] = converted_ans
-                                if converted_ans != "(跳过)" and not re.match(r'^[1-7]$', converted_ans):
-                                    print(f"[格式警告] 题号 {qnum} 量表题答案应为1~7或(跳过)，实际: {converted_ans}")
-                new_rows.append(standardized_row)
-                pd.DataFrame([standardized_row]).to_csv(AI_OUTPUT_CSV, mode='a', header=False, index=False)
-                generated += 1
-                pbar.update(1)
-            except Exception as e:
-                print(f"生成问卷失败: {e}")
+        prompts[lab] = full_prompt_template.replace("{{PERSONA_TEXT_PLACEHOLDER}}", persona_text)
+
+    if config.QUEUE_ENABLED:
+        from .work_queue import generate_distributed
+        return generate_distributed(df_raw, prompts, target_counts, model_wrapper, serial_start, existing)
+
+    controller = None
+    if config.ADAPTIVE_QUOTA_ENABLED:
+        controller = QuotaController(df_raw, new_labels, target_counts)
+
+    generated = {lab: 0 for lab in persona_descs}
+
+    # 在线查重：重复问卷不计数，并逐步提高该簇的采样温度
+    codebook = load_codebook()
+    dedup_index = DedupIndex(codebook=codebook) if config.DEDUP_ENABLED else None
+    if dedup_index is not None and existing is not None:
+        dedup_index.extend(existing.codes_matrix(codebook))
+    temp_boost = {lab: 0.0 for lab in persona_descs}
+    rejects = {lab: 0 for lab in persona_descs}
+    dup_total = 0
+
+    def next_label():
+        if controller is not None:
+            return controller.next_cluster()
+        for lab in persona_descs:
+            if generated[lab] < target_counts.get(lab, 0):
+                return lab
+        return None
+
+    total_target = sum(target_counts.values())
+    store = ResponseStore(df_raw.columns, codebook=codebook, capacity=total_target)
+    pbar = tqdm(total=total_target, desc="生成问卷进度")
+
+    while True:
+        lab = next_label()
+        if lab is None:
+            break
+        try:
+            resp = model_wrapper.create_completion(
+                prompt=prompts[lab],
+                temperature=0.15 + temp_boost[lab] + np.random.uniform(-0.05, 0.05),
+                max_tokens=2048
+            )
+            raw_text = resp["choices"][0]["text"].strip()
+            standardized_row = parse_questionnaire_response(
+                raw_text, df_raw.columns, lab, serial_start + len(store)
+            )
+            if standardized_row is None:
+                continue  # 不计入生成数量
+            codes = encode_row(standardized_row, codebook)
+            if dedup_index is not None:
+                kind, match = dedup_index.query(codes)
+                if kind is not None and rejects[lab] < config.DEDUP_MAX_REJECTS:
+                    rejects[lab] += 1
+                    dup_total += 1
+                    temp_boost[lab] = min(config.DEDUP_MAX_TEMPERATURE_BOOST,
+                                          temp_boost[lab] + config.DEDUP_TEMPERATURE_STEP)
+                    print(f"[查重] 簇 {lab} 输出与第 {match + 1} 条问卷"
+                          f"{'完全' if kind == 'exact' else '近似'}重复，已舍弃")
+                    continue
+                rejects[lab] = 0
+                temp_boost[lab] = max(0.0, temp_boost[lab] - config.DEDUP_TEMPERATURE_STEP)
+                dedup_index.add(codes)
+            store.append_codes(codes, lab, standardized_row["原问卷序号"])
+            pd.DataFrame([standardized_row]).to_csv(config.AI_OUTPUT_CSV, mode='a', header=False, index=False)
+            generated[lab] += 1
+            if controller is not None:
+                controller.observe(lab, codes)
+                pbar.total = controller.total_target()
+                pbar.refresh()
+            pbar.update(1)
+        except Exception as e:
+            print(f"生成问卷失败: {e}")
     pbar.close()
-    return new_rows
+
+    if dedup_index is not None:
+        print(f"  [查重] 生成过程中共舍弃重复问卷 {dup_total} 条")
+    if controller is not None:
+        print(f"  [配额] 实际生成 {len(store)} 条，初始目标 {total_target} 条，节省调用 {controller.saved} 次")
+        for lab, info in controller.summary().items():
+            print(f"    簇 {lab}: {info}")
+    print(f"  AI 问卷存储: {store.memory_report()}")
+    return store
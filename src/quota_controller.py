@@ -0,0 +1,144 @@
+import numpy as np
+from scipy import sparse
+
+from . import config
+from .codebook import load_codebook, encode_frame, indicator_matrix, code_offsets
+from .fidelity import segment_metrics
+
+
+class QuotaController:
+    """
+    生成过程中的在线配额控制：
+      - 按簇累计已生成问卷的逐题选项分布，并与该簇原始问卷分布比较（逐题 JSD 的平均值）；
+      - 即使生成器完全忠实，有限样本的 JSD 也有噪声下限（约与 1/n 成正比）。初始化时对每簇原始问卷
+        做 bootstrap 估计该下限，n 条生成问卷的噪声取 c * (1/n + 1/m)（m 为该簇原始问卷数），
+        偏差超出噪声的部分（excess）才视为失真；
+      - 每次挑选“进度最落后、偏差最大”的簇继续生成，使各簇交替推进；
+      - 某簇达到最少样本量且 excess 低于容差时提前停止，其剩余配额部分转给仍偏差较大的簇；
+      - 未转出的剩余配额直接节省，不再调用大模型。
+    """
+    def __init__(self, df_raw, labels, target_counts, codebook=None):
+        full_codebook = codebook or load_codebook()
+        self.keep = [j for j, q in enumerate(full_codebook) if q["n_codes"] > 0]
+        self.codebook = [full_codebook[j] for j in self.keep]
+        self.offsets = code_offsets(self.codebook)
+        self.tolerance = config.ADAPTIVE_TOLERANCE
+
+        self.target = dict(target_counts)
+        self.initial_target = dict(target_counts)
+        self.min_samples = {
+            lab: min(t, max(config.ADAPTIVE_MIN_SAMPLES, int(np.ceil(t * config.ADAPTIVE_MIN_FRACTION))))
+            for lab, t in target_counts.items()
+        }
+
+        labels = np.asarray(labels)
+        M = indicator_matrix(encode_frame(df_raw, self.codebook), self.codebook)
+        rng = np.random.default_rng(0)
+        self.ref = {}
+        self.ref_rows = {}
+        self.noise_scale = {}
+        for lab in target_counts:
+            rows = np.nonzero(labels == lab)[0]
+            self.ref[lab] = np.asarray(M[rows].sum(axis=0), dtype=np.float64).ravel()
+            self.ref_rows[lab] = len(rows)
+            self.noise_scale[lab] = self._noise_scale(M[rows], self.ref[lab], max(self.min_samples[lab], 1), rng)
+
+        self.counts = {lab: np.zeros(int(self.offsets[-1])) for lab in target_counts}
+        self.generated = {lab: 0 for lab in target_counts}
+        self.divergence = {lab: np.inf for lab in target_counts}
+        self.excess = {lab: np.inf for lab in target_counts}
+        self.converged = set()
+        self.saved = 0
+
+    def _noise_scale(self, M_lab, ref, n, rng):
+        """
+        从该簇原始问卷中有放回地抽取 n 条，重复 ADAPTIVE_NOISE_RESAMPLES 次，
+        以平均 JSD * n 作为噪声系数 c（抽样 JSD ≈ c / n）
+        """
+        m = M_lab.shape[0]
+        if m == 0:
+            return 0.0
+        B = config.ADAPTIVE_NOISE_RESAMPLES
+        idx = rng.integers(m, size=(B, n))
+        # 选择矩阵 S[b, i] = 第 b 次抽样中第 i 行被抽中的次数，S @ M 即每次抽样的选项计数
+        S = sparse.csr_matrix((np.ones(B * n), (np.repeat(np.arange(B), n), idx.ravel())), shape=(B, m))
+        boot = np.asarray((S @ M_lab).todense(), dtype=np.float64)
+        jsd = segment_metrics(np.broadcast_to(ref, boot.shape), boot, self.offsets)["jsd"]
+        return float(np.nanmean(jsd)) * n
+
+    def noise_floor(self, lab, n=None):
+        """
+        忠实的生成器生成 n 条问卷时，与该簇原始问卷的平均 JSD 的期望噪声
+        """
+        n = self.generated[lab] if n is None else n
+        if n <= 0 or self.ref_rows[lab] == 0:
+            return np.inf
+        return self.noise_scale[lab] * (1.0 / n + 1.0 / self.ref_rows[lab])
+
+    def _divergence(self, lab):
+        metrics = segment_metrics(self.ref[lab][None, :], self.counts[lab][None, :], self.offsets)
+        return float(np.nanmean(metrics["jsd"]))
+
+    def _active(self):
+        return [lab for lab in self.target
+                if lab not in self.converged and self.generated[lab] < self.target[lab]]
+
+    def next_cluster(self):
+        """
+        返回下一条应生成的簇编号；全部完成时返回 None
+        """
+        active = self._active()
+        if not active:
+            return None
+        # 进度比例越低越优先；进度相同时偏差越大越优先
+        return min(active, key=lambda lab: (self.generated[lab] / self.target[lab], -self.divergence[lab]))
+
+    def observe(self, lab, codes):
+        """
+        记录一条已接受的问卷（按完整 codebook 编码的向量），并检查该簇是否已达到容差
+        """
+        codes = np.asarray(codes)[self.keep]
+        self.counts[lab] += indicator_matrix(codes[None, :], self.codebook).toarray().ravel()
+        self.generated[lab] += 1
+        self.divergence[lab] = self._divergence(lab)
+        self.excess[lab] = self.divergence[lab] - self.noise_floor(lab)
+        if self.generated[lab] >= self.min_samples[lab] and self.excess[lab] <= self.tolerance:
+            self._converge(lab)
+
+    def _converge(self, lab):
+        self.converged.add(lab)
+        freed = self.target[lab] - self.generated[lab]
+        self.target[lab] = self.generated[lab]
+        if freed <= 0:
+            return
+        # 剩余配额按偏差大小转给仍未达标的簇，每簇增量不超过其初始配额的 ADAPTIVE_MAX_BOOST 倍
+        lagging = [l for l in self._active() if self.excess[l] > self.tolerance]
+        weights = np.array([min(self.excess[l], 1.0) if np.isfinite(self.excess[l]) else 1.0
+                            for l in lagging])
+        given = 0
+        if lagging and weights.sum() > 0:
+            shares = np.floor(freed * weights / weights.sum()).astype(int)
+            for l, share in zip(lagging, shares):
+                cap = int(self.initial_target[l] * (1 + config.ADAPTIVE_MAX_BOOST)) - self.target[l]
+                extra = max(0, min(int(share), cap))
+                self.target[l] += extra
+                given += extra
+        self.saved += freed - given
+        print(f"\n  [配额] 簇 {lab} 已达容差 (JSD={self.divergence[lab]:.4f}, "
+              f"噪声下限={self.noise_floor(lab):.4f}, n={self.generated[lab]})，"
+              f"释放 {freed} 条配额，转给其它簇 {given} 条")
+
+    def total_target(self):
+        return sum(self.target.values())
+
+    def summary(self):
+        return {
+            lab: {
+                "generated": self.generated[lab],
+                "initial_target": self.initial_target[lab],
+                "divergence": round(self.divergence[lab], 4) if np.isfinite(self.divergence[lab]) else None,
+                "noise_floor": round(self.noise_floor(lab), 4) if self.generated[lab] else None,
+                "converged": lab in self.converged,
+            }
+            for lab in self.target
+        }
@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from . import config
+
+REDUCTION_METHODS = ("pca", "svd", "mca")
+
+
+def _n_from_ratio(values, target, total):
+    """
+    选择保留的维数：target 为整数时直接使用；为小数时取累计 values / total 首次达到 target 的维数
+    """
+    if isinstance(target, int):
+        return max(1, min(target, len(values)))
+    cum = np.cumsum(values) / max(float(total), 1e-12)
+    return int(min(np.searchsorted(cum, target) + 1, len(values)))
+
+
+class FeatureReducer:
+    """
+    聚类前的降维：
+      - "pca": 主成分分析（取固定维数时使用随机化 SVD 求解）；
+      - "svd": 对稀疏编码矩阵直接做随机化截断 SVD（不中心化，不生成稠密矩阵）；
+      - "mca": 多重对应分析。0/1 列作为指示变量，其余（量表）列按取值展开为指示变量，
+               通过 选项数 x 选项数 的 Burt 型矩阵求解，内存与样本数无关。
+    拟合后可用 transform 对新增问卷做一致的投影（增量模式）。
+    """
+    def __init__(self, method=None, n_components=None):
+        self.method = method or config.REDUCTION_METHOD
+        if self.method not in REDUCTION_METHODS:
+            raise ValueError(f"未知的降维方法: {self.method}，可选 {REDUCTION_METHODS}")
+        self.n_components = config.REDUCTION_COMPONENTS if n_components is None else n_components
+        self.model = None
+        self.input_dim = None
+        self.explained_ratio = None
+
+    # ---------- MCA ----------
+    def _indicator(self, X):
+        """
+        构造稀疏指示矩阵：0/1 列原样保留，其它列按拟合时出现过的取值展开
+        """
+        blocks = [sparse.csr_matrix(X[:, self.binary_cols])]
+        for j, values in self.category_values:
+            blocks.append(sparse.csr_matrix((X[:, [j]] == values[None, :]).astype(np.float64)))
+        return sparse.hstack(blocks, format="csr")
+
+    def _fit_mca(self, X):
+        binary = np.all((X == 0) | (X == 1), axis=0)
+        self.binary_cols = np.nonzero(binary)[0]
+        self.category_values = [(j, np.unique(X[:, j])) for j in np.nonzero(~binary)[0]]
+        Z = self._indicator(X)
+        col_sum = np.asarray(Z.sum(axis=0)).ravel()
+        row_sum = np.asarray(Z.sum(axis=1)).ravel()
+        keep = col_sum > 0
+        total = col_sum.sum()
+        c = col_sum[keep] / total
+        Zk = Z[:, keep]
+        # S^T S = D_c^{-1/2} (P^T D_r^{-1} P - c c^T) D_c^{-1/2}，其中 P = Z / total
+        inv_r = sparse.diags(1.0 / np.maximum(row_sum, 1e-12))
+        burt = np.asarray((Zk.T @ inv_r @ Zk).todense()) / total
+        scale = 1.0 / np.sqrt(c)
+        StS = (burt - np.outer(c, c)) * scale[:, None] * scale[None, :]
+        eigvals, eigvecs = np.linalg.eigh(StS)
+        order = np.argsort(eigvals)[::-1]
+        eigvals = np.clip(eigvals[order], 0, None)
+        n = _n_from_ratio(eigvals[:-1], self.n_components, eigvals.sum())
+        # 列标准坐标；行主坐标 = 行轮廓 @ 列标准坐标
+        gamma = np.zeros((Z.shape[1], n))
+        gamma[keep] = eigvecs[:, order[:n]] * scale[:, None]
+        self.model = gamma
+        self.explained_ratio = eigvals[:n] / max(eigvals.sum(), 1e-12)
+
+    def _transform_mca(self, X):
+        Z = self._indicator(X)
+        row_sum = np.asarray(Z.sum(axis=1)).ravel()
+        return np.asarray(sparse.diags(1.0 / np.maximum(row_sum, 1e-12)) @ Z @ self.model)
+
+    # ---------- 通用接口 ----------
+    def fit_transform(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        self.input_dim = X.shape[1]
+        max_n = min(X.shape) - 1
+        if self.method == "pca":
+            from sklearn.decomposition import PCA
+            n = self.n_components
+            if isinstance(n, int):
+                self.model = PCA(n_components=min(n, max_n), svd_solver="randomized", random_state=42)
+            else:
+                self.model = PCA(n_components=n, svd_solver="full")
+            # 随机化求解时 fit_transform 返回近似的 U*S，统一用 transform 保证与新数据投影一致
+            out = self.model.fit(X).transform(X)
+            self.explained_ratio = self.model.explained_variance_ratio_
+        elif self.method == "svd":
+            from sklearn.decomposition import TruncatedSVD
+            n = self.n_components
+            fit_n = min(n if isinstance(n, int) else config.REDUCTION_MAX_COMPONENTS, max_n)
+            self.model = TruncatedSVD(n_components=fit_n, algorithm="randomized", random_state=42)
+            out = self.model.fit_transform(sparse.csr_matrix(X))
+            ratios = self.model.explained_variance_ratio_
+            keep = _n_from_ratio(ratios, n, 1.0)
+            self.model.components_ = self.model.components_[:keep]
+            self.explained_ratio = ratios[:keep]
+            out = out[:, :keep]
+        else:
+            self._fit_mca(X)
+            out = self._transform_mca(X)
+        return out
+
+    def transform(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if self.method == "pca":
+            return self.model.transform(X)
+        if self.method == "svd":
+            return np.asarray(sparse.csr_matrix(X) @ self.model.components_.T)
+        return self._transform_mca(X)
+
+    @property
+    def n_output(self):
+        return len(self.explained_ratio)
+
+
+def reduce_features(df_encoded):
+    """
+    按 config.REDUCTION_METHOD 对编码矩阵降维。
+    返回 (降维后的 DataFrame, 降维器, 耗时)；未启用时原样返回且降维器为 None。
+    """
+    if not config.REDUCTION_METHOD:
+        return df_encoded, None, 0.0
+    print(f"\n[降维] 方法: {config.REDUCTION_METHOD}, 目标维数: {config.REDUCTION_COMPONENTS}")
+    t0 = time.perf_counter()
+    reducer = FeatureReducer()
+    X_red = reducer.fit_transform(df_encoded.to_numpy(dtype=np.float64))
+    elapsed = time.perf_counter() - t0
+    print(f"  维数 {reducer.input_dim} -> {reducer.n_output}, "
+          f"累计解释比例 {float(np.sum(reducer.explained_ratio)):.3f}, 耗时 {elapsed:.3f}s")
+    columns = [f"{config.REDUCTION_METHOD}_{i + 1}" for i in range(X_red.shape[1])]
+    return pd.DataFrame(X_red, index=df_encoded.index, columns=columns), reducer, elapsed
+
+
+def _silhouette(X, labels):
+    from sklearn.metrics import silhouette_score
+
+    if len(np.unique(labels)) < 2:
+        return None
+    sample_size = min(len(X), config.AUTO_K_SAMPLE_SIZE)
+    return float(silhouette_score(X, labels, sample_size=sample_size, random_state=42))
+
+
+def _timed_clustering(X, k):
+    """
+    Ward 层次聚类 + 最终聚类（KMeans / GMM）的耗时与标签
+    """
+    from scipy.cluster.hierarchy import linkage
+    from .clustering import final_clustering
+
+    t0 = time.perf_counter()
+    linkage(X, method='ward')
+    labels, _ = final_clustering(X, k)
+    return time.perf_counter() - t0, labels
+
+
+def evaluate_reduction(df_encoded, df_reduced, reducer, reduce_time, k, labels):
+    """
+    报告降维的效果：降维后得到的簇在原始编码空间中的轮廓系数（与原始维度可比）。
+    config.REDUCTION_COMPARE 为 True 时，分别在降维与原始维度上计时重跑层次聚类与最终聚类，
+    给出加速比（原始耗时 / (降维耗时 + 降维后聚类耗时)）、原始维度聚类的轮廓系数
+    以及两组簇标签的调整兰德指数。结果写入 reduction_report.json。
+    """
+    from sklearn.metrics import adjusted_rand_score
+
+    X_full = df_encoded.to_numpy(dtype=np.float64)
+    report = {
+        "method": reducer.method,
+        "input_dim": reducer.input_dim,
+        "output_dim": reducer.n_output,
+        "explained_ratio": round(float(np.sum(reducer.explained_ratio)), 4),
+        "reduce_seconds": round(reduce_time, 3),
+        "silhouette_reduced_space": _silhouette(df_reduced.to_numpy(), labels),
+        "silhouette_full_space": _silhouette(X_full, labels),
+    }
+    if config.REDUCTION_COMPARE:
+        print("\n[降维对比] 分别在降维与原始维度上计时重跑聚类 ...")
+        reduced_time, _ = _timed_clustering(df_reduced.to_numpy(), k)
+        full_time, full_labels = _timed_clustering(X_full, k)
+        report.update({
+            "reduced_cluster_seconds": round(reduced_time, 3),
+            "full_cluster_seconds": round(full_time, 3),
+            "speedup": round(full_time / max(reduce_time + reduced_time, 1e-9), 2),
+            "silhouette_full_space_baseline": _silhouette(X_full, full_labels),
+            "adjusted_rand_index": round(float(adjusted_rand_score(full_labels, labels)), 4),
+        })
+    print(f"  [降维] 报告: {report}")
+    os.makedirs(config.OUTPUT_DIR, exist_ok=True)
+    with open(os.path.join(config.OUTPUT_DIR, "reduction_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
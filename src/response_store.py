@@ -0,0 +1,218 @@
+import re
+import numpy as np
+import pandas as pd
+
+from .codebook import SKIP_CODE, load_codebook, match_columns, encode_frame, decode_value
+
+# 抖动来源类别：-1 表示未经抖动（AI 原始问卷）
+JITTER_NONE = -1
+JITTER_KINDS = ["随机抖动", "5题A变B", "5题B处理", "35题翻转为B"]
+JITTER_RANDOM, JITTER_Q5_FLIP, JITTER_Q5_B, JITTER_Q35_FLIP = range(len(JITTER_KINDS))
+# 单选题抖动来源以 uint64 位掩码记录（第 j 位对应 codebook 中第 j 题），题目数不能超过位数
+MAX_QUESTIONS = 64
+
+
+def _code_dtype(q):
+    if q["type"] == "multiple":
+        return np.int16 if q["n_codes"] < 15 else np.int32
+    return np.int8
+
+
+class ResponseStore:
+    """
+    列式问卷存储：每道题一列整数编码（单选为选项下标、量表为 数值-1，均为 int8；
+    多选为选项位掩码），跳过记为 -1；另有簇编号、原问卷序号与抖动来源等元信息列。
+    生成、抖动、分析三个阶段共用该结构，只在输出 CSV 时解码为字符串。
+    """
+    def __init__(self, columns, codebook=None, capacity=0):
+        self.codebook = codebook or load_codebook()
+        if len(self.codebook) > MAX_QUESTIONS:
+            raise ValueError(f"问卷共 {len(self.codebook)} 题，超过 ResponseStore 支持的上限 {MAX_QUESTIONS} 题"
+                             f"（抖动来源以 64 位掩码记录）")
+        self.columns = list(columns)
+        self.question_cols = match_columns(self.columns, self.codebook)
+        self.qpos = {q["qnum"]: j for j, q in enumerate(self.codebook)}
+        capacity = max(int(capacity), 1)
+        self.answers = [np.full(capacity, SKIP_CODE, dtype=_code_dtype(q)) for q in self.codebook]
+        self.cluster = np.full(capacity, -1, dtype=np.int16)
+        self.source = np.zeros(capacity, dtype=np.int32)
+        self.jitter_kind = np.full(capacity, JITTER_NONE, dtype=np.int8)
+        self.jitter_mask = np.zeros(capacity, dtype=np.uint64)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    # ---------- 构造 ----------
+    def _arrays(self):
+        return self.answers + [self.cluster, self.source, self.jitter_kind, self.jitter_mask]
+
+    def _reserve(self, n):
+        capacity = len(self.cluster)
+        if n <= capacity:
+            return
+        new_cap = max(n, capacity * 2)
+        fills = [SKIP_CODE] * len(self.answers) + [-1, 0, JITTER_NONE, 0]
+        grown = []
+        for arr, fill in zip(self._arrays(), fills):
+            new = np.full(new_cap, fill, dtype=arr.dtype)
+            new[:self.size] = arr[:self.size]
+            grown.append(new)
+        k = len(self.answers)
+        self.answers = grown[:k]
+        self.cluster, self.source, self.jitter_kind, self.jitter_mask = grown[k:]
+
+    def append_codes(self, codes, cluster, source):
+        """
+        追加一条已编码的问卷（codes 与 codebook 顺序一致）
+        """
+        self._reserve(self.size + 1)
+        i = self.size
+        for j, arr in enumerate(self.answers):
+            arr[i] = codes[j]
+        self.cluster[i] = cluster
+        self.source[i] = source
+        self.size += 1
+
+    @classmethod
+    def from_codes(cls, columns, codes, cluster, source, codebook=None):
+        store = cls(columns, codebook=codebook, capacity=len(codes))
+        n = len(codes)
+        for j, arr in enumerate(store.answers):
+            arr[:n] = codes[:, j]
+        store.cluster[:n] = cluster
+        store.source[:n] = source
+        store.size = n
+        return store
+
+    @classmethod
+    def from_frame(cls, df, columns=None, codebook=None):
+        """
+        由 DataFrame（如读回的 CSV）构造，解析“簇编号 / 原问卷序号 / 抖动来源”列
+        """
+        codebook = codebook or load_codebook()
+        columns = columns if columns is not None else [c for c in df.columns if c not in ("簇编号", "原问卷序号", "抖动来源")]
+        codes = encode_frame(df, codebook)
+        cluster = pd.to_numeric(df.get("簇编号"), errors="coerce") if "簇编号" in df else None
+        cluster = cluster.fillna(-1).to_numpy() if cluster is not None else -1
+        source = pd.to_numeric(df.get("原问卷序号"), errors="coerce") if "原问卷序号" in df else None
+        source = source.fillna(0).to_numpy() if source is not None else 0
+        store = cls.from_codes(columns, codes, cluster, source, codebook)
+        if "抖动来源" in df:
+            for i, text in enumerate(df["抖动来源"].astype(str)):
+                store.jitter_kind[i], store.jitter_mask[i] = store._parse_provenance(text)
+        return store
+
+    @classmethod
+    def concat(cls, stores):
+        stores = [s for s in stores if s is not None]
+        first = stores[0]
+        total = sum(len(s) for s in stores)
+        out = cls(first.columns, codebook=first.codebook, capacity=total)
+        pos = 0
+        for s in stores:
+            n = len(s)
+            for dst, src in zip(out._arrays(), s._arrays()):
+                dst[pos:pos + n] = src[:n]
+            pos += n
+        out.size = total
+        return out
+
+    def copy(self):
+        out = ResponseStore(self.columns, codebook=self.codebook, capacity=0)
+        k = len(self.answers)
+        arrays = [arr[:self.size].copy() for arr in self._arrays()]
+        out.answers = arrays[:k]
+        out.cluster, out.source, out.jitter_kind, out.jitter_mask = arrays[k:]
+        out.size = self.size
+        return out
+
+    def take(self, indices):
+        out = ResponseStore(self.columns, codebook=self.codebook, capacity=0)
+        k = len(out.answers)
+        arrays = [arr[:self.size][indices] for arr in self._arrays()]
+        out.answers = arrays[:k]
+        out.cluster, out.source, out.jitter_kind, out.jitter_mask = arrays[k:]
+        out.size = len(indices)
+        return out
+
+    # ---------- 访问 ----------
+    def column(self, qnum):
+        """
+        返回某题编码列的视图（修改会直接写回存储）
+        """
+        return self.answers[self.qpos[qnum]][:self.size]
+
+    def codes_matrix(self, codebook=None):
+        """
+        返回 (行数, 题数) 的 int32 编码矩阵；传入 codebook 时按其题号顺序对齐
+        """
+        order = range(len(self.codebook)) if codebook is None else [self.qpos.get(q["qnum"]) for q in codebook]
+        out = np.full((self.size, len(order)), SKIP_CODE, dtype=np.int32)
+        for j, pos in enumerate(order):
+            if pos is not None:
+                out[:, j] = self.answers[pos][:self.size]
+        return out
+
+    def labels(self):
+        return self.cluster[:self.size].astype(np.int64)
+
+    def nbytes(self):
+        return sum(arr[:self.size].nbytes for arr in self._arrays())
+
+    def memory_report(self):
+        n = max(self.size, 1)
+        return f"{self.size} 行, {self.nbytes() / 1024 ** 2:.2f} MB ({self.nbytes() / n:.1f} 字节/行)"
+
+    # ---------- 输出 ----------
+    def _parse_provenance(self, text):
+        m = re.match(r'^原问卷[^-]*-(.*)$', text)
+        if not m:
+            return JITTER_NONE, 0
+        suffix = m.group(1)
+        if suffix in JITTER_KINDS:
+            return JITTER_KINDS.index(suffix), 0
+        mask = 0
+        for part in suffix.split("; "):
+            m2 = re.match(r'^单选题(.+)抖动$', part)
+            if m2:
+                m3 = re.match(r'^(\d+)', m2.group(1))
+                if m3 and m3.group(1) in self.qpos:
+                    mask |= 1 << self.qpos[m3.group(1)]
+        return JITTER_RANDOM, mask
+
+    def _provenance_strings(self):
+        kind = self.jitter_kind[:self.size]
+        mask = self.jitter_mask[:self.size]
+        suffix = np.array(JITTER_KINDS, dtype=object)[np.clip(kind, 0, None)]
+        uniq, inverse = np.unique(mask, return_inverse=True)
+        texts = []
+        for m in uniq:
+            parts = [f"单选题{self.question_cols[j]}抖动" for j in range(len(self.codebook)) if int(m) >> j & 1]
+            texts.append("; ".join(parts))
+        mask_text = np.array(texts, dtype=object)[inverse]
+        suffix = np.where(mask != 0, mask_text, suffix)
+        prefix = "原问卷" + pd.Series(self.source[:self.size]).astype(str) + "-"
+        return (prefix + pd.Series(suffix, dtype=object)).to_numpy()
+
+    def to_frame(self):
+        """
+        解码为与原 AI 问卷 CSV 相同格式的 DataFrame：原始问卷列在前，元信息列在后
+        """
+        data = {}
+        by_col = {col: j for j, col in enumerate(self.question_cols) if col is not None}
+        for col in self.columns:
+            j = by_col.get(col)
+            if j is None:
+                data[col] = np.full(self.size, "(跳过)", dtype=object)
+                continue
+            q = self.codebook[j]
+            codes = self.answers[j][:self.size]
+            uniq, inverse = np.unique(codes, return_inverse=True)
+            table = np.array([decode_value(int(c), q) for c in uniq], dtype=object)
+            data[col] = table[inverse]
+        data["簇编号"] = self.cluster[:self.size].astype(str)
+        data["原问卷序号"] = self.source[:self.size].astype(np.int64)
+        if (self.jitter_kind[:self.size] != JITTER_NONE).any():
+            data["抖动来源"] = self._provenance_strings()
+        return pd.DataFrame(data)
@@ -0,0 +1,381 @@
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+from collections import Counter
+from tqdm import tqdm
+
+from . import config
+from .dedup import DedupIndex
+from .codebook import load_codebook, encode_row
+from .response_store import ResponseStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS prompts (cluster INTEGER PRIMARY KEY, prompt TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    cluster INTEGER NOT NULL,
+    sample_idx INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    UNIQUE (cluster, sample_idx)
+);
+CREATE INDEX IF NOT EXISTS items_status ON items (status, lease_until);
+"""
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    基于 SQLite 文件的问卷生成任务队列，每个任务为 (簇编号, 提示词, 样本序号)：
+      - 任务以 (簇编号, 样本序号) 唯一，重复入队不会产生重复任务；
+      - 工作进程租用任务，租约到期未提交的任务自动回到待处理状态；
+      - 提交结果是幂等的：任务一旦完成，之后的重复提交被忽略。
+    默认使用 WAL 日志模式（所有进程须在同一台机器上）；多台机器通过网络文件系统
+    共享队列文件时应将 config.QUEUE_JOURNAL_MODE 设为 "DELETE"。
+    """
+    def __init__(self, path=None, journal_mode=None):
+        self.path = path or config.QUEUE_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # isolation_level=None：自动提交，需要原子性的操作显式使用 BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self.conn.execute(f"PRAGMA journal_mode={journal_mode or config.QUEUE_JOURNAL_MODE}")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _transaction(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+
+    # ---------- 协调端 ----------
+    def enqueue(self, prompts, target_counts):
+        """
+        写入各簇提示词与任务。队列中已有相同内容（提示词与配额一致）的任务时直接续用，
+        已完成的结果会保留，上次放弃（failed）的任务重置尝试次数后重新入队；
+        内容不同则清空旧任务重新开始。返回本次运行的标识。
+        """
+        run_key = hashlib.sha1(json.dumps(
+            {"prompts": {str(k): v for k, v in prompts.items()},
+             "targets": {str(k): int(v) for k, v in target_counts.items()}},
+            sort_keys=True, ensure_ascii=False,
+        ).encode("utf-8")).hexdigest()[:16]
+        self._transaction()
+        try:
+            row = self.conn.execute("SELECT value FROM meta WHERE key='run_key'").fetchone()
+            if row is None or row[0] != run_key:
+                self.conn.execute("DELETE FROM items")
+                self.conn.execute("DELETE FROM prompts")
+                self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('run_key', ?)", (run_key,))
+            else:
+                self.conn.execute(
+                    "UPDATE items SET status='pending', attempts=0, error=NULL WHERE status='failed'"
+                )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO prompts VALUES (?, ?)",
+                [(int(lab), prompt) for lab, prompt in prompts.items()],
+            )
+            # 各簇样本交错入队，使任意时刻的完成结果覆盖所有簇
+            order = [(int(lab), i) for i in range(max(target_counts.values(), default=0))
+                     for lab in target_counts if i < target_counts[lab]]
+            self.conn.executemany("INSERT OR IGNORE INTO items (cluster, sample_idx) VALUES (?, ?)", order)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return run_key
+
+    def add_items(self, counts):
+        """
+        为各簇追加 counts[簇编号] 个新任务（样本序号接在该簇已有任务之后），用于补足
+        合并时因重复或失败而缺少的问卷。返回追加的任务数。
+        """
+        self._transaction()
+        try:
+            last = dict(self.conn.execute("SELECT cluster, MAX(sample_idx) FROM items GROUP BY cluster").fetchall())
+            start = {int(lab): last.get(int(lab), -1) + 1 for lab in counts}
+            order = [(int(lab), start[int(lab)] + i) for i in range(max(counts.values(), default=0))
+                     for lab in counts if i < counts[lab]]
+            self.conn.executemany("INSERT OR IGNORE INTO items (cluster, sample_idx) VALUES (?, ?)", order)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return len(order)
+
+    def progress(self):
+        counts = dict(self.conn.execute("SELECT status, COUNT(*) FROM items GROUP BY status").fetchall())
+        return {s: counts.get(s, 0) for s in ("pending", "leased", "done", "failed")}
+
+    def results(self):
+        """
+        返回已完成任务的 [(簇编号, 样本序号, 模型输出)]，按入队顺序排列
+        """
+        return self.conn.execute(
+            "SELECT cluster, sample_idx, result FROM items WHERE status='done' ORDER BY id"
+        ).fetchall()
+
+    # ---------- 工作端 ----------
+    def lease(self, worker_id, n=1, lease_seconds=None, max_attempts=None):
+        """
+        租用至多 n 个任务，返回 [(任务id, 簇编号, 样本序号, 提示词)]。
+        先回收已过期的租约：尝试次数已达 max_attempts 的任务标记为 failed，其余回到待处理状态。
+        """
+        lease_seconds = lease_seconds or config.QUEUE_LEASE_SECONDS
+        max_attempts = max_attempts or config.QUEUE_MAX_ATTEMPTS
+        now = time.time()
+        self._transaction()
+        try:
+            self.conn.execute(
+                "UPDATE items SET status=CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "worker=NULL, lease_until=NULL, error=COALESCE(error, '租约过期') "
+                "WHERE status='leased' AND lease_until < ?", (max_attempts, now)
+            )
+            rows = self.conn.execute(
+                "SELECT items.id, items.cluster, items.sample_idx, prompts.prompt FROM items "
+                "JOIN prompts ON prompts.cluster = items.cluster "
+                "WHERE items.status='pending' ORDER BY items.id LIMIT ?", (n,)
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE items SET status='leased', worker=?, lease_until=?, attempts=attempts+1 WHERE id=?",
+                [(worker_id, now + lease_seconds, r[0]) for r in rows],
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def complete(self, item_id, result):
+        """
+        提交任务结果；租约过期后的迟到提交只要任务尚未完成仍然有效。
+        返回 False 表示任务已由其它工作进程完成，本次提交被忽略。
+        """
+        cur = self.conn.execute(
+            "UPDATE items SET status='done', result=?, worker=NULL, lease_until=NULL "
+            "WHERE id=? AND status!='done'", (result, item_id)
+        )
+        return cur.rowcount == 1
+
+    def fail(self, item_id, worker_id, error, max_attempts=None):
+        """
+        任务失败：未超过最大尝试次数时放回队列，否则标记为 failed。
+        只有当前持有租约的工作进程才能放回任务；租约过期后已被其它进程重新租用时，本次调用被忽略。
+        返回 False 表示调用被忽略。
+        """
+        max_attempts = max_attempts or config.QUEUE_MAX_ATTEMPTS
+        cur = self.conn.execute(
+            "UPDATE items SET status=CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "worker=NULL, lease_until=NULL, error=? WHERE id=? AND status='leased' AND worker=?",
+            (max_attempts, str(error)[:500], item_id, worker_id)
+        )
+        return cur.rowcount == 1
+
+
+def process_item(queue, item, model_wrapper, columns, worker_id):
+    """
+    调用模型完成单个任务。输出无法解析为合格问卷时视为失败，放回队列重试。
+    """
+    from .questionnaire_generation import parse_questionnaire_response
+
+    item_id, lab, sample_idx, prompt = item
+    # 温度扰动由 (簇编号, 样本序号) 决定，同一任务无论由哪个进程执行都相同
+    rng = np.random.default_rng([int(lab), int(sample_idx)])
+    try:
+        resp = model_wrapper.create_completion(
+            prompt=prompt,
+            temperature=0.15 + rng.uniform(-0.05, 0.05),
+            max_tokens=2048
+        )
+        raw_text = resp["choices"][0]["text"].strip()
+        if parse_questionnaire_response(raw_text, columns, lab, 0) is None:
+            queue.fail(item_id, worker_id, "输出格式不合格")
+            return False
+    except Exception as e:
+        queue.fail(item_id, worker_id, e)
+        return False
+    return queue.complete(item_id, raw_text)
+
+
+def run_worker(queue_path, model_wrapper, columns, worker_id=None, batch=1, stop_when_idle=True):
+    """
+    工作进程主循环：不断租用并完成任务；队列中没有待处理和租用中的任务时退出。
+    columns 为原始 CSV 表头，用于校验输出。
+    """
+    from .questionnaire_generation import load_question_config
+
+    load_question_config()
+    worker_id = worker_id or default_worker_id()
+    queue = WorkQueue(queue_path)
+    done = 0
+    try:
+        while True:
+            items = queue.lease(worker_id, n=batch)
+            if not items:
+                status = queue.progress()
+                if stop_when_idle and status["pending"] == 0 and status["leased"] == 0:
+                    break
+                time.sleep(config.QUEUE_POLL_INTERVAL)
+                continue
+            for item in items:
+                done += bool(process_item(queue, item, model_wrapper, columns, worker_id))
+    finally:
+        queue.close()
+    print(f"  [队列] 工作进程 {worker_id} 完成 {done} 个任务")
+    return done
+
+
+def _wait_for_items(queue, model_wrapper, columns, worker_id, pbar):
+    """
+    等待队列中没有待处理和租用中的任务；提供 model_wrapper 时协调进程本身也参与生成
+    """
+    while True:
+        status = queue.progress()
+        finished = status["done"] + status["failed"]
+        if finished != pbar.n:
+            pbar.n = finished
+            pbar.refresh()
+        if status["pending"] == 0 and status["leased"] == 0:
+            return status
+        items = queue.lease(worker_id) if model_wrapper is not None else []
+        if items:
+            process_item(queue, items[0], model_wrapper, columns, worker_id)
+        else:
+            time.sleep(config.QUEUE_POLL_INTERVAL)
+
+
+def _merge_results(results, columns, codebook, serial_start, dedup_index):
+    """
+    按入队顺序解析并查重已完成的任务，返回 (问卷存储, 标准化问卷列表, 舍弃的重复数)。
+    每轮补充的任务排在已有任务之后，因此先前接受的问卷在之后的合并中保持不变。
+    """
+    from .questionnaire_generation import parse_questionnaire_response
+
+    store = ResponseStore(columns, codebook=codebook, capacity=len(results))
+    rows, dup_total = [], 0
+    for lab, _, raw_text in results:
+        try:
+            row = parse_questionnaire_response(raw_text, columns, lab, serial_start + len(store))
+        except Exception as e:
+            print(f"生成问卷失败: {e}")
+            continue
+        if row is None:
+            continue
+        codes = encode_row(row, codebook)
+        if dedup_index is not None:
+            kind, _ = dedup_index.query(codes)
+            if kind is not None:
+                dup_total += 1
+                continue
+            dedup_index.add(codes)
+        store.append_codes(codes, lab, row["原问卷序号"])
+        rows.append(row)
+    return store, rows, dup_total
+
+
+def generate_distributed(df_raw, prompts, target_counts, model_wrapper=None, serial_start=1, existing=None):
+    """
+    分布式生成的协调端：
+      1) 将 (簇编号, 提示词, 样本序号) 写入队列；
+      2) 若提供 model_wrapper，协调进程本身也作为一个工作进程参与生成；
+      3) 等待全部任务完成或失败后，按入队顺序合并结果，解析、查重；
+      4) 某簇因重复或失败而少于目标数时为其追加任务，至多 config.QUEUE_TOPUP_ROUNDS 轮，
+         最后将合并结果写入 AI 问卷 CSV。
+    其它机器或进程通过 `python -m src.work_queue worker` 连接同一队列文件参与生成。
+    自适应配额与生成时的温度提升依赖串行顺序，分布式模式下不启用，重复问卷在合并时剔除
+    （existing 为已生成的 AI 问卷，与其重复的问卷同样剔除）。
+    """
+    queue = WorkQueue()
+    run_key = queue.enqueue(prompts, target_counts)
+    total = sum(target_counts.values())
+    print(f"  [队列] {queue.path} (运行 {run_key}): {total} 个任务, 当前状态 {queue.progress()}")
+
+    codebook = load_codebook()
+    worker_id = default_worker_id() + "-coordinator"
+    pbar = tqdm(total=total, desc="生成问卷进度")
+    rounds = 0
+    try:
+        while True:
+            status = _wait_for_items(queue, model_wrapper, df_raw.columns, worker_id, pbar)
+            dedup_index = DedupIndex(codebook=codebook) if config.DEDUP_ENABLED else None
+            if dedup_index is not None and existing is not None:
+                dedup_index.extend(existing.codes_matrix(codebook))
+            store, rows, dup_total = _merge_results(queue.results(), df_raw.columns, codebook,
+                                                    serial_start, dedup_index)
+            accepted = Counter(int(l) for l in store.labels())
+            shortfall = {lab: int(t) - accepted[int(lab)] for lab, t in target_counts.items()
+                         if accepted[int(lab)] < int(t)}
+            if not shortfall or rounds >= config.QUEUE_TOPUP_ROUNDS:
+                break
+            rounds += 1
+            added = queue.add_items(shortfall)
+            pbar.total += added
+            pbar.refresh()
+            print(f"\n  [队列] 第 {rounds} 轮补充: 重复 {dup_total} 条、失败 {status['failed']} 个任务，"
+                  f"为各簇追加任务 {shortfall}")
+    finally:
+        pbar.close()
+        queue.close()
+    if status["failed"]:
+        print(f"  [队列] {status['failed']} 个任务超过最大尝试次数，已放弃（以相同配置重新运行时会重试）")
+    if shortfall:
+        print(f"  [队列] 补充 {rounds} 轮后仍有簇未达到目标数: {shortfall}")
+
+    if rows:
+        pd.DataFrame(rows).to_csv(config.AI_OUTPUT_CSV, mode='a', header=False, index=False)
+    if dedup_index is not None:
+        print(f"  [查重] 合并时共舍弃重复问卷 {dup_total} 条")
+    print(f"  AI 问卷存储: {store.memory_report()}")
+    return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="分布式问卷生成队列")
+    sub = parser.add_subparsers(dest="command", required=True)
+    worker = sub.add_parser("worker", help="连接队列并执行生成任务")
+    worker.add_argument("--queue", default=None, help="队列文件路径（默认 config.QUEUE_PATH）")
+    worker.add_argument("--id", default=None, help="工作进程标识")
+    worker.add_argument("--backends", default=None, help="后端配置 JSON 文件（格式同 MODEL_BACKENDS_QUESTION）")
+    worker.add_argument("--batch", type=int, default=1, help="每次租用的任务数")
+    worker.add_argument("--wait", action="store_true", help="队列为空时继续等待新任务")
+    status = sub.add_parser("status", help="查看队列进度")
+    status.add_argument("--queue", default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        queue = WorkQueue(args.queue)
+        print(json.dumps(queue.progress(), ensure_ascii=False))
+        queue.close()
+        return 0
+
+    from . import preprocess
+    if args.backends:
+        from .model_router import build_router
+        with open(args.backends, "r", encoding="utf-8") as f:
+            model = build_router(json.load(f), stage="question")
+    else:
+        from .model_loader import load_model_for_question
+        model = load_model_for_question()
+    columns = preprocess.load_question_list()
+    run_worker(args.queue or config.QUEUE_PATH, model, columns,
+               worker_id=args.id, batch=args.batch, stop_when_idle=not args.wait)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import os
+import numpy as np
+import pandas as pd
+
+from src import config
+from src.analysis import bootstrap_alpha, cronbach_alpha, render_charts, CHART_MANIFEST
+
+
+def _scale_matrix(n=40, k=4, seed=0):
+    rng = np.random.default_rng(seed)
+    trait = rng.normal(size=(n, 1))
+    return np.clip(np.rint(4 + 1.2 * trait + rng.normal(size=(n, k))), 1, 7)
+
+
+def _naive_bootstrap(X, n_resamples, confidence, seed):
+    """
+    逐次重抽样：每次抽取 n 个下标后直接计算 Alpha（随机数的使用顺序与批量版本相同）
+    """
+    rng = np.random.default_rng(seed)
+    n = len(X)
+    alphas = [cronbach_alpha(pd.DataFrame(X[rng.integers(0, n, size=n)])) for _ in range(n_resamples)]
+    tail = (1 - confidence) / 2 * 100
+    return tuple(np.percentile(alphas, [tail, 100 - tail]))
+
+
+def test_bootstrap_matches_naive_resampling_loop():
+    X = _scale_matrix()
+    got = bootstrap_alpha(X, 200, confidence=0.9, seed=3)
+    expected = _naive_bootstrap(X, 200, 0.9, seed=3)
+    np.testing.assert_allclose(got, expected, rtol=1e-10)
+    assert got[0] < cronbach_alpha(pd.DataFrame(X)) < got[1]
+
+
+def test_bootstrap_is_independent_of_batch_size(monkeypatch):
+    X = _scale_matrix()
+    single = bootstrap_alpha(X, 101, seed=5)
+    # 每批 3 次重抽样，共 34 批（最后一批不满）
+    monkeypatch.setattr(config, "BOOTSTRAP_MAX_CELLS", 3 * len(X) + 1)
+    batched = bootstrap_alpha(X, 101, seed=5)
+    np.testing.assert_allclose(batched, single, rtol=1e-12)
+
+
+def test_bootstrap_degenerate_inputs():
+    assert np.isnan(bootstrap_alpha(np.ones((2, 3)), 10)).all()
+    assert np.isnan(bootstrap_alpha(_scale_matrix(k=1), 10)).all()
+
+
+def _chart_jobs(output_dir, shift=0.0):
+    return [{
+        "path": os.path.join(output_dir, f"chart_{i}.png"),
+        "title": f"第{i}题", "ylabel": "比例",
+        "data": {"原始": {"A": 0.4, "B": 0.6}, "AI": {"A": 0.5 + (shift if i == 1 else 0.0), "B": 0.5}},
+    } for i in range(3)]
+
+
+def test_render_charts_skips_unchanged_and_rerenders_changed(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PLOT_WORKERS", 2)
+    out = str(tmp_path)
+
+    first = render_charts(_chart_jobs(out), out)
+    assert sorted(first) == sorted(job["path"] for job in _chart_jobs(out))
+    assert all(os.path.getsize(p) > 0 for p in first)
+    assert os.path.exists(os.path.join(out, CHART_MANIFEST))
+
+    # 输入不变时不重新渲染
+    assert render_charts(_chart_jobs(out), out) == []
+
+    # 只有输入变化的图表与被删除的图表重新渲染
+    os.remove(os.path.join(out, "chart_2.png"))
+    again = render_charts(_chart_jobs(out, shift=0.1), out)
+    assert sorted(os.path.basename(p) for p in again) == ["chart_1.png", "chart_2.png"]
+    assert render_charts(_chart_jobs(out, shift=0.1), out) == []
@@ -0,0 +1,36 @@
+from contextlib import contextmanager
+
+from src import config, batch_runner, incremental, preprocess
+
+
+def _job(extra=None):
+    return {"name": "wave1", "config": dict(extra or {})}
+
+
+def test_pool_workers_are_capped_per_job(tmp_path, monkeypatch):
+    for key in batch_runner.POOL_FIELDS:
+        monkeypatch.setattr(config, key, None)
+    batch_runner.apply_job_config(_job({"JITTER_WORKERS": 64}), str(tmp_path / "a"), pool_workers=3)
+    assert config.JITTER_WORKERS == 3
+    assert config.PLOT_WORKERS == 3
+
+    monkeypatch.setattr(config, "PLOT_WORKERS", None)
+    batch_runner.apply_job_config(_job({"JITTER_WORKERS": 2}), str(tmp_path / "b"), pool_workers=3)
+    assert config.JITTER_WORKERS == 2
+    assert config.PLOT_WORKERS == 3
+
+
+def test_incremental_assessment_takes_cpu_slot(monkeypatch):
+    df_raw, *_ = preprocess.load_raw()
+    state = {"n_rows": len(df_raw), "fingerprint": incremental.rows_fingerprint(df_raw)}
+    monkeypatch.setattr(incremental, "load_state", lambda: state)
+    held = []
+
+    @contextmanager
+    def gate(kind):
+        held.append(kind)
+        yield
+
+    # 没有新增问卷：只做读取与检查，应在 CPU 槽内完成
+    assert incremental.run_incremental(gate=gate)
+    assert held == ["cpu"]
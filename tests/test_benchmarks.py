@@ -0,0 +1,36 @@
+import json
+import pytest
+
+from src import config
+from benchmarks.run_benchmarks import main, STAGES
+
+
+@pytest.fixture
+def restore_config():
+    snapshot = {key: value for key, value in vars(config).items() if key.isupper()}
+    yield
+    for key, value in snapshot.items():
+        setattr(config, key, value)
+
+
+def test_benchmark_smoke_run(tmp_path, restore_config):
+    output = tmp_path / "result.json"
+    argv = ["--sizes", "120", "--k", "3", "--gen-rows", "20", "--jitter-workers", "1", "--output", str(output)]
+    assert main(argv) == 0
+
+    results = json.loads(output.read_text(encoding="utf-8"))["results"]["120"]
+    for stage in STAGES:
+        assert results[stage]["seconds"] >= 0
+        assert results[stage]["peak_alloc_mb"] >= 0
+    # 抖动与分析使用生成阶段的输出，不足 120 条时重复抽取补足
+    assert results["generation"]["rows"] > 0
+    assert results["generation"]["llm_calls"] >= results["generation"]["rows"]
+    assert results["store"]["source"] == "generation"
+    assert results["store"]["rows"] == 120
+    assert results["process"]["max_rss_mb"] > 0
+
+    # 与自身比较：--min-seconds 很大时不应判定为退化
+    assert main(argv[:-1] + [str(tmp_path / "again.json"), "--no-memory", "--compare", str(output),
+                             "--min-seconds", "1000"]) == 0
+    again = json.loads((tmp_path / "again.json").read_text(encoding="utf-8"))["results"]["120"]
+    assert "peak_alloc_mb" not in again["jitter"]
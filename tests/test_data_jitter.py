@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from src import config, preprocess, data_jitter
+from src.response_store import ResponseStore
+
+
+@pytest.fixture(scope="module")
+def raw():
+    df_raw, _, multi_cols, scale_cols = preprocess.load_raw()
+    store = ResponseStore.from_frame(df_raw, columns=df_raw.columns)
+    store.source[:len(store)] = np.arange(1, len(store) + 1)
+    return df_raw, store, multi_cols, scale_cols
+
+
+def _jitter(raw, monkeypatch, workers, seed=7):
+    df_raw, store, multi_cols, scale_cols = raw
+    monkeypatch.setattr(config, "JITTER_WORKERS", workers)
+    monkeypatch.setattr(config, "JITTER_BLOCK_SIZE", 64)
+    return data_jitter.data_jitter(df_raw, store, multi_cols, scale_cols, len(store), seed=seed)
+
+
+def test_output_is_identical_for_any_worker_count(raw, monkeypatch):
+    one = _jitter(raw, monkeypatch, workers=1)
+    two = _jitter(raw, monkeypatch, workers=2)
+
+    assert len(one) == len(two) == len(raw[1])
+    assert np.array_equal(one.codes_matrix(), two.codes_matrix())
+    assert np.array_equal(one.jitter_kind[:len(one)], two.jitter_kind[:len(two)])
+    assert np.array_equal(one.jitter_mask[:len(one)], two.jitter_mask[:len(two)])
+    assert list(one.to_frame()["抖动来源"]) == list(two.to_frame()["抖动来源"])
+    # 确认确实做了抖动，且输入存储未被修改
+    assert not np.array_equal(one.codes_matrix(), raw[1].codes_matrix())
+
+
+def test_different_seed_changes_output(raw, monkeypatch):
+    a = _jitter(raw, monkeypatch, workers=1, seed=7)
+    b = _jitter(raw, monkeypatch, workers=1, seed=8)
+    assert not np.array_equal(a.codes_matrix(), b.codes_matrix())
@@ -0,0 +1,89 @@
+import numpy as np
+
+from src.codebook import load_codebook, SKIP_CODE
+from src.dedup import DedupIndex, dedup_store
+from src.response_store import ResponseStore
+
+
+def _columns(codebook):
+    return [q["col_name"] for q in codebook]
+
+
+def _answered_row(codebook, offset=0):
+    return np.array([(offset + j) % 2 if q["type"] != "multiple" else 1 + (offset + j) % 2
+                     for j, q in enumerate(codebook)], dtype=np.int32)
+
+
+def _q5_b_row(codebook, first_answers):
+    """
+    第5题选“否”：前4题作答，第5题为 B，其余题目全部跳过
+    """
+    row = np.full(len(codebook), SKIP_CODE, dtype=np.int32)
+    for j, q in enumerate(codebook):
+        if int(q["qnum"]) < 5:
+            row[j] = first_answers[j]
+        elif q["qnum"] == "5":
+            row[j] = 1
+    return row
+
+
+def test_skip_pattern_rows_survive_bulk_dedup():
+    codebook = load_codebook()
+    base = _answered_row(codebook)
+    # 第1题不同、其余完全相同的几条“否”问卷，以及完全相同的两条“否”问卷
+    skip_rows = [_q5_b_row(codebook, base), _q5_b_row(codebook, base)]
+    for i in range(3):
+        first = base.copy()
+        first[0] = i + 1
+        skip_rows.append(_q5_b_row(codebook, first))
+    codes = np.stack([base] + skip_rows)
+    store = ResponseStore.from_codes(_columns(codebook), codes, 0, np.arange(1, len(codes) + 1), codebook)
+
+    out, report = dedup_store(store, max_distance=2)
+
+    assert report == {"exact": 0, "near": 0}
+    assert len(out) == len(codes)
+
+
+def test_fully_answered_near_duplicates_are_dropped():
+    codebook = load_codebook()
+    base = _answered_row(codebook)
+    near = base.copy()
+    near[-1] = (near[-1] + 1) % 2
+    other = _answered_row(codebook, offset=1)
+    codes = np.stack([base, base, near, other])
+    store = ResponseStore.from_codes(_columns(codebook), codes, 0, np.arange(1, 5), codebook)
+
+    out, report = dedup_store(store, max_distance=2)
+
+    assert report == {"exact": 1, "near": 1}
+    assert list(out.source[:len(out)]) == [1, 4]
+
+
+def test_max_distance_does_not_depend_on_skip_pattern():
+    codebook = load_codebook()
+    n_q = len(codebook)
+    index = DedupIndex(codebook=codebook, max_distance=2, min_answered=5)
+    base = _answered_row(codebook)
+    # 只作答一半题目的问卷与完整作答的问卷使用相同的阈值：共同作答的题目中至多 2 题不同
+    partial = base.copy()
+    partial[n_q // 2:] = SKIP_CODE
+    index.add(partial)
+    probe = partial.copy()
+    probe[:2] = (probe[:2] + 1) % 2
+    assert index.query(probe) == ("near", 0)
+    probe[2] = (probe[2] + 1) % 2
+    assert index.query(probe) == (None, None)
+    assert index.query(partial) == ("exact", 0)
+
+
+def test_answered_versus_skipped_counts_as_difference():
+    codebook = load_codebook()
+    index = DedupIndex(codebook=codebook, max_distance=2, min_answered=5)
+    base = _answered_row(codebook)
+    index.add(base)
+    probe = base.copy()
+    probe[-3:] = SKIP_CODE
+    assert index.query(probe) == (None, None)
+    probe[-1] = base[-1]
+    assert index.query(probe) == ("near", 0)
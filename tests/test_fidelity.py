@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from scipy.spatial.distance import jensenshannon
+from scipy.stats import chi2_contingency
+
+from src import config
+from src.codebook import load_codebook, code_offsets, SKIP_CODE
+from src.fidelity import compute_fidelity
+from src.response_store import ResponseStore
+
+
+def _random_codes(codebook, n, rng, skip_rate=0.1):
+    codes = np.empty((n, len(codebook)), dtype=np.int32)
+    for j, q in enumerate(codebook):
+        if q["type"] == "multiple":
+            codes[:, j] = rng.integers(1, 2 ** q["n_codes"], size=n)
+        else:
+            codes[:, j] = rng.integers(q["n_codes"], size=n)
+        codes[rng.random(n) < skip_rate, j] = SKIP_CODE
+    return codes
+
+
+def _indicator(row, codebook, offsets):
+    """
+    逐题展开单条问卷的选项指示向量（多选题按位展开，跳过的题全为 0）
+    """
+    vec = np.zeros(offsets[-1])
+    for j, q in enumerate(codebook):
+        c = int(row[j])
+        if c == SKIP_CODE:
+            continue
+        if q["type"] == "multiple":
+            for b in range(q["n_codes"]):
+                if c >> b & 1:
+                    vec[offsets[j] + b] = 1
+        else:
+            vec[offsets[j] + c] = 1
+    return vec
+
+
+def _naive(codes_ref, codes_cmp, codebook):
+    offsets = code_offsets(codebook)
+    M_ref = np.array([_indicator(r, codebook, offsets) for r in codes_ref])
+    M_cmp = np.array([_indicator(r, codebook, offsets) for r in codes_cmp])
+    co_ref = sum(np.outer(v, v) for v in M_ref) / len(M_ref)
+    co_cmp = sum(np.outer(v, v) for v in M_cmp) / len(M_cmp)
+    rows, n_cmp = [], []
+    for j in range(len(codebook)):
+        a, b = offsets[j], offsets[j + 1]
+        ref, cmp = M_ref[:, a:b].sum(axis=0), M_cmp[:, a:b].sum(axis=0)
+        p, q = ref / ref.sum(), cmp / cmp.sum()
+        table = np.vstack([ref, cmp])
+        table = table[:, table.sum(axis=0) > 0]
+        chi2 = chi2_contingency(table, correction=False)[0] if table.shape[1] > 1 else 0.0
+        others = np.r_[0:a, b:offsets[-1]]
+        drift = np.abs(co_ref[a:b][:, others] - co_cmp[a:b][:, others]).mean()
+        rows.append((jensenshannon(p, q, base=2) ** 2, chi2, 0.5 * np.abs(p - q).sum(), drift))
+        n_cmp.append(int(cmp.sum()))
+    return np.array(rows), n_cmp
+
+
+@pytest.mark.parametrize("chunk", [7, 100000])
+def test_matches_naive_per_question_computation(monkeypatch, chunk):
+    monkeypatch.setattr(config, "FIDELITY_CHUNK_ROWS", chunk)
+    codebook = load_codebook()
+    columns = [q["col_name"] for q in codebook]
+    rng = np.random.default_rng(0)
+    ref_codes, cmp_codes = _random_codes(codebook, 60, rng), _random_codes(codebook, 45, rng)
+    ref_labels = rng.integers(-1, 3, size=len(ref_codes))  # -1 为被剔除的簇
+    cmp_labels = rng.integers(0, 3, size=len(cmp_codes))
+    ref = ResponseStore.from_codes(columns, ref_codes, ref_labels, 0, codebook)
+    cmp = ResponseStore.from_codes(columns, cmp_codes, cmp_labels, 0, codebook)
+
+    table = compute_fidelity(ref, ref_labels, {"AI": cmp}, codebook=codebook)
+
+    groups = [("all", ref_labels != -1, np.ones(len(cmp_codes), bool))]
+    groups += [(str(c), ref_labels == c, cmp_labels == c) for c in range(3)]
+    for name, in_ref, in_cmp in groups:
+        got = table[table["group"] == name]
+        expected, n_cmp = _naive(ref_codes[in_ref], cmp_codes[in_cmp], codebook)
+        np.testing.assert_allclose(got[["jsd", "chi2", "tv", "cooc_drift"]].to_numpy(), expected,
+                                   rtol=1e-5, atol=1e-9, err_msg=f"group {name}")
+        assert list(got["n_cmp"]) == n_cmp
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+
+from src import config, preprocess, incremental, questionnaire_generation
+from src.codebook import load_codebook, encode_row
+from src.response_store import ResponseStore
+from .test_work_queue import ScriptedModel, _answer_text
+
+
+def _state(df_raw, multi_cols, scale_cols, k=3):
+    encoder = preprocess.fit_encoder(df_raw, multi_cols, scale_cols)
+    X = preprocess.apply_encoder(df_raw, encoder).to_numpy(dtype=float)
+    model = KMeans(n_clusters=k, n_init=3, random_state=0).fit(X)
+    labels = model.labels_
+    return {
+        "encoder": encoder,
+        "model": model,
+        "centers": model.cluster_centers_,
+        "radii": {ci: np.inf for ci in range(k)},
+        "final_labels": labels,
+        "reference_share": np.bincount(labels, minlength=k) / len(labels),
+        "post_labels": np.empty(0, dtype=np.int64),
+    }, labels
+
+
+def test_share_drift_accumulates_across_waves():
+    df_raw, _, multi_cols, scale_cols = preprocess.load_raw()
+    state, labels = _state(df_raw, multi_cols, scale_cols)
+    # 新问卷全部来自同一个簇：单批太少不判断，累计超过阈值后触发重新聚类
+    wave = config.INCREMENTAL_MIN_DRIFT_ROWS // 2 + 1
+    biased = df_raw[labels == 0].sample(n=2 * wave, replace=True, random_state=0)
+    _, post, drift, _, drifted = incremental.assess_new_rows(biased.iloc[:wave], state)
+    assert drift == 0.0 and not drifted
+
+    state["post_labels"] = post
+    _, post, drift, _, drifted = incremental.assess_new_rows(biased.iloc[wave:2 * wave], state)
+    assert len(post) == 2 * wave
+    assert np.isclose(drift, 1.0 - state["reference_share"][0])
+    assert drifted
+
+
+def test_share_drift_small_for_representative_rows():
+    df_raw, _, multi_cols, scale_cols = preprocess.load_raw()
+    state, _ = _state(df_raw, multi_cols, scale_cols)
+    sample = df_raw.sample(n=len(df_raw) // 2, random_state=0)
+    _, _, drift, _, drifted = incremental.assess_new_rows(sample, state)
+    assert drift < config.INCREMENTAL_SHARE_DRIFT
+    assert not drifted
+
+
+def test_top_up_rejects_rows_already_in_ai_csv(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "AI_OUTPUT_CSV", str(tmp_path / "ai.csv"))
+    monkeypatch.setattr(config, "DEDUP_ENABLED", True)
+    monkeypatch.setattr(config, "QUEUE_ENABLED", False)
+    monkeypatch.setattr(config, "ADAPTIVE_QUOTA_ENABLED", False)
+    questionnaire_generation.load_question_config()
+    codebook = load_codebook()
+    columns = [q["col_name"] for q in codebook]
+    old, new = _answer_text(codebook, 0), _answer_text(codebook, 1)
+    row = questionnaire_generation.parse_questionnaire_response(old, columns, 0, 1)
+    existing = ResponseStore.from_codes(columns, encode_row(row, codebook)[None, :], 0, 1, codebook)
+    # 上一批已生成的问卷再次出现时应被拒绝
+    model = ScriptedModel([old, new])
+
+    store = questionnaire_generation.generate_questionnaires(
+        pd.DataFrame(columns=columns), [0], {0: "画像"}, model,
+        target_counts={0: 1}, serial_start=2, existing=existing)
+
+    assert model.calls == 2
+    assert len(store) == 1
+    assert store.source[0] == 2
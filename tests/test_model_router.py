@@ -0,0 +1,97 @@
+import time
+import threading
+import pytest
+
+from src.model_router import build_router
+
+
+class StubBackend:
+    """
+    假后端：固定延迟，可设置为总是失败；记录被调用的次数
+    """
+    def __init__(self, latency=0.0, fail=False):
+        self.latency = latency
+        self.fail = fail
+        self.calls = 0
+
+    def create_completion(self, prompt, max_tokens=1024, temperature=0.2):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError("stub failure")
+        return {"choices": [{"text": prompt}]}
+
+
+def _router(**stubs):
+    return build_router([{"name": name, "wrapper": stub} for name, stub in stubs.items()], stage="question")
+
+
+def test_failover_to_next_backend():
+    bad, good = StubBackend(fail=True), StubBackend()
+    router = _router(bad=bad, good=good)
+    assert router.create_completion("hi")["choices"][0]["text"] == "hi"
+    stats = router.stats()
+    assert stats["bad"]["failures"] == 1
+    assert stats["good"]["calls"] == 1
+
+
+def test_all_backends_failing_raises():
+    router = _router(a=StubBackend(fail=True), b=StubBackend(fail=True))
+    with pytest.raises(RuntimeError):
+        router.create_completion("hi")
+
+
+def test_cooling_backend_is_skipped():
+    flaky, slow = StubBackend(fail=True), StubBackend(latency=0.01)
+    router = _router(flaky=flaky, slow=slow)
+    router.create_completion("hi")
+    flaky.fail = False
+    for _ in range(3):
+        router.create_completion("hi")
+    # 冷却期内不再调用失败过的后端
+    assert flaky.calls == 1
+    assert slow.calls == 4
+
+
+def test_never_succeeded_backend_not_preferred_after_cooldown():
+    # 超时失败的后端在冷却结束后不应因“延迟未知”而得到最优得分
+    hung, healthy = StubBackend(latency=0.05, fail=True), StubBackend(latency=0.005)
+    router = _router(hung=hung, healthy=healthy)
+    router.create_completion("hi")
+    for b in router.backends:
+        b.cooldown_until = 0.0
+    for _ in range(5):
+        router.create_completion("hi")
+    assert hung.calls == 1
+    assert healthy.calls == 6
+
+
+def test_unknown_backend_probed_once():
+    known, new = StubBackend(), StubBackend()
+    router = _router(known=known, new=new)
+    router.backends[0].latency_ewma = 0.5
+    router.create_completion("hi")
+    assert new.calls == 1 and known.calls == 0
+
+
+def test_selects_fastest_backend():
+    slow, fast = StubBackend(latency=0.02), StubBackend()
+    router = _router(slow=slow, fast=fast)
+    for _ in range(6):
+        router.create_completion("hi")
+    assert fast.calls >= 5
+
+
+def test_concurrency_cap_spreads_threads():
+    a, b = StubBackend(latency=0.02), StubBackend(latency=0.02)
+    router = build_router([{"name": "a", "wrapper": a, "max_concurrency": 1},
+                           {"name": "b", "wrapper": b, "max_concurrency": 1}])
+    threads = [threading.Thread(target=router.create_completion, args=("hi",)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert a.calls + b.calls == 4
+    assert a.calls >= 1 and b.calls >= 1
+    assert router.stats()["a"]["inflight"] == 0
@@ -0,0 +1,43 @@
+import os
+import numpy as np
+import pandas as pd
+
+from src import config, preprocess
+
+
+def _save(key):
+    df = pd.DataFrame({"1. 题目": ["A", "B"]})
+    preprocess._save_cache(key, df, np.zeros((2, 1)), ["x"], ["1. 题目"], [], [], None)
+
+
+def test_prune_keeps_recent_caches_and_unrelated_dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PREPROCESS_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "PREPROCESS_CACHE_KEEP", 3)
+    (tmp_path / "my_results").mkdir()
+    (tmp_path / ("f" * preprocess.CACHE_KEY_LENGTH)).mkdir()  # 键格式但不是缓存目录
+    keys = [f"{i:0{preprocess.CACHE_KEY_LENGTH}x}" for i in range(3)]
+    for t, key in enumerate(keys):
+        _save(key)
+        os.utime(tmp_path / key, (1000 + t, 1000 + t))
+
+    # 读取最旧的缓存会更新其使用时间，之后写入新缓存时淘汰的是 keys[1]
+    assert preprocess._load_cache(keys[0]) is not None
+    _save("a" * preprocess.CACHE_KEY_LENGTH)
+
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        ["my_results", "f" * preprocess.CACHE_KEY_LENGTH, keys[0], keys[2], "a" * preprocess.CACHE_KEY_LENGTH])
+
+
+def test_save_cache_falls_back_to_pickle_on_parquet_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PREPROCESS_CACHE_DIR", str(tmp_path))
+
+    def fail(self, path, **kwargs):
+        open(path, "wb").write(b"partial")
+        raise preprocess.ArrowException("mixed types")
+
+    monkeypatch.setattr(pd.DataFrame, "to_parquet", fail)
+    key = "b" * preprocess.CACHE_KEY_LENGTH
+    _save(key)
+    assert sorted(os.listdir(tmp_path / key)) == ["encoded.npy", "meta.pkl", "raw.pkl"]
+    df_raw, *_ = preprocess._load_cache(key)
+    assert list(df_raw["1. 题目"]) == ["A", "B"]
@@ -0,0 +1,45 @@
+import numpy as np
+
+from src import preprocess
+from src.codebook import load_codebook, encode_frame
+from src.quota_controller import QuotaController
+
+
+def _split_real_data():
+    """
+    原始问卷按奇偶行分为两半：前一半作为簇的参考分布，后一半作为“忠实生成器”的抽样来源
+    """
+    df_raw, *_ = preprocess.load_raw()
+    ref, held_out = df_raw.iloc[::2].reset_index(drop=True), df_raw.iloc[1::2].reset_index(drop=True)
+    return ref, encode_frame(held_out, load_codebook())
+
+
+def test_faithful_sampler_converges_early():
+    ref, held_out = _split_real_data()
+    target = 200
+    controller = QuotaController(ref, np.zeros(len(ref), dtype=int), {0: target})
+    rng = np.random.default_rng(0)
+    while controller.next_cluster() is not None:
+        controller.observe(0, held_out[rng.integers(len(held_out))])
+    assert 0 in controller.converged
+    assert controller.generated[0] < target
+    assert controller.saved == target - controller.generated[0]
+
+
+def test_degenerate_sampler_does_not_converge():
+    ref, held_out = _split_real_data()
+    target = 200
+    controller = QuotaController(ref, np.zeros(len(ref), dtype=int), {0: target})
+    # 只会输出少数几种问卷的生成器
+    rng = np.random.default_rng(0)
+    while controller.next_cluster() is not None:
+        controller.observe(0, held_out[rng.integers(3)])
+    assert 0 not in controller.converged
+    assert controller.generated[0] == target
+
+
+def test_noise_floor_shrinks_with_sample_size():
+    ref, _ = _split_real_data()
+    controller = QuotaController(ref, np.zeros(len(ref), dtype=int), {0: 100})
+    floors = [controller.noise_floor(0, n) for n in (20, 50, 100)]
+    assert floors[0] > floors[1] > floors[2] > 0
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from src.reduction import FeatureReducer, _n_from_ratio
+
+
+def _one_hot(values, levels):
+    return (values[:, None] == np.arange(levels)[None, :]).astype(np.float64)
+
+
+def _survey(n=80, seed=0):
+    """
+    三道单选题（3、2、4 个选项）的 one-hot 矩阵，以及原始选项下标
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(3, size=n)
+    b = (a + rng.integers(2, size=n)) % 2
+    c = rng.integers(4, size=n)
+    return np.hstack([_one_hot(a, 3), _one_hot(b, 2), _one_hot(c, 4)]), (a, b, c)
+
+
+def test_n_from_ratio():
+    values = np.array([0.5, 0.3, 0.1, 0.1])
+    assert _n_from_ratio(values, 2, 1.0) == 2
+    assert _n_from_ratio(values, 10, 1.0) == 4
+    assert _n_from_ratio(values, 0, 1.0) == 1
+    assert _n_from_ratio(values, 0.8, 1.0) == 2
+    assert _n_from_ratio(values, 0.81, 1.0) == 3
+    assert _n_from_ratio(values, 0.99, 1.0) == 4
+
+
+@pytest.mark.parametrize("method", ["pca", "svd", "mca"])
+def test_integer_components(method):
+    X, _ = _survey()
+    reducer = FeatureReducer(method=method, n_components=3)
+    out = reducer.fit_transform(X)
+    assert out.shape == (len(X), 3)
+    assert reducer.n_output == 3 and reducer.input_dim == X.shape[1]
+    np.testing.assert_allclose(reducer.transform(X), out, atol=1e-8)
+
+
+@pytest.mark.parametrize("method", ["pca", "svd", "mca"])
+def test_fractional_components_reach_target(method):
+    X, _ = _survey()
+    reducer = FeatureReducer(method=method, n_components=0.7)
+    out = reducer.fit_transform(X)
+    cum = np.cumsum(reducer.explained_ratio)
+    assert out.shape == (len(X), reducer.n_output)
+    # 取累计解释比例首次达到目标的最少维数
+    assert cum[-1] >= 0.7 - 1e-9
+    assert len(cum) == 1 or cum[-2] < 0.7
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        FeatureReducer(method="tsne")
+
+
+def _naive_ca(Z):
+    """
+    对指示矩阵做对应分析：标准化残差矩阵的 SVD，返回行主坐标与特征值
+    """
+    P = Z / Z.sum()
+    r, c = P.sum(axis=1), P.sum(axis=0)
+    S = (P - np.outer(r, c)) / np.sqrt(np.outer(r, c))
+    U, sv, _ = np.linalg.svd(S, full_matrices=False)
+    return U * sv / np.sqrt(r)[:, None], sv ** 2
+
+
+def test_mca_matches_correspondence_analysis_of_indicator_matrix():
+    X, (a, b, c) = _survey()
+    reducer = FeatureReducer(method="mca", n_components=20)
+    out = reducer.fit_transform(X)
+
+    # J 个选项、Q 道题时至多 J - Q 个非零特征值，总惯量为 (J - Q) / Q
+    coords, eig = _naive_ca(X)
+    n_nonzero = 9 - 3
+    assert reducer.n_output == 8
+    np.testing.assert_allclose(reducer.explained_ratio[:n_nonzero], eig[:n_nonzero] / eig.sum(), atol=1e-10)
+    np.testing.assert_allclose(reducer.explained_ratio[n_nonzero:], 0.0, atol=1e-10)
+    np.testing.assert_allclose(eig.sum(), (9 - 3) / 3)
+    np.testing.assert_allclose(np.abs(out[:, :n_nonzero]), np.abs(coords[:, :n_nonzero]), atol=1e-8)
+
+    # 非 0/1 列（如量表）按取值展开，与直接给出 one-hot 的结果相同
+    mixed = np.hstack([X[:, :5], (c + 1)[:, None].astype(np.float64)])
+    out_mixed = FeatureReducer(method="mca", n_components=n_nonzero).fit_transform(mixed)
+    np.testing.assert_allclose(np.abs(out_mixed), np.abs(out[:, :n_nonzero]), atol=1e-8)
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from src.codebook import load_codebook, SKIP_CODE
+from src.response_store import (
+    ResponseStore, MAX_QUESTIONS, JITTER_NONE, JITTER_RANDOM, JITTER_Q5_B,
+)
+
+
+def _columns(codebook):
+    return [q["col_name"] for q in codebook]
+
+
+def _rows(codebook):
+    """
+    两条问卷：第一条全部作答（多选题为多位掩码），第二条部分题目跳过
+    """
+    first = np.array([q["n_codes"] - 1 if q["type"] != "multiple" else 0b101 for q in codebook], dtype=np.int32)
+    second = first.copy()
+    second[::3] = SKIP_CODE
+    for j, q in enumerate(codebook):
+        if q["type"] == "multiple" and second[j] != SKIP_CODE:
+            second[j] = (1 << q["n_codes"]) - 1
+    return first, second
+
+
+def test_append_codes_round_trips_through_frame():
+    codebook = load_codebook()
+    columns = _columns(codebook)
+    first, second = _rows(codebook)
+    store = ResponseStore(columns, codebook=codebook)
+    store.append_codes(first, 0, 7)
+    store.append_codes(second, 2, 8)
+
+    assert np.array_equal(store.codes_matrix(), np.stack([first, second]))
+    df = store.to_frame()
+    multi = next(j for j, q in enumerate(codebook) if q["type"] == "multiple")
+    assert df.iloc[0, multi] == "A、C"
+    assert df.iloc[1, 0] == "(跳过)"
+    assert list(df["簇编号"]) == ["0", "2"]
+
+    back = ResponseStore.from_frame(df, columns=columns, codebook=codebook)
+    assert np.array_equal(back.codes_matrix(), store.codes_matrix())
+    assert list(back.labels()) == [0, 2]
+    assert list(back.source[:len(back)]) == [7, 8]
+    assert list(back.jitter_kind[:len(back)]) == [JITTER_NONE, JITTER_NONE]
+
+
+def test_provenance_suffix_round_trips():
+    codebook = load_codebook()
+    columns = _columns(codebook)
+    first, second = _rows(codebook)
+    store = ResponseStore.from_codes(columns, np.stack([first, second, first]), 1, [3, 4, 5], codebook)
+    singles = [j for j, q in enumerate(codebook) if q["type"] == "single"]
+    store.jitter_kind[:3] = [JITTER_RANDOM, JITTER_Q5_B, JITTER_RANDOM]
+    store.jitter_mask[0] = np.uint64((1 << singles[0]) | (1 << singles[-1]))
+
+    df = store.to_frame()
+    assert df["抖动来源"][1] == "原问卷4-5题B处理"
+    assert df["抖动来源"][0].startswith("原问卷3-单选题") and "; " in df["抖动来源"][0]
+
+    back = ResponseStore.from_frame(df, columns=columns, codebook=codebook)
+    assert list(back.jitter_kind[:3]) == list(store.jitter_kind[:3])
+    assert list(back.jitter_mask[:3]) == list(store.jitter_mask[:3])
+
+
+def test_take_and_concat_keep_metadata():
+    codebook = load_codebook()
+    first, second = _rows(codebook)
+    store = ResponseStore.from_codes(_columns(codebook), np.stack([first, second]), [0, 1], [1, 2], codebook)
+    both = ResponseStore.concat([store, store.take(np.array([1]))])
+    assert len(both) == 3
+    assert np.array_equal(both.codes_matrix(), np.stack([first, second, second]))
+    assert list(both.labels()) == [0, 1, 1]
+
+
+def test_too_many_questions_fails_clearly():
+    codebook = load_codebook()
+    many = [dict(codebook[0], qnum=str(i), col_name=f"{i}. 题目") for i in range(1, MAX_QUESTIONS + 2)]
+    with pytest.raises(ValueError, match="上限"):
+        ResponseStore([q["col_name"] for q in many], codebook=many)
@@ -0,0 +1,109 @@
+import json
+import time
+import numpy as np
+import pandas as pd
+
+from src import config
+from src.codebook import load_codebook, decode_value
+from src.questionnaire_generation import load_question_config
+from src.work_queue import WorkQueue, generate_distributed
+
+
+def _queue(tmp_path, n=1):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"))
+    queue.enqueue({0: "prompt"}, {0: n})
+    return queue
+
+
+def test_stale_worker_cannot_requeue_released_item(tmp_path):
+    queue = _queue(tmp_path)
+    (item_id, *_), = queue.lease("a", lease_seconds=0.01)
+    time.sleep(0.05)
+    assert [row[0] for row in queue.lease("b", lease_seconds=60)] == [item_id]
+
+    # a 的租约已过期且任务已被 b 租用，a 的失败不应把任务放回队列
+    assert not queue.fail(item_id, "a", "timeout")
+    assert queue.progress()["leased"] == 1
+    assert queue.fail(item_id, "b", "bad output")
+    assert queue.progress()["pending"] == 1
+    queue.close()
+
+
+def test_expired_leases_respect_max_attempts(tmp_path):
+    queue = _queue(tmp_path)
+    for worker in ("a", "b"):
+        assert len(queue.lease(worker, lease_seconds=0.01, max_attempts=2)) == 1
+        time.sleep(0.05)
+    assert queue.lease("c", max_attempts=2) == []
+    assert queue.progress() == {"pending": 0, "leased": 0, "done": 0, "failed": 1}
+    queue.close()
+
+
+def test_complete_is_idempotent(tmp_path):
+    queue = _queue(tmp_path, n=2)
+    items = queue.lease("a", n=2)
+    assert queue.complete(items[0][0], "r1")
+    assert not queue.complete(items[0][0], "r1 again")
+    assert [r[2] for r in queue.results()] == ["r1"]
+    queue.close()
+
+
+def test_rerun_with_same_run_key_retries_failed_items(tmp_path):
+    queue = _queue(tmp_path)
+    (item_id, *_), = queue.lease("a")
+    assert queue.fail(item_id, "a", "bad output", max_attempts=1)
+    assert queue.progress()["failed"] == 1
+
+    queue.enqueue({0: "prompt"}, {0: 1})
+    assert queue.progress() == {"pending": 1, "leased": 0, "done": 0, "failed": 0}
+    assert [row[0] for row in queue.lease("b", max_attempts=1)] == [item_id]
+    queue.close()
+
+
+class ScriptedModel:
+    """
+    按顺序返回预设输出的模型；None 表示返回无法解析的文本
+    """
+    def __init__(self, outputs):
+        self.outputs = list(outputs)
+        self.calls = 0
+
+    def create_completion(self, prompt, max_tokens=1024, temperature=0.2):
+        out = self.outputs[self.calls]
+        self.calls += 1
+        return {"choices": [{"text": out if out is not None else "无法完成"}]}
+
+
+def _answer_text(codebook, seed):
+    rng = np.random.default_rng(seed)
+    answers = []
+    for q in codebook:
+        if q["type"] == "multiple":
+            code = int(rng.integers(1, 2 ** q["n_codes"]))
+        elif q["qnum"] in ("5", "35"):
+            code = 0  # 避免跳题规则把大部分题目置为跳过
+        else:
+            code = int(rng.integers(q["n_codes"]))
+        answers.append({"col_name": q["col_name"], "answer": decode_value(code, q)})
+    return json.dumps({"answers": answers}, ensure_ascii=False)
+
+
+def test_distributed_generation_tops_up_duplicates_and_failures(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "QUEUE_PATH", str(tmp_path / "queue.sqlite"))
+    monkeypatch.setattr(config, "AI_OUTPUT_CSV", str(tmp_path / "ai.csv"))
+    monkeypatch.setattr(config, "QUEUE_MAX_ATTEMPTS", 1)
+    monkeypatch.setattr(config, "QUEUE_POLL_INTERVAL", 0.0)
+    monkeypatch.setattr(config, "DEDUP_ENABLED", True)
+    load_question_config()
+    codebook = load_codebook()
+    df_raw = pd.DataFrame(columns=[q["col_name"] for q in codebook])
+    a, b, c = (_answer_text(codebook, seed) for seed in range(3))
+    # 第 2 个任务与第 1 个完全重复，第 3 个任务输出不合格（只允许尝试一次，直接放弃）
+    model = ScriptedModel([a, a, None, b, c])
+
+    store = generate_distributed(df_raw, {0: "prompt"}, {0: 3}, model_wrapper=model)
+
+    assert model.calls == 5
+    assert len(store) == 3
+    assert list(store.source[:len(store)]) == [1, 2, 3]
+    assert len(pd.read_csv(config.AI_OUTPUT_CSV, header=None)) == 3